@@ -0,0 +1,61 @@
+"""APIミドルウェア"""
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class UploadSizeLimitMiddleware:
+    """リクエストボディのサイズ上限を強制するASGIミドルウェア
+
+    Content-Lengthが上限を超える場合は本文を読まずに413を返し、
+    Content-Lengthがない（chunked）場合も受信量を数えて上限超過時点で打ち切る
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None:
+            try:
+                declared = int(content_length)
+            except ValueError:
+                response = JSONResponse(
+                    status_code=400,
+                    content={"detail": "Invalid Content-Length header"}
+                )
+                await response(scope, receive, send)
+                return
+        else:
+            declared = None
+
+        if declared is not None and declared > self.max_bytes:
+            response = JSONResponse(
+                status_code=413,
+                content={"detail": f"Request body exceeds {self.max_bytes} bytes"}
+            )
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # 本文の解析中に送出され、FastAPIの例外ハンドラで413になる
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Request body exceeds {self.max_bytes} bytes"
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
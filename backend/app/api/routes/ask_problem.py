@@ -1,12 +1,19 @@
 """問題解答エンドポイント"""
+import json
 import time
 import uuid
-from typing import Optional
+from typing import AsyncIterator, List, Optional
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from ...models.schemas import AskTextRequest, AnswerResponse
-from ...services import OCRService, LLMService, EmbeddingService, RAGService
+from fastapi.responses import StreamingResponse
+from ...models.schemas import AskTextRequest, AnswerResponse, ReferencedDocument
+from ...services import (
+    OCRService,
+    LLMService,
+    EmbeddingService,
+    RAGService,
+    get_conversation_logger
+)
 from ...db import get_db_connection
-from ...db.repositories import ConversationRepository
 from ...utils.logger import setup_logger
 
 router = APIRouter()
@@ -35,6 +42,75 @@ def get_services():
     return _ocr_service, _llm_service, _embedding_service, _rag_service
 
 
+async def close_services() -> None:
+    """サービスの実行中の処理を止める（lifespan終了時に呼ぶ）"""
+    if _embedding_service is not None:
+        await _embedding_service.close()
+
+
+def _ndjson(event: dict) -> bytes:
+    """イベントをNDJSONの1行にエンコード"""
+    return (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def _stream_answer(
+    rag_service: RAGService,
+    question: str,
+    chunks: List[dict],
+    referenced_docs: List[ReferencedDocument],
+    session_id: str,
+    use_rag: bool,
+    use_web_search: bool,
+    start_time: float
+) -> AsyncIterator[bytes]:
+    """解答をNDJSONイベント列としてストリーミング
+
+    イベント種別:
+        referenced_documents: 検索結果（最初に1回）
+        token: 解答テキストの断片
+        done: 生成完了
+        error: 生成途中のエラー
+    """
+    yield _ndjson({
+        "type": "referenced_documents",
+        "session_id": session_id,
+        "question": question,
+        "referenced_documents": [doc.model_dump() for doc in referenced_docs]
+    })
+
+    answer_parts: List[str] = []
+    try:
+        async for token in rag_service.stream_answer(question, chunks):
+            answer_parts.append(token)
+            yield _ndjson({"type": "token", "content": token})
+    except ValueError as e:
+        logger.error(f"ValueError while streaming answer: {e}")
+        yield _ndjson({"type": "error", "detail": str(e)})
+        return
+    except Exception as e:
+        # 想定外の失敗でもストリームを途中で切らず、errorイベントで終える
+        logger.error(f"Error while streaming answer: {e}", exc_info=True)
+        yield _ndjson({"type": "error", "detail": "Internal server error"})
+        return
+
+    answer = "".join(answer_parts)
+
+    # 会話履歴はストリーム完了後に書き込み待ちへ積む
+    get_conversation_logger().log(
+        session_id=session_id,
+        question=question,
+        answer=answer,
+        used_rag=use_rag,
+        used_web_search=use_web_search,
+        referenced_chunks=[doc.document_id for doc in referenced_docs]
+    )
+
+    processing_time_ms = int((time.time() - start_time) * 1000)
+    logger.info(f"Streamed answer generated in {processing_time_ms}ms")
+
+    yield _ndjson({"type": "done", "processing_time_ms": processing_time_ms})
+
+
 @router.post("/ask_problem_image", response_model=AnswerResponse)
 async def ask_problem_image(
     image: UploadFile = File(..., description="問題画像"),
@@ -63,34 +139,36 @@ async def ask_problem_image(
         if not session_id:
             session_id = str(uuid.uuid4())
         
-        # 画像を読み込み
-        image_bytes = await image.read()
-        logger.info(f"Received image: {image.filename}, size: {len(image_bytes)} bytes")
+        # 画像はメモリに読み込まず、アップロードのファイルをそのままOCRへ転送
+        logger.info(f"Received image: {image.filename}, size: {image.size} bytes")
         
         # OCRでテキスト化
         logger.info("Starting OCR...")
-        question_text = await ocr_service.extract_text(image_bytes)
+        question_text = await ocr_service.extract_text(
+            image.file,
+            filename=image.filename or "image",
+            content_type=image.content_type or "application/octet-stream"
+        )
         logger.info(f"OCR completed: {len(question_text)} chars extracted")
         
         # RAG + LLMで解答生成
         logger.info(f"Generating answer (use_rag={use_rag})...")
         async with get_db_connection() as conn:
-            answer, referenced_docs = await rag_service.generate_answer(
+            answer, referenced_docs, saved_generation_ms = await rag_service.generate_answer(
                 conn=conn,
                 question=question_text,
                 use_rag=use_rag
             )
-            
-            # 会話履歴を保存
-            conv_repo = ConversationRepository(conn)
-            await conv_repo.create(
-                session_id=session_id,
-                question=question_text,
-                answer=answer,
-                used_rag=use_rag,
-                used_web_search=use_web_search,
-                referenced_chunks=[doc.document_id for doc in referenced_docs]
-            )
+        
+        # 会話履歴は書き込み待ちに積み、DB書き込みを待たずに返す
+        get_conversation_logger().log(
+            session_id=session_id,
+            question=question_text,
+            answer=answer,
+            used_rag=use_rag,
+            used_web_search=use_web_search,
+            referenced_chunks=[doc.document_id for doc in referenced_docs]
+        )
         
         processing_time_ms = int((time.time() - start_time) * 1000)
         logger.info(f"Answer generated in {processing_time_ms}ms")
@@ -98,7 +176,9 @@ async def ask_problem_image(
         return AnswerResponse(
             answer=answer,
             referenced_documents=referenced_docs,
-            processing_time_ms=processing_time_ms
+            processing_time_ms=processing_time_ms,
+            cache_hit=saved_generation_ms is not None,
+            saved_generation_ms=saved_generation_ms
         )
         
     except ValueError as e:
@@ -133,22 +213,21 @@ async def ask_problem_text(req: AskTextRequest):
         # RAG + LLMで解答生成
         logger.info(f"Generating answer (use_rag={req.use_rag})...")
         async with get_db_connection() as conn:
-            answer, referenced_docs = await rag_service.generate_answer(
+            answer, referenced_docs, saved_generation_ms = await rag_service.generate_answer(
                 conn=conn,
                 question=req.question,
                 use_rag=req.use_rag
             )
-            
-            # 会話履歴を保存
-            conv_repo = ConversationRepository(conn)
-            await conv_repo.create(
-                session_id=session_id,
-                question=req.question,
-                answer=answer,
-                used_rag=req.use_rag,
-                used_web_search=req.use_web_search,
-                referenced_chunks=[doc.document_id for doc in referenced_docs]
-            )
+        
+        # 会話履歴は書き込み待ちに積み、DB書き込みを待たずに返す
+        get_conversation_logger().log(
+            session_id=session_id,
+            question=req.question,
+            answer=answer,
+            used_rag=req.use_rag,
+            used_web_search=req.use_web_search,
+            referenced_chunks=[doc.document_id for doc in referenced_docs]
+        )
         
         processing_time_ms = int((time.time() - start_time) * 1000)
         logger.info(f"Answer generated in {processing_time_ms}ms")
@@ -156,7 +235,9 @@ async def ask_problem_text(req: AskTextRequest):
         return AnswerResponse(
             answer=answer,
             referenced_documents=referenced_docs,
-            processing_time_ms=processing_time_ms
+            processing_time_ms=processing_time_ms,
+            cache_hit=saved_generation_ms is not None,
+            saved_generation_ms=saved_generation_ms
         )
         
     except ValueError as e:
@@ -166,3 +247,116 @@ async def ask_problem_text(req: AskTextRequest):
         logger.error(f"Unexpected error in ask_problem_text: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail="Internal server error")
 
+
+
+@router.post("/ask_problem_image/stream")
+async def ask_problem_image_stream(
+    image: UploadFile = File(..., description="問題画像"),
+    use_rag: bool = Form(True, description="RAG検索を使用するか"),
+    use_web_search: bool = Form(False, description="Web検索を使用するか"),
+    session_id: Optional[str] = Form(None, description="会話セッションID")
+):
+    """画像による質問を受け付け、解答をNDJSONでストリーミング返却
+
+    OCRとRAG検索の完了後に参照資料を送り、以降はLLMのトークンを届いた順に送る
+
+    Args:
+        image: 問題画像ファイル
+        use_rag: RAG検索を使用するか
+        use_web_search: Web検索を使用するか（未実装）
+        session_id: 会話セッションID
+
+    Returns:
+        application/x-ndjson のストリーミングレスポンス
+    """
+    start_time = time.time()
+
+    try:
+        ocr_service, _, _, rag_service = get_services()
+        session_id = session_id or str(uuid.uuid4())
+
+        logger.info(f"Received image (stream): {image.filename}, size: {image.size} bytes")
+
+        question_text = await ocr_service.extract_text(
+            image.file,
+            filename=image.filename or "image",
+            content_type=image.content_type or "application/octet-stream"
+        )
+        logger.info(f"OCR completed: {len(question_text)} chars extracted")
+
+        # 検索が終わったら接続を返却し、生成中は保持しない
+        async with get_db_connection() as conn:
+            chunks, referenced_docs = await rag_service.retrieve(
+                conn=conn,
+                question=question_text,
+                use_rag=use_rag
+            )
+
+    except ValueError as e:
+        logger.error(f"ValueError in ask_problem_image_stream: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in ask_problem_image_stream: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    return StreamingResponse(
+        _stream_answer(
+            rag_service=rag_service,
+            question=question_text,
+            chunks=chunks,
+            referenced_docs=referenced_docs,
+            session_id=session_id,
+            use_rag=use_rag,
+            use_web_search=use_web_search,
+            start_time=start_time
+        ),
+        media_type="application/x-ndjson"
+    )
+
+
+@router.post("/ask_problem_text/stream")
+async def ask_problem_text_stream(req: AskTextRequest):
+    """テキストによる質問を受け付け、解答をNDJSONでストリーミング返却
+
+    Args:
+        req: テキスト質問リクエスト
+
+    Returns:
+        application/x-ndjson のストリーミングレスポンス
+    """
+    start_time = time.time()
+
+    try:
+        _, _, _, rag_service = get_services()
+        session_id = req.session_id or str(uuid.uuid4())
+
+        logger.info(f"Received text question (stream): {req.question[:100]}...")
+
+        # 検索が終わったら接続を返却し、生成中は保持しない
+        async with get_db_connection() as conn:
+            chunks, referenced_docs = await rag_service.retrieve(
+                conn=conn,
+                question=req.question,
+                use_rag=req.use_rag
+            )
+
+    except ValueError as e:
+        logger.error(f"ValueError in ask_problem_text_stream: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        logger.error(f"Unexpected error in ask_problem_text_stream: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+    return StreamingResponse(
+        _stream_answer(
+            rag_service=rag_service,
+            question=req.question,
+            chunks=chunks,
+            referenced_docs=referenced_docs,
+            session_id=session_id,
+            use_rag=req.use_rag,
+            use_web_search=req.use_web_search,
+            start_time=start_time
+        ),
+        media_type="application/x-ndjson"
+    )
@@ -1,18 +1,248 @@
 """資料管理エンドポイント"""
-from typing import Optional
-from fastapi import APIRouter, HTTPException, Query
+import asyncio
+import os
+import shutil
+import uuid
+from typing import BinaryIO, Optional
+from fastapi import APIRouter, File, HTTPException, Query, UploadFile
 from ...models.schemas import (
     DocumentListResponse,
     DocumentInfo,
+    DocumentUploadResponse,
     DocumentDeleteResponse
 )
+from ...config import settings
 from ...db import get_db_connection
-from ...db.repositories import DocumentRepository
+from ...db.repositories import DocumentRepository, JobRepository
+from ...services import IngestionPipeline, claim_document, release_document, start_ingestion
+from ...services.answer_cache import get_answer_cache
 from ...utils.logger import setup_logger
+from .ask_problem import get_services
 
 router = APIRouter()
 logger = setup_logger()
 
+# 取り込みパイプライン（遅延初期化）
+_pipeline: Optional[IngestionPipeline] = None
+
+
+def get_ingestion_pipeline() -> IngestionPipeline:
+    """取り込みパイプラインを取得（解答系とサービスインスタンスを共有）"""
+    global _pipeline
+    if _pipeline is None:
+        ocr_service, llm_service, embedding_service, _ = get_services()
+        _pipeline = IngestionPipeline(ocr_service, llm_service, embedding_service)
+    return _pipeline
+
+
+def _save_upload(file: BinaryIO, path: str) -> int:
+    """アップロードをチャンク単位でファイルに保存
+
+    Returns:
+        保存したバイト数
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    file.seek(0)
+    with open(path, "wb") as out:
+        shutil.copyfileobj(file, out, length=1024 * 1024)
+        return out.tell()
+
+
+def _validate_upload(file: UploadFile) -> tuple:
+    """アップロードの拡張子を確認
+
+    Returns:
+        (ファイル名, 拡張子)
+    """
+    filename = os.path.basename(file.filename or "document")
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in settings.allowed_extensions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type: {extension or filename}"
+        )
+    return filename, extension
+
+
+async def _store_upload(file: UploadFile, extension: str) -> tuple:
+    """アップロードを UPLOAD_DIR に保存
+
+    Returns:
+        (保存先パス, バイト数)
+    """
+    path = os.path.join(settings.upload_dir, f"{uuid.uuid4().hex}{extension}")
+    loop = asyncio.get_running_loop()
+    size = await loop.run_in_executor(None, _save_upload, file.file, path)
+    return path, size
+
+
+@router.post("/documents/upload", response_model=DocumentUploadResponse, status_code=202)
+async def upload_document(
+    file: UploadFile = File(..., description="資料ファイル（PDF・画像）")
+):
+    """資料をアップロードし、取り込みをバックグラウンドで開始
+
+    OCR・科目分類・チャンク分割・ベクトル化・登録は取り込みパイプラインで
+    順に流し、完了すると資料のステータスが completed になる。
+    INGEST_USE_JOB_QUEUE が有効な場合はジョブを登録し、worker.py に処理させる
+
+    Args:
+        file: 資料ファイル
+
+    Returns:
+        登録した資料IDと取り込み状態
+    """
+    filename, extension = _validate_upload(file)
+
+    try:
+        path, size = await _store_upload(file, extension)
+
+        async with get_db_connection() as conn:
+            async with conn.transaction():
+                document_id = await DocumentRepository(conn).create(
+                    filename=filename,
+                    original_path=path,
+                    file_size_bytes=size,
+                    mime_type=file.content_type
+                )
+                if settings.ingest_use_job_queue:
+                    await JobRepository(conn).enqueue(
+                        document_id,
+                        max_attempts=settings.ingest_job_max_attempts
+                    )
+
+        if not settings.ingest_use_job_queue:
+            start_ingestion(
+                get_ingestion_pipeline(),
+                document_id,
+                path,
+                filename,
+                file.content_type or "application/octet-stream"
+            )
+        logger.info(f"Accepted document {document_id}: {filename} ({size} bytes)")
+
+        return DocumentUploadResponse(
+            document_id=document_id,
+            status="processing",
+            message="processing started"
+        )
+
+    except Exception as e:
+        logger.error(f"Error in upload_document: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+
+
+@router.post(
+    "/documents/{document_id}/reingest",
+    response_model=DocumentUploadResponse,
+    status_code=202
+)
+async def reingest_document(
+    document_id: int,
+    file: UploadFile = File(..., description="差し替える資料ファイル（PDF・画像）")
+):
+    """既存の資料を新しいファイルで取り込み直す
+
+    本文が変わらないチャンクは埋め込みキャッシュと既存行をそのまま使い、
+    変わったチャンクだけを登録・削除する。
+    同じ資料の取り込みが進行中（ジョブが待機中・実行中）の場合は409を返す
+
+    Args:
+        document_id: 資料ID
+        file: 差し替える資料ファイル
+
+    Returns:
+        資料IDと取り込み状態
+    """
+    filename, extension = _validate_upload(file)
+
+    # プロセス内で取り込む場合は、取り込み中の資料を差し替えない
+    # （取り込み中のタスクが旧ファイルを読んでいる）
+    claimed = not settings.ingest_use_job_queue
+    if claimed and not claim_document(document_id):
+        raise HTTPException(
+            status_code=409,
+            detail=f"Document {document_id} is being ingested"
+        )
+
+    path = None
+    committed = False
+    started = False
+    try:
+        path, size = await _store_upload(file, extension)
+
+        async with get_db_connection() as conn:
+            async with conn.transaction():
+                doc_repo = DocumentRepository(conn)
+                # 同じ資料への差し替えを直列化し、ジョブの有無を確かめてから登録する
+                previous = await doc_repo.get_for_update(document_id)
+                if previous is None:
+                    raise HTTPException(
+                        status_code=404,
+                        detail=f"Document {document_id} not found"
+                    )
+                if settings.ingest_use_job_queue and await JobRepository(conn).has_active(document_id):
+                    raise HTTPException(
+                        status_code=409,
+                        detail=f"Document {document_id} is being ingested"
+                    )
+                await doc_repo.update_file(
+                    document_id,
+                    filename=filename,
+                    original_path=path,
+                    file_size_bytes=size,
+                    mime_type=file.content_type
+                )
+                if settings.ingest_use_job_queue:
+                    await JobRepository(conn).enqueue(
+                        document_id,
+                        max_attempts=settings.ingest_job_max_attempts
+                    )
+
+        committed = True
+
+        # 差し替え前の資料を参照するキャッシュ済み解答を破棄
+        get_answer_cache().invalidate_document(document_id)
+
+        # 旧ファイルを読む取り込みは残っていない（進行中なら409で拒否済み）
+        if previous.get("original_path") and previous["original_path"] != path:
+            try:
+                os.unlink(previous["original_path"])
+            except OSError:
+                pass
+
+        if not settings.ingest_use_job_queue:
+            start_ingestion(
+                get_ingestion_pipeline(),
+                document_id,
+                path,
+                filename,
+                file.content_type or "application/octet-stream"
+            )
+        started = True
+        logger.info(f"Accepted re-ingest of document {document_id}: {filename} ({size} bytes)")
+
+        return DocumentUploadResponse(
+            document_id=document_id,
+            status="processing",
+            message="reprocessing started"
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in reingest_document: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Internal server error")
+    finally:
+        if claimed and not started:
+            release_document(document_id)
+        # 登録しなかった新しいファイルを残さない
+        if path is not None and not committed:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
 
 @router.get("/documents", response_model=DocumentListResponse)
 async def list_documents(
@@ -99,7 +329,12 @@ async def delete_document(document_id: int):
             success = await doc_repo.delete(document_id)
             
             if success:
-                logger.info(f"Deleted document: {document_id}")
+                # 削除した資料を参照するキャッシュ済み解答を破棄
+                invalidated = get_answer_cache().invalidate_document(document_id)
+                logger.info(
+                    f"Deleted document: {document_id} "
+                    f"(invalidated {invalidated} cached answers)"
+                )
                 return DocumentDeleteResponse(
                     success=True,
                     message=f"Document {document_id} deleted successfully"
@@ -1,52 +1,73 @@
 """ヘルスチェックエンドポイント"""
+import asyncio
+import time
+from typing import Optional
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from ...models.schemas import HealthResponse, ServiceStatus
-from ...services import OCRService, LLMService
+from ...services import is_ready
 from ...db import get_db_connection
 from ...config import settings
+from .ask_problem import get_services
 
 router = APIRouter()
 
+# 直近の詳細チェック結果（monotonic時刻, 結果）
+_cached_status: Optional[tuple] = None
+# 実行中の詳細チェック（同時に来たプローブで共有）
+_probe_task: Optional[asyncio.Task] = None
 
-@router.get("/health", response_model=HealthResponse)
-async def health_check():
-    """ヘルスチェック
 
-    全サービスの稼働状態を確認
-    """
-    services = ServiceStatus(
-        database="unknown",
-        ollama="unknown",
-        ocr="unknown"
-    )
+async def _check_database() -> bool:
+    """データベース接続チェック"""
+    async with get_db_connection() as conn:
+        await conn.fetchval("SELECT 1")
+    return True
 
-    # データベース接続チェック
-    try:
-        async with get_db_connection() as conn:
-            await conn.fetchval("SELECT 1")
-            services.database = "ok"
-    except Exception:
-        services.database = "error"
 
-    # Ollamaチェック
+async def _probe(check) -> str:
+    """タイムアウト付きでチェックを実行し、ok / error を返す"""
     try:
-        llm_service = LLMService()
-        if await llm_service.health_check():
-            services.ollama = "ok"
-        else:
-            services.ollama = "error"
+        ok = await asyncio.wait_for(check(), timeout=settings.health_probe_timeout)
+        return "ok" if ok else "error"
     except Exception:
-        services.ollama = "error"
+        return "error"
 
-    # OCRチェック
-    try:
-        ocr_service = OCRService()
-        if await ocr_service.health_check():
-            services.ocr = "ok"
-        else:
-            services.ocr = "error"
-    except Exception:
-        services.ocr = "error"
+
+async def _run_probes() -> ServiceStatus:
+    """全サービスを並行してチェック"""
+    ocr_service, llm_service, _, _ = get_services()
+    database, ollama, ocr = await asyncio.gather(
+        _probe(_check_database),
+        _probe(llm_service.health_check),
+        _probe(ocr_service.health_check),
+    )
+    return ServiceStatus(database=database, ollama=ollama, ocr=ocr)
+
+
+async def _get_status() -> ServiceStatus:
+    """キャッシュ期間内なら前回の結果を返し、期限切れなら再チェック"""
+    global _cached_status, _probe_task
+
+    now = time.monotonic()
+    if _cached_status is not None and now - _cached_status[0] < settings.health_cache_seconds:
+        return _cached_status[1]
+
+    if _probe_task is None or _probe_task.done():
+        _probe_task = asyncio.ensure_future(_run_probes())
+    services = await asyncio.shield(_probe_task)
+
+    _cached_status = (time.monotonic(), services)
+    return services
+
+
+@router.get("/health", response_model=HealthResponse)
+async def health_check():
+    """ヘルスチェック
+
+    全サービスの稼働状態を確認（結果は health_cache_seconds の間キャッシュ）
+    """
+    services = await _get_status()
 
     # 全体のステータス
     all_ok = all([
@@ -55,8 +76,29 @@ async def health_check():
         services.ocr == "ok"
     ])
 
+    # ウォームアップ完了前は準備中として報告
+    ready = is_ready()
+    if not ready:
+        status = "starting"
+    else:
+        status = "ok" if all_ok else "degraded"
+
     return HealthResponse(
-        status="ok" if all_ok else "degraded",
-        services=services
+        status=status,
+        services=services,
+        ready=ready
     )
 
+
+@router.get("/livez")
+async def liveness():
+    """ライブネス（プロセスが応答できるか。依存サービスは確認しない）"""
+    return {"status": "ok"}
+
+
+@router.get("/readyz")
+async def readiness():
+    """レディネス（ウォームアップ完了後のみ200。依存サービスは確認しない）"""
+    if not is_ready():
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    return {"status": "ok"}
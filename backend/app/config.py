@@ -1,6 +1,6 @@
 """環境変数と設定管理"""
 import os
-from typing import Optional
+from typing import Literal, Optional
 from pydantic_settings import BaseSettings
 
 
@@ -16,9 +16,25 @@ class Settings(BaseSettings):
     # Ollama
     ollama_url: str = os.getenv("OLLAMA_URL", "http://localhost:11434")
     ollama_model: str = os.getenv("OLLAMA_MODEL", "qwen2.5:7b-instruct")
+    ollama_keep_alive: str = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
     
     # OCR Service
     ocr_url: str = os.getenv("OCR_URL", "http://localhost:8080")
+    ocr_cache_enabled: bool = True
+    ocr_cache_max_entries: int = 512
+    ocr_cache_max_mb: int = 32
+
+    # 上流HTTPクライアント（接続プール）
+    ollama_max_connections: int = 10
+    ocr_max_connections: int = 20
+    http_keepalive_timeout: float = 30.0
+    http_dns_cache_ttl: int = 300
+    http_connect_timeout: float = 5.0
+    ollama_timeout: float = 120.0
+    ocr_timeout: float = 30.0
+    health_check_timeout: float = 5.0
+    health_probe_timeout: float = 3.0
+    health_cache_seconds: float = 5.0
     
     # Embedding
     embedding_model: str = os.getenv(
@@ -26,6 +42,30 @@ class Settings(BaseSettings):
         "intfloat/multilingual-e5-large"
     )
     embedding_dimension: int = 1024
+    # 推論バックエンド: sentence-transformers | onnx | onnx-int8
+    embedding_backend: str = os.getenv("EMBEDDING_BACKEND", "sentence-transformers")
+    # onnx系はデプロイ前に `python -m app.services.onnx_embedding` でエクスポートしておく
+    embedding_onnx_dir: str = "./models/onnx"
+    embedding_onnx_threads: int = 0  # 0はONNX Runtimeの既定値
+    embedding_onnx_tolerance: float = 0.02  # 参照モデルとの許容コサイン距離
+    embedding_max_seq_length: int = 512
+    # 埋め込みワーカー（未設定ならプロセス内でモデルを実行）
+    embedding_service_url: Optional[str] = os.getenv("EMBEDDING_SERVICE_URL") or None
+    embedding_service_socket: Optional[str] = os.getenv("EMBEDDING_SERVICE_SOCKET") or None
+    # ワーカーの計算方式（X-Embedding-Backendヘッダーと一致しない応答は拒否する）
+    embedding_service_backend: str = os.getenv(
+        "EMBEDDING_SERVICE_BACKEND", "sentence-transformers"
+    )
+    embedding_service_timeout: float = 60.0
+    embedding_max_connections: int = 20
+    embedding_cache_max_entries: int = 4096
+    embedding_cache_max_mb: int = 32
+    embedding_batch_max_size: int = 32
+    embedding_batch_max_wait_ms: float = 5.0
+    
+    # 起動時ウォームアップ
+    warmup_enabled: bool = True
+    warmup_timeout: float = 300.0
     
     # ファイルアップロード
     upload_dir: str = "./uploads"
@@ -34,8 +74,44 @@ class Settings(BaseSettings):
     
     # RAG設定
     rag_top_k: int = 5
+    # 候補検索のインデックス: halfvec | bit（量子化した索引で候補を取り、float32で並べ直す）
+    # float32の索引は作らないため、それ以外の値は起動時に拒否する
+    vector_index_mode: Literal["halfvec", "bit"] = "halfvec"
+    vector_rerank_factor: int = 4
+    # 絞り込み時にtop_k件揃うまで索引を読み進める（pgvector 0.8以降）: relaxed_order | strict_order | 空で無効
+    vector_iterative_scan: str = "relaxed_order"
     chunk_size: int = 1000
     chunk_overlap: int = 200
+
+    # 資料取り込みパイプライン
+    ingest_queue_size: int = 8
+    ingest_embed_batch_size: int = 32
+    ingest_copy_batch_size: int = 1000
+    # 異常終了で残った取り込み途中のチャンク（chunk_ingest_staging）を消すまでの時間
+    ingest_staging_max_age_hours: float = 24.0
+    # 埋め込みキャッシュ（embedding_cacheテーブル）を使うか
+    ingest_embedding_cache: bool = True
+    ingest_classify_chars: int = 2000
+    # true ならアップロードはジョブ登録のみ行い、worker.py が処理する
+    ingest_use_job_queue: bool = False
+    ingest_worker_concurrency: int = 1
+    ingest_worker_poll_interval: float = 2.0
+    ingest_job_max_attempts: int = 3
+    ingest_job_lease_seconds: float = 120.0
+    ingest_job_backoff_seconds: float = 10.0
+    ingest_job_backoff_max_seconds: float = 600.0
+
+    # セマンティック解答キャッシュ
+    answer_cache_enabled: bool = True
+    answer_cache_similarity_threshold: float = 0.95
+    answer_cache_ttl_seconds: float = 3600.0
+    answer_cache_max_entries: int = 1000
+
+    # 会話履歴の書き込み（非同期バッチ）
+    conversation_log_queue_size: int = 10000
+    conversation_log_batch_size: int = 200
+    conversation_log_flush_interval: float = 1.0
+    conversation_log_late_seconds: float = 10.0
     
     # LLM設定
     llm_temperature: float = 0.7
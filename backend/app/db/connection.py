@@ -1,6 +1,8 @@
 """PostgreSQL接続管理"""
 import asyncpg
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from pgvector.asyncpg import register_vector
 from ..config import settings
 
 
@@ -16,7 +18,9 @@ async def init_db() -> asyncpg.Pool:
             dsn=settings.database_url,
             min_size=2,
             max_size=10,
-            command_timeout=60
+            command_timeout=60,
+            # 埋め込みはNumPy配列のままバイナリで送受信する（vector はfloat32配列で返る）
+            init=register_vector
         )
     return _pool
 
@@ -29,15 +33,16 @@ async def close_db():
         _pool = None
 
 
-async def get_db_connection():
+@asynccontextmanager
+async def get_db_connection() -> AsyncIterator[asyncpg.Connection]:
     """データベース接続を取得
 
     使用例:
         async with get_db_connection() as conn:
             result = await conn.fetch("SELECT * FROM documents")
     """
-    global _pool
     if _pool is None:
         await init_db()
-    return _pool.acquire()
+    async with _pool.acquire() as conn:
+        yield conn
 
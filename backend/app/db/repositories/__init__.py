@@ -3,3 +3,5 @@ from .document_repo import DocumentRepository
 from .chunk_repo import ChunkRepository
 from .conversation_repo import ConversationRepository
 
+from .job_repo import JobRepository
+from .embedding_cache_repo import EmbeddingCacheRepository
@@ -1,6 +1,41 @@
 """Chunkテーブル操作"""
-from typing import List, Optional
+import json
+import uuid
+from typing import List, Optional, Sequence, Tuple
 import asyncpg
+import numpy as np
+
+
+# COPYの受け皿（埋め込みはvectorのバイナリ表現のまま受ける）
+STAGING_TABLE = "chunks_staging"
+STAGING_COLUMNS = ["document_id", "content", "chunk_index", "embedding", "metadata"]
+
+# 取り込み中のチャンクの受け皿（UNLOGGEDの常設テーブル。取り込みごとにrun_idで区別し、
+# ベクトル化済みのバッチを届いた順にCOPYしておく）
+INGEST_STAGING_TABLE = "chunk_ingest_staging"
+INGEST_STAGING_COLUMNS = ["run_id"] + STAGING_COLUMNS
+
+# chunks.embedding の次元数（式インデックスの式と一致させる）
+EMBEDDING_DIM = 1024
+
+# 候補検索に使うインデックス（いずれも候補をfloat32の距離で並べ直す。
+# float32のHNSWは作らないため、float32で候補検索するモードはない）
+INDEX_HALFVEC = "halfvec"  # float16の式インデックス（サイズ1/2）
+INDEX_BIT = "bit"          # 2値量子化＋ハミング距離の式インデックス（サイズ1/32）
+
+# hnsw.iterative_scan に設定できる値（pgvector 0.8以降）
+ITERATIVE_SCAN_MODES = ("relaxed_order", "strict_order")
+
+# 候補検索の距離式（database/init.sql・migrations の式インデックスと同じ式）
+_CANDIDATE_DISTANCE = {
+    INDEX_HALFVEC: (
+        f"(c.embedding::halfvec({EMBEDDING_DIM})) <=> ($1::vector::halfvec({EMBEDDING_DIM}))"
+    ),
+    INDEX_BIT: (
+        f"(binary_quantize(c.embedding)::bit({EMBEDDING_DIM})) "
+        f"<~> binary_quantize($1::vector)"
+    ),
+}
 
 
 class ChunkRepository:
@@ -14,10 +49,10 @@ class ChunkRepository:
         document_id: int,
         content: str,
         chunk_index: int,
-        embedding: List[float],
+        embedding: np.ndarray,
         metadata: Optional[dict] = None
     ) -> int:
-        """チャンクを新規作成
+        """チャンクを新規作成（科目・ステータスは資料の現在値を複製）
 
         Args:
             document_id: 紐づく資料ID
@@ -28,23 +63,30 @@ class ChunkRepository:
 
         Returns:
             作成されたチャンクID
+
+        Raises:
+            ValueError: 資料が存在しない場合
         """
         row = await self.conn.fetchrow(
             """
             INSERT INTO chunks 
-            (document_id, content, chunk_index, embedding, metadata)
-            VALUES ($1, $2, $3, $4, $5)
+            (document_id, content, chunk_index, embedding, metadata, subject, status)
+            SELECT $1, $2, $3, $4, $5, d.subject, d.status
+            FROM documents d
+            WHERE d.id = $1
             RETURNING id
             """,
             document_id, content, chunk_index, embedding, metadata
         )
+        if row is None:
+            raise ValueError(f"Document {document_id} not found")
         return row["id"]
 
     async def create_batch(
         self,
-        chunks: List[tuple[int, str, int, List[float], Optional[dict]]]
+        chunks: List[tuple[int, str, int, np.ndarray, Optional[dict]]]
     ) -> List[int]:
-        """複数チャンクを一括作成
+        """複数チャンクを一括作成（科目・ステータスは資料の現在値を複製）
 
         Args:
             chunks: (document_id, content, chunk_index, embedding, metadata)のリスト
@@ -55,8 +97,12 @@ class ChunkRepository:
         rows = await self.conn.fetch(
             """
             INSERT INTO chunks 
-            (document_id, content, chunk_index, embedding, metadata)
-            SELECT * FROM UNNEST($1::int[], $2::text[], $3::int[], $4::vector[], $5::jsonb[])
+            (document_id, content, chunk_index, embedding, metadata, subject, status)
+            SELECT u.document_id, u.content, u.chunk_index, u.embedding, u.metadata,
+                   d.subject, d.status
+            FROM UNNEST($1::int[], $2::text[], $3::int[], $4::vector[], $5::jsonb[])
+                AS u(document_id, content, chunk_index, embedding, metadata)
+            INNER JOIN documents d ON d.id = u.document_id
             RETURNING id
             """,
             [c[0] for c in chunks],  # document_ids
@@ -67,47 +113,318 @@ class ChunkRepository:
         )
         return [row["id"] for row in rows]
 
+    async def create_staging_table(self) -> None:
+        """COPY用の一時テーブルを用意（接続ごと。コミット時に中身を破棄）"""
+        await self.conn.execute(
+            f"""
+            CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+                document_id INTEGER,
+                content TEXT,
+                chunk_index INTEGER,
+                embedding vector,
+                metadata JSONB
+            ) ON COMMIT DELETE ROWS
+            """
+        )
+
+    async def copy_to_staging(
+        self,
+        chunks: Sequence[tuple[int, str, int, np.ndarray, Optional[dict]]]
+    ) -> int:
+        """チャンクをバイナリCOPYで一時テーブルへ送る
+
+        埋め込みは10進文字列に変換せず、vectorのバイナリ表現でそのまま送る
+
+        Args:
+            chunks: (document_id, content, chunk_index, embedding, metadata)のリスト
+
+        Returns:
+            送った件数
+        """
+        if not chunks:
+            return 0
+        await self.conn.copy_records_to_table(
+            STAGING_TABLE,
+            records=[
+                (
+                    document_id,
+                    content,
+                    chunk_index,
+                    embedding,
+                    json.dumps(metadata, ensure_ascii=False) if metadata is not None else None
+                )
+                for document_id, content, chunk_index, embedding, metadata in chunks
+            ],
+            columns=STAGING_COLUMNS
+        )
+        return len(chunks)
+
+    async def insert_from_staging(self) -> int:
+        """一時テーブルの内容をchunksへ一括登録（科目・ステータスは資料の現在値を複製）
+
+        Returns:
+            登録件数
+        """
+        result = await self.conn.execute(
+            f"""
+            INSERT INTO chunks
+            (document_id, content, chunk_index, embedding, metadata, subject, status)
+            SELECT s.document_id, s.content, s.chunk_index, s.embedding, s.metadata,
+                   d.subject, d.status
+            FROM {STAGING_TABLE} s
+            INNER JOIN documents d ON d.id = s.document_id
+            ORDER BY s.document_id, s.chunk_index
+            """
+        )
+        await self.conn.execute(f"TRUNCATE {STAGING_TABLE}")
+        # "INSERT 0 N" の形式で返るので、件数を抽出
+        return int(result.split()[-1])
+
+    async def stage_chunks(
+        self,
+        run_id: uuid.UUID,
+        chunks: Sequence[tuple[int, str, int, np.ndarray, Optional[dict]]]
+    ) -> int:
+        """取り込み中のチャンクを受け皿テーブルへバイナリCOPY（トランザクション不要）
+
+        Args:
+            run_id: 取り込みごとのID
+            chunks: (document_id, content, chunk_index, embedding, metadata)のリスト
+
+        Returns:
+            送った件数
+        """
+        if not chunks:
+            return 0
+        await self.conn.copy_records_to_table(
+            INGEST_STAGING_TABLE,
+            records=[
+                (
+                    run_id,
+                    document_id,
+                    content,
+                    chunk_index,
+                    embedding,
+                    json.dumps(metadata, ensure_ascii=False) if metadata is not None else None
+                )
+                for document_id, content, chunk_index, embedding, metadata in chunks
+            ],
+            columns=INGEST_STAGING_COLUMNS
+        )
+        return len(chunks)
+
+    async def delete_staged(self, run_id: uuid.UUID) -> int:
+        """取り込みを中断した分の受け皿の行を削除
+
+        Returns:
+            削除件数
+        """
+        result = await self.conn.execute(
+            f"DELETE FROM {INGEST_STAGING_TABLE} WHERE run_id = $1",
+            run_id
+        )
+        return int(result.split()[-1])
+
+    async def delete_stale_staged(self, max_age_hours: float) -> int:
+        """プロセスの異常終了で残った古い受け皿の行を削除
+
+        Returns:
+            削除件数
+        """
+        result = await self.conn.execute(
+            f"""
+            DELETE FROM {INGEST_STAGING_TABLE}
+            WHERE created_at < CURRENT_TIMESTAMP - make_interval(secs => $1)
+            """,
+            max_age_hours * 3600
+        )
+        return int(result.split()[-1])
+
+    async def sync_from_staging(
+        self,
+        document_id: int,
+        run_id: uuid.UUID,
+        status: str = "processing"
+    ) -> Tuple[int, int, int]:
+        """受け皿テーブルの取り込み分と資料の既存チャンクの差分だけを反映
+
+        本文と埋め込みが同じチャンク（同じ本文が複数ある場合は出現順で対応付け）は
+        行を残して順序・メタデータのみ更新し、なくなったチャンクを削除、新しいチャンクだけを
+        登録する。モデルや実行方式の変更で埋め込みが変わったチャンクは本文が同じでも
+        入れ替える。HNSWインデックスへの追加も変わったチャンクの分だけになる。
+        新しいチャンクには資料の科目と status を登録時に入れ、後から更新しない。
+        反映後、受け皿の取り込み分の行は削除する
+
+        Args:
+            document_id: 資料ID
+            run_id: stage_chunks で送った取り込みのID
+            status: 新しいチャンクに入れる資料ステータス
+
+        Returns:
+            (登録件数, 削除件数, 残した件数)
+        """
+        # 失敗しても対応表が接続に残らないようトランザクション内で作る（外側があればセーブポイント）
+        async with self.conn.transaction():
+            await self.conn.execute(
+                f"""
+                CREATE TEMP TABLE chunks_matched ON COMMIT DROP AS
+                SELECT o.id AS chunk_id, s.chunk_index, s.metadata
+                FROM (
+                    SELECT id, content, embedding,
+                           row_number() OVER (PARTITION BY content ORDER BY chunk_index) AS n
+                    FROM chunks WHERE document_id = $1
+                ) o
+                JOIN (
+                    SELECT content, chunk_index, metadata, embedding,
+                           row_number() OVER (PARTITION BY content ORDER BY chunk_index) AS n
+                    FROM {INGEST_STAGING_TABLE}
+                    WHERE run_id = $2
+                ) s ON o.content = s.content AND o.n = s.n AND o.embedding = s.embedding
+                """,
+                document_id, run_id
+            )
+            deleted = await self.conn.execute(
+                """
+                DELETE FROM chunks
+                WHERE document_id = $1
+                  AND id NOT IN (SELECT chunk_id FROM chunks_matched)
+                """,
+                document_id
+            )
+            await self.conn.execute(
+                """
+                UPDATE chunks c
+                SET chunk_index = m.chunk_index, metadata = m.metadata
+                FROM chunks_matched m
+                WHERE c.id = m.chunk_id
+                  AND (c.chunk_index IS DISTINCT FROM m.chunk_index
+                       OR c.metadata IS DISTINCT FROM m.metadata)
+                """
+            )
+            inserted = await self.conn.execute(
+                f"""
+                INSERT INTO chunks
+                (document_id, content, chunk_index, embedding, metadata, subject, status)
+                SELECT s.document_id, s.content, s.chunk_index, s.embedding, s.metadata,
+                       d.subject, $3
+                FROM {INGEST_STAGING_TABLE} s
+                INNER JOIN documents d ON d.id = s.document_id
+                WHERE s.run_id = $2
+                  AND s.document_id = $1
+                  AND s.chunk_index NOT IN (SELECT chunk_index FROM chunks_matched)
+                ORDER BY s.chunk_index
+                """,
+                document_id, run_id, status
+            )
+            kept = await self.conn.fetchval("SELECT COUNT(*) FROM chunks_matched")
+            await self.delete_staged(run_id)
+            await self.conn.execute("DROP TABLE chunks_matched")
+            return int(inserted.split()[-1]), int(deleted.split()[-1]), kept
+
+    async def bulk_create(
+        self,
+        chunks: Sequence[tuple[int, str, int, np.ndarray, Optional[dict]]],
+        batch_size: int = 1000
+    ) -> int:
+        """COPY経由で複数チャンクを一括作成（1トランザクション）
+
+        Args:
+            chunks: (document_id, content, chunk_index, embedding, metadata)のリスト
+            batch_size: 1回のCOPYで送る件数
+
+        Returns:
+            作成件数
+        """
+        async with self.conn.transaction():
+            await self.create_staging_table()
+            for start in range(0, len(chunks), batch_size):
+                await self.copy_to_staging(chunks[start:start + batch_size])
+            return await self.insert_from_staging()
+
     async def vector_search(
         self,
-        query_embedding: List[float],
+        query_embedding: np.ndarray,
         top_k: int = 5,
-        subject_filter: Optional[str] = None
+        subject_filter: Optional[str] = None,
+        index_mode: str = INDEX_HALFVEC,
+        rerank_factor: int = 4,
+        iterative_scan: Optional[str] = None
     ) -> List[dict]:
         """ベクトル類似度検索
 
+        量子化した式インデックス（halfvec / bit）で top_k × rerank_factor 件の
+        候補を取り、元のfloat32ベクトルとのコサイン距離で並べ直す（2段階検索）。
+
+        ステータス・科目はchunksに複製した列で絞り込むため、documentsとの
+        結合は取得後の表示用のみ。科目ごとの部分インデックスが使えるよう
+        カスタムプランを強制し、pgvector 0.8以降の反復スキャンを有効にすると
+        絞り込みで件数が減っても top_k 件になるまで索引を読み進める
+
         Args:
-            query_embedding: クエリベクトル
+            query_embedding: クエリベクトル（float32配列）
             top_k: 取得件数
             subject_filter: 科目でフィルタ（オプション）
+            index_mode: 候補検索に使うインデックス（halfvec / bit）
+            rerank_factor: 並べ直す候補数の倍率
+            iterative_scan: hnsw.iterative_scan の値（relaxed_order / strict_order。Noneなら設定しない）
 
         Returns:
             類似チャンクのリスト（document情報付き）
         """
-        query = """
-            SELECT 
-                c.*,
-                d.filename,
-                d.subject,
-                1 - (c.embedding <=> $1::vector) as similarity
-            FROM chunks c
-            INNER JOIN documents d ON c.document_id = d.id
-            WHERE d.status = 'completed'
-        """
+        if index_mode not in _CANDIDATE_DISTANCE:
+            raise ValueError(f"Unknown vector index mode: {index_mode}")
+        if iterative_scan and iterative_scan not in ITERATIVE_SCAN_MODES:
+            raise ValueError(f"Unknown iterative scan mode: {iterative_scan}")
+
+        where = "WHERE c.status = 'completed'"
         params = [query_embedding]
         param_index = 2
 
         if subject_filter:
-            query += f" AND d.subject = ${param_index}"
+            where += f" AND c.subject = ${param_index}"
             params.append(subject_filter)
             param_index += 1
 
-        query += f"""
+        candidates = top_k * max(rerank_factor, 1)
+        # 反復スキャン（relaxed_order）は順序が前後しうるため、候補は常に厳密な距離で並べ直す
+        query = f"""
+            WITH candidates AS MATERIALIZED (
+                SELECT c.id
+                FROM chunks c
+                {where}
+                ORDER BY {_CANDIDATE_DISTANCE[index_mode]}
+                LIMIT ${param_index}
+            )
+            SELECT 
+                c.id,
+                c.document_id,
+                c.content,
+                c.chunk_index,
+                c.metadata,
+                d.filename,
+                c.subject,
+                1 - (c.embedding <=> $1::vector) as similarity
+            FROM candidates
+            INNER JOIN chunks c ON c.id = candidates.id
+            INNER JOIN documents d ON c.document_id = d.id
             ORDER BY c.embedding <=> $1::vector
-            LIMIT ${param_index}
+            LIMIT ${param_index + 1}
         """
-        params.append(top_k)
+        params.extend([candidates, top_k])
 
-        rows = await self.conn.fetch(query, *params)
+        async with self.conn.transaction():
+            # HNSWの探索幅が候補数より小さいと候補が欠ける
+            await self.conn.execute(
+                f"SET LOCAL hnsw.ef_search = {min(max(candidates, 40), 1000)}"
+            )
+            if iterative_scan:
+                await self.conn.execute(
+                    f"SET LOCAL hnsw.iterative_scan = {iterative_scan}"
+                )
+            if subject_filter:
+                # 科目を定数として計画させ、科目ごとの部分インデックスを選べるようにする
+                await self.conn.execute("SET LOCAL plan_cache_mode = force_custom_plan")
+            rows = await self.conn.fetch(query, *params)
         return [dict(row) for row in rows]
 
     async def get_by_document_id(
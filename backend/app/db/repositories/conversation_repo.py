@@ -41,6 +41,39 @@ class ConversationRepository:
         )
         return row["id"]
 
+    async def create_batch(self, records: List[dict]) -> int:
+        """会話をCOPYでまとめて記録
+
+        Args:
+            records: create() と同じキーを持つ辞書のリスト
+
+        Returns:
+            記録した件数
+        """
+        if not records:
+            return 0
+
+        await self.conn.copy_records_to_table(
+            "conversations",
+            records=[
+                (
+                    r["session_id"],
+                    r["question"],
+                    r.get("question_image_path"),
+                    r["answer"],
+                    r.get("used_rag", True),
+                    r.get("used_web_search", False),
+                    r.get("referenced_chunks") or []
+                )
+                for r in records
+            ],
+            columns=[
+                "session_id", "question", "question_image_path", "answer",
+                "used_rag", "used_web_search", "referenced_chunks"
+            ]
+        )
+        return len(records)
+
     async def get_by_session_id(
         self,
         session_id: str,
@@ -43,6 +43,17 @@ class DocumentRepository:
         )
         return dict(row) if row else None
 
+    async def get_for_update(self, document_id: int) -> Optional[dict]:
+        """資料を取得し、トランザクション終了まで行ロックを取る
+
+        同じ資料の差し替え・チャンク登録を直列化するために使う
+        """
+        row = await self.conn.fetchrow(
+            "SELECT * FROM documents WHERE id = $1 FOR UPDATE",
+            document_id
+        )
+        return dict(row) if row else None
+
     async def list_documents(
         self,
         status: Optional[str] = None,
@@ -110,27 +121,68 @@ class DocumentRepository:
         status: str,
         error_message: Optional[str] = None
     ) -> bool:
-        """資料のステータスを更新"""
+        """資料のステータスを更新（chunksに複製したステータスも合わせる）"""
+        async with self.conn.transaction():
+            result = await self.conn.execute(
+                """
+                UPDATE documents 
+                SET status = $1, error_message = $2, updated_at = CURRENT_TIMESTAMP
+                WHERE id = $3
+                """,
+                status, error_message, document_id
+            )
+            # 値が変わる行だけ更新（不要な行バージョン・索引項目を作らない）
+            await self.conn.execute(
+                """
+                UPDATE chunks SET status = $1
+                WHERE document_id = $2 AND status IS DISTINCT FROM $1
+                """,
+                status, document_id
+            )
+        return result == "UPDATE 1"
+
+    async def update_file(
+        self,
+        document_id: int,
+        filename: str,
+        original_path: str,
+        file_size_bytes: Optional[int] = None,
+        mime_type: Optional[str] = None
+    ) -> bool:
+        """資料のファイルを差し替え、取り込み中に戻す
+
+        chunksのステータスは変えず、取り込み直しが完了するまで以前の
+        チャンクを検索対象に残す
+        """
         result = await self.conn.execute(
             """
             UPDATE documents 
-            SET status = $1, error_message = $2, updated_at = CURRENT_TIMESTAMP
-            WHERE id = $3
+            SET filename = $1, original_path = $2, file_size_bytes = $3, mime_type = $4,
+                status = 'processing', error_message = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = $5
             """,
-            status, error_message, document_id
+            filename, original_path, file_size_bytes, mime_type, document_id
         )
         return result == "UPDATE 1"
 
     async def update_subject(self, document_id: int, subject: str) -> bool:
-        """資料の科目を更新"""
-        result = await self.conn.execute(
-            """
-            UPDATE documents 
-            SET subject = $1, updated_at = CURRENT_TIMESTAMP
-            WHERE id = $2
-            """,
-            subject, document_id
-        )
+        """資料の科目を更新（chunksに複製した科目も合わせる）"""
+        async with self.conn.transaction():
+            result = await self.conn.execute(
+                """
+                UPDATE documents 
+                SET subject = $1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = $2
+                """,
+                subject, document_id
+            )
+            await self.conn.execute(
+                """
+                UPDATE chunks SET subject = $1
+                WHERE document_id = $2 AND subject IS DISTINCT FROM $1
+                """,
+                subject, document_id
+            )
         return result == "UPDATE 1"
 
     async def delete(self, document_id: int) -> bool:
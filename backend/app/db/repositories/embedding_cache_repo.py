@@ -0,0 +1,44 @@
+"""embedding_cacheテーブル操作"""
+from typing import Dict, List, Sequence
+import asyncpg
+import numpy as np
+
+
+class EmbeddingCacheRepository:
+    """埋め込みキャッシュリポジトリ（キーは本文とモデル名のSHA-256）"""
+
+    def __init__(self, conn: asyncpg.Connection):
+        self.conn = conn
+
+    async def get_many(self, keys: Sequence[bytes]) -> Dict[bytes, np.ndarray]:
+        """キャッシュ済みのベクトルを取得
+
+        Returns:
+            キー → ベクトル（見つかったものだけ）
+        """
+        if not keys:
+            return {}
+        rows = await self.conn.fetch(
+            "SELECT key, embedding FROM embedding_cache WHERE key = ANY($1::bytea[])",
+            list(keys)
+        )
+        return {bytes(row["key"]): row["embedding"] for row in rows}
+
+    async def put_many(
+        self,
+        model: str,
+        keys: List[bytes],
+        embeddings: Sequence[np.ndarray]
+    ) -> None:
+        """ベクトルを登録（既存のキーはそのまま）"""
+        if not keys:
+            return
+        await self.conn.execute(
+            """
+            INSERT INTO embedding_cache (key, model, embedding)
+            SELECT key, $2, embedding
+            FROM UNNEST($1::bytea[], $3::vector[]) AS t(key, embedding)
+            ON CONFLICT (key) DO NOTHING
+            """,
+            keys, model, list(embeddings)
+        )
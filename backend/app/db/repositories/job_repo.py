@@ -0,0 +1,165 @@
+"""ingestion_jobsテーブル操作"""
+from typing import List, Optional
+import asyncpg
+
+
+class JobRepository:
+    """取り込みジョブリポジトリ
+
+    複数プロセス・複数ホストのワーカーが同じテーブルから
+    FOR UPDATE SKIP LOCKED で重複なくジョブを取得する
+    """
+
+    def __init__(self, conn: asyncpg.Connection):
+        self.conn = conn
+
+    async def enqueue(self, document_id: int, max_attempts: int = 3) -> int:
+        """ジョブを登録
+
+        Returns:
+            作成されたジョブID
+        """
+        row = await self.conn.fetchrow(
+            """
+            INSERT INTO ingestion_jobs (document_id, max_attempts)
+            VALUES ($1, $2)
+            RETURNING id
+            """,
+            document_id, max_attempts
+        )
+        return row["id"]
+
+    async def claim(self, worker_id: str, lease_seconds: float) -> Optional[dict]:
+        """実行可能なジョブを1件取得し、リースを設定
+
+        待機中で実行時刻を過ぎたジョブに加え、リース切れの実行中ジョブ
+        （ワーカーが落ちたもの）も取り直す
+
+        Returns:
+            取得したジョブ（なければNone）
+        """
+        row = await self.conn.fetchrow(
+            """
+            UPDATE ingestion_jobs j
+            SET status = 'running',
+                attempts = j.attempts + 1,
+                locked_by = $1,
+                lease_expires_at = CURRENT_TIMESTAMP + make_interval(secs => $2),
+                updated_at = CURRENT_TIMESTAMP
+            FROM (
+                SELECT id FROM ingestion_jobs
+                WHERE (status = 'queued' AND run_after <= CURRENT_TIMESTAMP)
+                   OR (status = 'running' AND lease_expires_at < CURRENT_TIMESTAMP
+                       AND attempts < max_attempts)
+                ORDER BY run_after, id
+                FOR UPDATE SKIP LOCKED
+                LIMIT 1
+            ) next_job
+            WHERE j.id = next_job.id
+            RETURNING j.*
+            """,
+            worker_id, float(lease_seconds)
+        )
+        return dict(row) if row else None
+
+    async def heartbeat(self, job_id: int, worker_id: str, lease_seconds: float) -> bool:
+        """リースを延長
+
+        Returns:
+            False: 他のワーカーに取り直されている
+        """
+        result = await self.conn.execute(
+            """
+            UPDATE ingestion_jobs
+            SET lease_expires_at = CURRENT_TIMESTAMP + make_interval(secs => $3),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = $1 AND locked_by = $2 AND status = 'running'
+            """,
+            job_id, worker_id, float(lease_seconds)
+        )
+        return result == "UPDATE 1"
+
+    async def complete(self, job_id: int, worker_id: str) -> bool:
+        """ジョブを完了にする"""
+        result = await self.conn.execute(
+            """
+            UPDATE ingestion_jobs
+            SET status = 'completed', locked_by = NULL, lease_expires_at = NULL,
+                last_error = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = $1 AND locked_by = $2 AND status = 'running'
+            """,
+            job_id, worker_id
+        )
+        return result == "UPDATE 1"
+
+    async def fail(
+        self,
+        job_id: int,
+        worker_id: str,
+        error_message: str,
+        retry_delay_seconds: float
+    ) -> Optional[str]:
+        """ジョブの失敗を記録
+
+        試行回数が残っていれば retry_delay_seconds 後に再実行できる状態に戻す
+
+        Returns:
+            更新後のステータス（queued / failed）。他のワーカーに取り直されていればNone
+        """
+        row = await self.conn.fetchrow(
+            """
+            UPDATE ingestion_jobs
+            SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                run_after = CURRENT_TIMESTAMP + make_interval(secs => $4),
+                locked_by = NULL,
+                lease_expires_at = NULL,
+                last_error = $3,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = $1 AND locked_by = $2 AND status = 'running'
+            RETURNING status
+            """,
+            job_id, worker_id, error_message, float(retry_delay_seconds)
+        )
+        return row["status"] if row else None
+
+    async def fail_expired(self) -> List[int]:
+        """試行回数を使い切ったままリースが切れたジョブを失敗にする
+
+        Returns:
+            失敗にしたジョブの資料IDのリスト
+        """
+        rows = await self.conn.fetch(
+            """
+            UPDATE ingestion_jobs
+            SET status = 'failed',
+                locked_by = NULL,
+                lease_expires_at = NULL,
+                last_error = COALESCE(last_error, 'lease expired'),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE status = 'running'
+              AND lease_expires_at < CURRENT_TIMESTAMP
+              AND attempts >= max_attempts
+            RETURNING document_id
+            """
+        )
+        return [row["document_id"] for row in rows]
+
+    async def has_active(self, document_id: int) -> bool:
+        """資料に待機中・実行中のジョブがあるか"""
+        return await self.conn.fetchval(
+            """
+            SELECT EXISTS (
+                SELECT 1 FROM ingestion_jobs
+                WHERE document_id = $1 AND status IN ('queued', 'running')
+            )
+            """,
+            document_id
+        )
+
+    async def get_by_document_id(self, document_id: int) -> List[dict]:
+        """資料のジョブ履歴を取得"""
+        rows = await self.conn.fetch(
+            "SELECT * FROM ingestion_jobs WHERE document_id = $1 ORDER BY id",
+            document_id
+        )
+        return [dict(row) for row in rows]
@@ -37,6 +37,11 @@ class AnswerResponse(BaseModel):
         description="RAG使用時の参照資料"
     )
     processing_time_ms: int = Field(..., description="処理時間（ミリ秒）")
+    cache_hit: bool = Field(False, description="解答キャッシュを使用したか")
+    saved_generation_ms: Optional[int] = Field(
+        None,
+        description="キャッシュヒットで省略したLLM生成時間（ミリ秒）"
+    )
 
 
 # ドキュメント関連
@@ -56,6 +61,13 @@ class DocumentListResponse(BaseModel):
     total: int
 
 
+class DocumentUploadResponse(BaseModel):
+    """資料アップロードレスポンス"""
+    document_id: int
+    status: str = Field(..., description="取り込み状態（processing）")
+    message: str
+
+
 class DocumentDeleteResponse(BaseModel):
     """資料削除レスポンス"""
     success: bool
@@ -74,6 +86,7 @@ class HealthResponse(BaseModel):
     """ヘルスチェックレスポンス"""
     status: str
     services: ServiceStatus
+    ready: bool = Field(True, description="起動時ウォームアップが完了しているか")
 
 
 # データベースモデル
@@ -3,4 +3,21 @@ from .ocr_service import OCRService
 from .llm_service import LLMService
 from .embedding_service import EmbeddingService
 from .rag_service import RAGService
-
+from .answer_cache import SemanticAnswerCache, get_answer_cache
+from .http_client import init_http_clients, close_http_clients, get_http_session
+from .warmup import warm_up_services, is_ready, mark_ready
+from .conversation_logger import (
+    ConversationLogger,
+    get_conversation_logger,
+    init_conversation_logger,
+    close_conversation_logger
+)
+from .ingestion import (
+    IngestionPipeline,
+    IngestionStats,
+    claim_document,
+    release_document,
+    start_ingestion,
+    close_ingestion,
+)
+from .ingestion_worker import IngestionWorker
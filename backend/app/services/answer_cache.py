@@ -0,0 +1,173 @@
+"""セマンティック解答キャッシュ
+
+質問の埋め込みが近く、かつ検索されたチャンクが同一であれば過去の解答を再利用する
+"""
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from ..config import settings
+
+
+@dataclass
+class CachedAnswer:
+    """キャッシュされた解答"""
+    question_vector: np.ndarray
+    chunk_ids: Tuple[int, ...]
+    document_ids: frozenset
+    answer: str
+    generation_time_ms: int
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """コサイン類似度で引くTTL付きLRUキャッシュ
+
+    エントリは検索で得たチャンクIDの組で引くため、資料の削除や再取り込みで
+    チャンクが消えた・差し替わった（新しいIDになった）解答は、
+    他のプロセスのキャッシュに残っていても検索結果と一致せずヒットしない
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        ttl_seconds: Optional[float] = None,
+        similarity_threshold: Optional[float] = None
+    ):
+        """
+        Args:
+            max_entries: 最大件数（0でキャッシュしない。Noneなら設定値）
+            ttl_seconds: 有効期間（秒。Noneなら設定値）
+            similarity_threshold: 同じ質問とみなすコサイン類似度の下限（Noneなら設定値）
+        """
+        self.max_entries = (
+            max_entries if max_entries is not None else settings.answer_cache_max_entries
+        )
+        self.ttl_seconds = (
+            ttl_seconds if ttl_seconds is not None else settings.answer_cache_ttl_seconds
+        )
+        self.similarity_threshold = (
+            similarity_threshold if similarity_threshold is not None
+            else settings.answer_cache_similarity_threshold
+        )
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        # チャンクIDの組ごとのエントリID（比較対象を絞り込むため）
+        self._by_chunks: Dict[Tuple[int, ...], List[int]] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(
+        self,
+        question_vector: Sequence[float],
+        chunk_ids: Sequence[int]
+    ) -> Optional[CachedAnswer]:
+        """類似質問の解答を検索
+
+        Args:
+            question_vector: 正規化済みの質問ベクトル
+            chunk_ids: 今回の検索で得たチャンクID（順序込みで一致が必要）
+
+        Returns:
+            ヒットした解答（なければNone）
+        """
+        key = tuple(chunk_ids)
+        query = np.asarray(question_vector, dtype=np.float32)
+        now = time.monotonic()
+
+        best_id: Optional[int] = None
+        best_similarity = self.similarity_threshold
+        for entry_id in list(self._by_chunks.get(key, [])):
+            entry = self._entries[entry_id]
+            if now - entry.created_at >= self.ttl_seconds:
+                self._remove(entry_id)
+                continue
+            # e5の出力は正規化済みなので内積＝コサイン類似度
+            similarity = float(np.dot(query, entry.question_vector))
+            if similarity >= best_similarity:
+                best_id, best_similarity = entry_id, similarity
+
+        if best_id is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(best_id)
+        return self._entries[best_id]
+
+    def store(
+        self,
+        question_vector: Sequence[float],
+        chunk_ids: Sequence[int],
+        document_ids: Sequence[int],
+        answer: str,
+        generation_time_ms: int
+    ) -> None:
+        """解答をキャッシュに登録（上限超過時は最も古く使われたものを破棄）"""
+        if self.max_entries <= 0:
+            return
+
+        entry_id = self._next_id
+        self._next_id += 1
+
+        key = tuple(chunk_ids)
+        self._entries[entry_id] = CachedAnswer(
+            question_vector=np.asarray(question_vector, dtype=np.float32),
+            chunk_ids=key,
+            document_ids=frozenset(document_ids),
+            answer=answer,
+            generation_time_ms=generation_time_ms,
+            created_at=time.monotonic()
+        )
+        self._by_chunks.setdefault(key, []).append(entry_id)
+
+        while len(self._entries) > self.max_entries:
+            oldest_id = next(iter(self._entries))
+            self._remove(oldest_id)
+
+    def invalidate_document(self, document_id: int) -> int:
+        """指定資料を参照している解答を破棄
+
+        破棄するのはこのプロセスのキャッシュのみ。複数ワーカーで動かす場合、
+        他のワーカーのエントリは検索結果のチャンクIDと一致しなくなるため
+        使われず、TTLまたはLRUで消える
+
+        Returns:
+            破棄件数
+        """
+        stale = [
+            entry_id for entry_id, entry in self._entries.items()
+            if document_id in entry.document_ids
+        ]
+        for entry_id in stale:
+            self._remove(entry_id)
+        return len(stale)
+
+    def clear(self) -> None:
+        """全エントリを破棄"""
+        self._entries.clear()
+        self._by_chunks.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _remove(self, entry_id: int) -> None:
+        """エントリと索引を削除"""
+        entry = self._entries.pop(entry_id)
+        ids = self._by_chunks.get(entry.chunk_ids, [])
+        ids.remove(entry_id)
+        if not ids:
+            del self._by_chunks[entry.chunk_ids]
+
+
+# プロセス内で共有するキャッシュ
+_answer_cache: Optional[SemanticAnswerCache] = None
+
+
+def get_answer_cache() -> SemanticAnswerCache:
+    """共有解答キャッシュを取得"""
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = SemanticAnswerCache()
+    return _answer_cache
@@ -0,0 +1,203 @@
+"""会話履歴の非同期バッチ書き込み（write-behind）
+
+解答の応答経路からDB書き込みを外し、有界キューに積んだ会話を
+件数または時間の閾値でまとめてCOPYする
+"""
+import asyncio
+import time
+from typing import List, Optional, Tuple
+from ..config import settings
+from ..db import get_db_connection
+from ..db.repositories import ConversationRepository
+from ..utils.logger import setup_logger
+
+logger = setup_logger()
+
+
+class ConversationLogger:
+    """会話履歴をバッチでDBに書き込むロガー"""
+
+    def __init__(
+        self,
+        max_queue: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        late_seconds: float = 10.0
+    ):
+        """
+        Args:
+            max_queue: キューの上限件数（超過分は破棄）
+            batch_size: 1回の書き込みの最大件数
+            flush_interval: 書き込み間隔（秒）
+            late_seconds: 受付から書き込みまでがこれを超えたら遅延として数える
+        """
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.late_seconds = late_seconds
+        # (受付時刻, 会話レコード)
+        self._queue: "asyncio.Queue[Tuple[float, dict]]" = asyncio.Queue(maxsize=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        # 停止要求（書き込みタスクは取り出し済みの分とキューの残りを書いてから終わる）
+        self._closing = asyncio.Event()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.late = 0
+
+    def log(self, **record) -> bool:
+        """会話を書き込み待ちに追加（待たずに返る）
+
+        Args:
+            record: ConversationRepository.create と同じ引数
+
+        Returns:
+            False: キューが満杯で破棄した
+        """
+        try:
+            self._queue.put_nowait((time.monotonic(), record))
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                logger.warning(f"Conversation log queue is full, dropped {self.dropped} rows")
+            return False
+
+    def start(self) -> None:
+        """書き込みタスクを起動"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """書き込みタスクに停止を知らせ、残りを書き出し終えるまで待つ
+
+        タスクを直接キャンセルすると、キューから取り出して書き込み待ちの
+        バッチが失われるため、停止要求を出してタスク自身に書き切らせる
+        """
+        self._closing.set()
+        drain = self._task if self._task is not None else self.flush()
+        try:
+            await asyncio.wait_for(drain, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error(
+                f"Timed out draining conversation log, "
+                f"at least {self._queue.qsize()} rows lost"
+            )
+        self._task = None
+
+    async def flush(self) -> None:
+        """キューにある会話をすべて書き出す"""
+        while not self._queue.empty():
+            await self._write(self._take_batch())
+
+    def _take_batch(self) -> List[Tuple[float, dict]]:
+        """キューから最大 batch_size 件を取り出す"""
+        batch = []
+        while len(batch) < self.batch_size and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _next(self, timeout: Optional[float]) -> Optional[Tuple[float, dict]]:
+        """キューから1件取り出す
+
+        Returns:
+            None: timeout 秒経過した、または停止要求があってキューが空
+        """
+        if not self._queue.empty():
+            return self._queue.get_nowait()
+        if self._closing.is_set():
+            return None
+
+        get = asyncio.ensure_future(self._queue.get())
+        closing = asyncio.ensure_future(self._closing.wait())
+        try:
+            await asyncio.wait(
+                {get, closing}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            closing.cancel()
+            if not get.done():
+                # Queue.get はキャンセルされても取り出し前の要素をキューに残す
+                get.cancel()
+        if get.done() and not get.cancelled():
+            return get.result()
+        return self._queue.get_nowait() if not self._queue.empty() else None
+
+    async def _run(self) -> None:
+        """件数が溜まるか flush_interval が経つたびに書き出す
+
+        停止要求後はキューが空になるまで待たずに書き出して終わる
+        """
+        while True:
+            first = await self._next(None)
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                item = await self._next(remaining)
+                if item is None:
+                    break
+                batch.append(item)
+            await self._write(batch)
+
+    async def _write(self, batch: List[Tuple[float, dict]]) -> None:
+        """1バッチを書き込む（失敗しても解答処理には影響させない）"""
+        if not batch:
+            return
+        try:
+            async with get_db_connection() as conn:
+                await ConversationRepository(conn).create_batch(
+                    [record for _, record in batch]
+                )
+        except Exception as e:
+            self.failed += len(batch)
+            logger.error(f"Failed to write {len(batch)} conversation rows: {e}")
+            return
+
+        now = time.monotonic()
+        self.written += len(batch)
+        self.late += sum(1 for queued_at, _ in batch if now - queued_at > self.late_seconds)
+
+    def stats(self) -> dict:
+        """統計情報"""
+        return {
+            "queued": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "late": self.late,
+        }
+
+
+# アプリ全体で共有するロガー
+_conversation_logger: Optional[ConversationLogger] = None
+
+
+def get_conversation_logger() -> ConversationLogger:
+    """共有の会話ロガーを取得（初回のみ生成）"""
+    global _conversation_logger
+    if _conversation_logger is None:
+        _conversation_logger = ConversationLogger(
+            max_queue=settings.conversation_log_queue_size,
+            batch_size=settings.conversation_log_batch_size,
+            flush_interval=settings.conversation_log_flush_interval,
+            late_seconds=settings.conversation_log_late_seconds
+        )
+    return _conversation_logger
+
+
+async def init_conversation_logger() -> None:
+    """書き込みタスクを起動（lifespan起動時に呼ぶ）"""
+    get_conversation_logger().start()
+
+
+async def close_conversation_logger() -> None:
+    """残りを書き出して停止（lifespan終了時に呼ぶ）"""
+    global _conversation_logger
+    if _conversation_logger is not None:
+        await _conversation_logger.close()
+        logger.info(f"Conversation log stats: {_conversation_logger.stats()}")
+        _conversation_logger = None
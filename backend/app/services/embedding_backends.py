@@ -0,0 +1,141 @@
+"""埋め込み計算バックエンド
+
+EmbeddingServiceから実際のencode処理を切り離し、プロセス内モデルと
+外部の埋め込みワーカーを切り替えられるようにする
+"""
+import asyncio
+from typing import List, Optional
+import aiohttp
+import numpy as np
+from ..config import settings
+from .http_client import get_http_session
+
+
+class SentenceTransformerBackend:
+    """プロセス内でSentenceTransformerを実行するバックエンド"""
+
+    # 永続埋め込みキャッシュのキーに含める実行方式（float32）
+    cache_id = "sentence-transformers"
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self._model = None
+
+    def load(self) -> None:
+        """モデルを遅延ロード"""
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+            self._model = SentenceTransformer(self.model_name)
+
+    async def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """プレフィックス付きテキストを正規化済みfloat32ベクトルに変換
+
+        Args:
+            texts: プレフィックス付きテキスト
+            batch_size: 1回の順伝播で処理する件数
+
+        Returns:
+            (件数, 次元) のfloat32配列
+        """
+        self.load()
+
+        # 非同期実行（CPUバウンドな処理をブロックしないため）
+        loop = asyncio.get_running_loop()
+        embeddings = await loop.run_in_executor(
+            None,
+            lambda: self._model.encode(
+                texts,
+                normalize_embeddings=True,
+                batch_size=batch_size,
+                show_progress_bar=False
+            )
+        )
+        return np.asarray(embeddings, dtype=np.float32)
+
+
+class RemoteEmbeddingBackend:
+    """埋め込みワーカー（embedding-service）にHTTPで委譲するバックエンド
+
+    ワーカー側で1ホスト1モデルを保持し、複数のAPIワーカーから共有する
+    """
+
+    def __init__(self, base_url: str, model_name: str, backend_id: Optional[str] = None):
+        """
+        Args:
+            base_url: 埋め込みワーカーのURL
+            model_name: 期待するモデル名（X-Embedding-Model）
+            backend_id: 期待する計算方式（X-Embedding-Backend、省略時は設定値）
+        """
+        self.base_url = base_url.rstrip("/")
+        self.model_name = model_name
+        # 永続埋め込みキャッシュのキーに含める実行方式
+        self.cache_id = backend_id or settings.embedding_service_backend
+
+    def load(self) -> None:
+        """モデルはワーカー側で保持するため何もしない"""
+
+    async def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """ワーカーでベクトル化（float32のバイナリで受け取る）
+
+        Raises:
+            ValueError: ワーカーとの通信エラー、またはモデル・計算方式の不一致
+        """
+        try:
+            session = get_http_session("embedding")
+            async with session.post(
+                f"{self.base_url}/api/embed",
+                json={"texts": texts, "batch_size": batch_size},
+                headers={"Accept": "application/octet-stream"},
+                timeout=aiohttp.ClientTimeout(total=settings.embedding_service_timeout)
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise ValueError(
+                        f"Embedding worker failed with status {response.status}: {error_text}"
+                    )
+
+                model = response.headers.get("X-Embedding-Model")
+                if model and model != self.model_name:
+                    raise ValueError(
+                        f"Embedding worker serves {model}, expected {self.model_name}"
+                    )
+
+                # 計算方式が違うベクトルを同じキーでキャッシュに混ぜない
+                backend_id = response.headers.get("X-Embedding-Backend")
+                if backend_id and backend_id != self.cache_id:
+                    raise ValueError(
+                        f"Embedding worker uses {backend_id}, expected {self.cache_id}"
+                    )
+
+                body = await response.read()
+
+        except aiohttp.ClientError as e:
+            raise ValueError(f"Embedding worker connection error: {e}")
+
+        vectors = np.frombuffer(body, dtype="<f4")
+        return vectors.reshape(len(texts), -1)
+
+
+def create_backend(
+    model_name: str,
+    service_url: Optional[str] = None,
+    backend_name: Optional[str] = None
+):
+    """設定に応じたバックエンドを生成
+
+    Args:
+        model_name: モデル名
+        service_url: 埋め込みワーカーのURL（指定時は最優先）
+        backend_name: sentence-transformers | onnx | onnx-int8
+    """
+    service_url = service_url or settings.embedding_service_url
+    if service_url:
+        return RemoteEmbeddingBackend(service_url, model_name)
+
+    backend_name = backend_name or settings.embedding_backend
+    if backend_name in ("onnx", "onnx-int8"):
+        from .onnx_embedding import OnnxEmbeddingBackend
+        return OnnxEmbeddingBackend(model_name, quantize=backend_name == "onnx-int8")
+    if backend_name != "sentence-transformers":
+        raise ValueError(f"Unknown embedding backend: {backend_name}")
+    return SentenceTransformerBackend(model_name)
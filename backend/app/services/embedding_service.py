@@ -1,23 +1,51 @@
 """埋め込みサービス - Sentence Transformers"""
 import asyncio
-from typing import List, Optional
-from sentence_transformers import SentenceTransformer
+import hashlib
+from typing import List, Optional, Set, Tuple
+import numpy as np
 from ..config import settings
+from ..utils.lru_cache import LRUCache
+from .embedding_backends import create_backend
 
 
 class EmbeddingService:
     """埋め込みサービス（multilingual-e5-large）"""
 
-    def __init__(self, model_name: Optional[str] = None):
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        backend=None
+    ):
         self.model_name = model_name or settings.embedding_model
-        self._model: Optional[SentenceTransformer] = None
+        # encodeの実行先（プロセス内モデル or 埋め込みワーカー）
+        self.backend = backend or create_backend(self.model_name)
+        # クエリ埋め込みのLRU（float32配列で保持）
+        self.query_cache: LRUCache[np.ndarray] = LRUCache(
+            max_entries=settings.embedding_cache_max_entries,
+            max_bytes=settings.embedding_cache_max_mb * 1024 * 1024,
+            sizeof=lambda vector: vector.nbytes
+        )
+        # マイクロバッチ待ちのクエリ（プレフィックス付きテキスト, 結果Future）
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # 実行中のバッチ（参照を保持してGCされないようにし、終了時に止める）
+        self._batch_tasks: Set[asyncio.Task] = set()
 
     def _load_model(self):
         """モデルを遅延ロード"""
-        if self._model is None:
-            self._model = SentenceTransformer(self.model_name)
+        self.backend.load()
+
+    async def warm_up(self) -> bool:
+        """モデルをロードし、ダミー入力で1回推論しておく
 
-    async def embed_query(self, text: str) -> List[float]:
+        キャッシュやマイクロバッチは通さず、バックエンドを直接呼ぶ
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._load_model)
+        await self.backend.encode(["query: warmup"], batch_size=1)
+        return True
+
+    async def embed_query(self, text: str) -> np.ndarray:
         """検索クエリをベクトル化
 
         multilingual-e5では、検索クエリには"query: "プレフィックスを付ける
@@ -26,27 +54,101 @@ class EmbeddingService:
             text: クエリテキスト
 
         Returns:
-            1024次元のベクトル
+            1024次元のfloat32ベクトル（キャッシュと共有する読み取り専用配列）
         """
-        self._load_model()
-        
         # 検索クエリには"query: "プレフィックスを付ける
-        prefixed = f"query: {text}"
+        # （前後の空白のみ除く。NFKCなどの正規化は数式の表記を変えるため行わない）
+        prefixed = f"query: {text.strip()}"
+
+        # モデルに渡すテキストが同じ場合だけ再計算しない
+        cache_key = (self.model_name, prefixed)
+        cached = self.query_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # 同時に届いたクエリとまとめて1回のencodeで処理する
+        vector = await self._encode_query_batched(prefixed)
+        self.query_cache.put(cache_key, vector)
         
-        # 非同期実行（CPUバウンドな処理をブロックしないため）
-        loop = asyncio.get_event_loop()
-        embedding = await loop.run_in_executor(
-            None,
-            lambda: self._model.encode(
-                prefixed,
-                normalize_embeddings=True,
-                show_progress_bar=False
+        return vector
+
+    async def _encode_query_batched(self, prefixed: str) -> np.ndarray:
+        """クエリをマイクロバッチに積み、バッチ処理の結果を待つ
+
+        最初のクエリから embedding_batch_max_wait_ms 経過するか、
+        embedding_batch_max_size 件たまった時点でまとめてencodeする
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((prefixed, future))
+
+        if len(self._pending) >= settings.embedding_batch_max_size:
+            self._flush_pending()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(
+                settings.embedding_batch_max_wait_ms / 1000,
+                self._flush_pending
             )
-        )
-        
-        return embedding.tolist()
 
-    async def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await future
+
+    def _flush_pending(self) -> None:
+        """待ち行列のクエリをバッチとして処理開始"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run_query_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def close(self) -> None:
+        """実行中・待ち中のバッチを止める（待っている呼び出し元はキャンセルされる）"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        batch, self._pending = self._pending, []
+        for _, future in batch:
+            future.cancel()
+
+        for task in list(self._batch_tasks):
+            task.cancel()
+        await asyncio.gather(*self._batch_tasks, return_exceptions=True)
+
+    async def _run_query_batch(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        """バッチをencodeし、各呼び出し元のFutureを解決"""
+        # 同一テキストは1回だけ計算
+        texts = list(dict.fromkeys(text for text, _ in batch))
+
+        try:
+            embeddings = await self.backend.encode(texts, batch_size=len(texts))
+        except BaseException as e:
+            for _, future in batch:
+                if not future.done():
+                    if isinstance(e, asyncio.CancelledError):
+                        future.cancel()
+                    else:
+                        future.set_exception(e)
+            if isinstance(e, Exception):
+                return
+            raise
+
+        vectors = {}
+        for text, embedding in zip(texts, embeddings):
+            # バッチ配列全体を保持しないよう行ごとにコピーする
+            vector = np.array(embedding, dtype=np.float32)
+            vector.setflags(write=False)
+            vectors[text] = vector
+
+        for text, future in batch:
+            # 呼び出し元がキャンセル済みなら何もしない
+            if not future.done():
+                future.set_result(vectors[text])
+
+    async def embed_documents(self, texts: List[str]) -> np.ndarray:
         """複数ドキュメントをバッチでベクトル化
 
         multilingual-e5では、ドキュメントには"passage: "プレフィックスを付ける
@@ -55,35 +157,40 @@ class EmbeddingService:
             texts: ドキュメントテキストのリスト
 
         Returns:
-            1024次元のベクトルのリスト
+            (件数, 1024) のfloat32配列
         """
-        self._load_model()
-        
         # ドキュメントには"passage: "プレフィックスを付ける
-        prefixed = [f"passage: {text}" for text in texts]
-        
-        # 非同期実行
-        loop = asyncio.get_event_loop()
-        embeddings = await loop.run_in_executor(
-            None,
-            lambda: self._model.encode(
-                prefixed,
-                normalize_embeddings=True,
-                batch_size=32,
-                show_progress_bar=False
-            )
-        )
+        prefixed = [self._passage(text) for text in texts]
+
+        embeddings = await self.backend.encode(prefixed, batch_size=32)
         
-        return embeddings.tolist()
+        return np.asarray(embeddings, dtype=np.float32)
+
+    @staticmethod
+    def _passage(text: str) -> str:
+        """ドキュメント用のプレフィックス付きテキスト"""
+        return f"passage: {text}"
+
+    def document_cache_keys(self, texts: List[str]) -> List[bytes]:
+        """永続埋め込みキャッシュのキー
+
+        モデル名・実行方式（ONNX・int8量子化など）・プレフィックス付き本文のSHA-256。
+        実行方式を変えたときに別方式で計算したベクトルを混ぜない
+        """
+        prefix = f"{self.model_name}\0{self.backend.cache_id}\0"
+        return [
+            hashlib.sha256(f"{prefix}{self._passage(text)}".encode("utf-8")).digest()
+            for text in texts
+        ]
 
-    async def embed_document(self, text: str) -> List[float]:
+    async def embed_document(self, text: str) -> np.ndarray:
         """単一ドキュメントをベクトル化
 
         Args:
             text: ドキュメントテキスト
 
         Returns:
-            1024次元のベクトル
+            1024次元のfloat32ベクトル
         """
         result = await self.embed_documents([text])
         return result[0]
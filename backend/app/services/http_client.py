@@ -0,0 +1,78 @@
+"""上流サービス（Ollama / OCR）向けの共有HTTPクライアント"""
+import aiohttp
+from typing import Dict, Optional
+from ..config import settings
+
+
+# 上流ごとの共有セッション
+_sessions: Dict[str, aiohttp.ClientSession] = {}
+
+
+def _connection_limit(upstream: str) -> int:
+    """上流ごとの同時接続数上限を取得"""
+    limits = {
+        "ollama": settings.ollama_max_connections,
+        "ocr": settings.ocr_max_connections,
+        "embedding": settings.embedding_max_connections,
+    }
+    if upstream not in limits:
+        raise ValueError(f"Unknown upstream: {upstream}")
+    return limits[upstream]
+
+
+def _create_session(upstream: str) -> aiohttp.ClientSession:
+    """Keep-Alive・DNSキャッシュ付きのセッションを生成"""
+    if upstream == "embedding" and settings.embedding_service_socket:
+        # 同一ホストの埋め込みワーカーにはUnixソケットで接続
+        connector = aiohttp.UnixConnector(
+            path=settings.embedding_service_socket,
+            limit=_connection_limit(upstream),
+            keepalive_timeout=settings.http_keepalive_timeout,
+        )
+    else:
+        connector = aiohttp.TCPConnector(
+            limit=_connection_limit(upstream),
+            keepalive_timeout=settings.http_keepalive_timeout,
+            ttl_dns_cache=settings.http_dns_cache_ttl,
+        )
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(
+            total=None,
+            connect=settings.http_connect_timeout
+        )
+    )
+
+
+async def init_http_clients() -> None:
+    """全上流のセッションを生成（lifespan起動時に呼ぶ）"""
+    upstreams = ["ollama", "ocr"]
+    if settings.embedding_service_url:
+        upstreams.append("embedding")
+    for upstream in upstreams:
+        get_http_session(upstream)
+
+
+async def close_http_clients() -> None:
+    """全上流のセッションを閉じる（lifespan終了時に呼ぶ）"""
+    sessions = list(_sessions.values())
+    _sessions.clear()
+    for session in sessions:
+        await session.close()
+
+
+def get_http_session(upstream: str) -> aiohttp.ClientSession:
+    """上流の共有セッションを取得
+
+    lifespan外（テストなど）で呼ばれた場合は遅延生成する
+
+    使用例:
+        session = get_http_session("ollama")
+        async with session.get(url) as response:
+            ...
+    """
+    session: Optional[aiohttp.ClientSession] = _sessions.get(upstream)
+    if session is None or session.closed:
+        session = _create_session(upstream)
+        _sessions[upstream] = session
+    return session
@@ -0,0 +1,382 @@
+"""資料取り込みパイプライン
+
+OCR → 科目分類 → チャンク分割 → ベクトル化 → チャンク登録 を、
+有界キューでつないだステージとして並行に実行する。各ステージは
+下流が詰まると待つため、大きなPDFでもページ画像・OCR結果を
+メモリに溜めない。ベクトル化済みのチャンクは届いた順に受け皿テーブルへ
+COPYし、最後のトランザクションでは既存チャンクとの差し替えだけを行う。
+DB接続はCOPY・キャッシュ照会・最後の反映で短く借り、取り込み中は保持しない。
+
+ベクトル化は永続埋め込みキャッシュを先に引き、登録は既存チャンクとの
+差分だけを反映するため、一部だけ編集した資料の再取り込みは安く済む
+"""
+import asyncio
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from typing import BinaryIO, List, Optional, Set, Tuple
+import numpy as np
+from ..config import settings
+from ..db import get_db_connection
+from ..db.repositories import ChunkRepository, DocumentRepository, EmbeddingCacheRepository
+from ..utils.logger import setup_logger
+from ..utils.text_splitter import StreamingTextSplitter
+from .embedding_service import EmbeddingService
+from .llm_service import LLMService
+from .ocr_service import OCRService
+
+logger = setup_logger()
+
+# ステージ終了の印
+_DONE = object()
+
+
+@dataclass
+class IngestionStats:
+    """取り込みの計測値（各ステージの処理時間はミリ秒）"""
+    pages: int = 0
+    empty_pages: int = 0
+    chunks: int = 0
+    cached_embeddings: int = 0  # 埋め込みキャッシュで計算を省いた件数
+    inserted_chunks: int = 0
+    deleted_chunks: int = 0
+    kept_chunks: int = 0        # 既存行をそのまま使った件数
+    ocr_ms: int = 0
+    embed_ms: int = 0
+    write_ms: int = 0
+    total_ms: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class IngestionPipeline:
+    """資料取り込みパイプライン"""
+
+    def __init__(
+        self,
+        ocr_service: OCRService,
+        llm_service: LLMService,
+        embedding_service: EmbeddingService,
+        chunk_size: Optional[int] = None,
+        chunk_overlap: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        embed_batch_size: Optional[int] = None,
+        copy_batch_size: Optional[int] = None,
+        use_embedding_cache: Optional[bool] = None
+    ):
+        self.ocr = ocr_service
+        self.llm = llm_service
+        self.embedding = embedding_service
+        self.chunk_size = chunk_size or settings.chunk_size
+        self.chunk_overlap = chunk_overlap if chunk_overlap is not None else settings.chunk_overlap
+        self.queue_size = queue_size or settings.ingest_queue_size
+        self.embed_batch_size = embed_batch_size or settings.ingest_embed_batch_size
+        self.copy_batch_size = copy_batch_size or settings.ingest_copy_batch_size
+        self.use_embedding_cache = (
+            settings.ingest_embedding_cache if use_embedding_cache is None else use_embedding_cache
+        )
+
+    async def run(
+        self,
+        document_id: int,
+        file: BinaryIO,
+        filename: str,
+        content_type: str
+    ) -> IngestionStats:
+        """資料を取り込み、ステータスを completed に更新
+
+        チャンクは資料ごとに1トランザクションで以前の分と入れ替えるため、
+        再実行しても重複せず、失敗時に登録途中のチャンクも残らない。
+        科目・ステータスの更新も同じトランザクションで行い、資料とチャンクが
+        同時に検索対象になる。
+        失敗時は例外を送出する（failed への更新は再試行の有無を知る呼び出し側で行う）
+
+        Args:
+            document_id: 登録済みの資料ID
+            file: 画像またはPDFのファイルオブジェクト
+            filename: ファイル名
+            content_type: Content-Type
+
+        Returns:
+            計測値
+        """
+        stats = IngestionStats()
+        start_time = time.perf_counter()
+        pages: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        chunks: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size * self.embed_batch_size)
+        vectors: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        # 科目分類のタスク（分類用のテキストが揃った時点で分割段が開始する）
+        classification: List[asyncio.Task] = []
+
+        stages = [
+            asyncio.create_task(self._ocr_stage(file, filename, content_type, pages, stats)),
+            asyncio.create_task(self._chunk_stage(pages, chunks, classification, stats)),
+            asyncio.create_task(self._embed_stage(chunks, vectors, stats)),
+            asyncio.create_task(self._write_stage(document_id, vectors, classification, stats)),
+        ]
+        try:
+            await asyncio.gather(*stages)
+        except BaseException as e:
+            for task in stages + classification:
+                task.cancel()
+            await asyncio.gather(*stages, *classification, return_exceptions=True)
+            raise
+
+        stats.total_ms = int((time.perf_counter() - start_time) * 1000)
+        logger.info(f"Ingested document {document_id} ({filename}): {stats.as_dict()}")
+        return stats
+
+    async def _ocr_stage(
+        self,
+        file: BinaryIO,
+        filename: str,
+        content_type: str,
+        pages: asyncio.Queue,
+        stats: IngestionStats
+    ) -> None:
+        """OCR結果をページ順にキューへ送る"""
+        started = time.perf_counter()
+        waited = 0.0
+        async for page, markdown in self.ocr.extract_pages(file, filename, content_type):
+            stats.pages += 1
+            if not markdown.strip():
+                stats.empty_pages += 1
+            put_start = time.perf_counter()
+            await pages.put((page, markdown))
+            waited += time.perf_counter() - put_start
+        stats.ocr_ms = int((time.perf_counter() - started - waited) * 1000)
+        await pages.put(_DONE)
+
+    async def _chunk_stage(
+        self,
+        pages: asyncio.Queue,
+        chunks: asyncio.Queue,
+        classification: List[asyncio.Task],
+        stats: IngestionStats
+    ) -> None:
+        """ページをチャンクに分割し、先頭のテキストが揃ったら科目分類を始める"""
+        splitter = StreamingTextSplitter(self.chunk_size, self.chunk_overlap)
+        sample: List[str] = []
+        sample_chars = 0
+        chunk_index = 0
+
+        while True:
+            item = await pages.get()
+            if item is _DONE:
+                break
+            page, markdown = item
+            if sample_chars < settings.ingest_classify_chars:
+                sample.append(markdown[:settings.ingest_classify_chars - sample_chars])
+                sample_chars += len(sample[-1])
+                if sample_chars >= settings.ingest_classify_chars:
+                    classification.append(asyncio.create_task(self._classify("".join(sample))))
+            for content, metadata in splitter.add_page(markdown, page):
+                await chunks.put((chunk_index, content, metadata))
+                chunk_index += 1
+
+        for content, metadata in splitter.finish():
+            await chunks.put((chunk_index, content, metadata))
+            chunk_index += 1
+        if not classification:
+            classification.append(asyncio.create_task(self._classify("".join(sample))))
+        await chunks.put(_DONE)
+
+    async def _embed_stage(
+        self,
+        chunks: asyncio.Queue,
+        vectors: asyncio.Queue,
+        stats: IngestionStats
+    ) -> None:
+        """embed_batch_size 件ずつベクトル化して送る"""
+        done = False
+        while not done:
+            batch: List[Tuple[int, str, dict]] = []
+            while len(batch) < self.embed_batch_size:
+                item = await chunks.get()
+                if item is _DONE:
+                    done = True
+                    break
+                batch.append(item)
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            embeddings = await self._embed([c[1] for c in batch], stats)
+            stats.embed_ms += int((time.perf_counter() - started) * 1000)
+            await vectors.put((batch, embeddings))
+        await vectors.put(_DONE)
+
+    async def _embed(self, texts: List[str], stats: IngestionStats) -> np.ndarray:
+        """埋め込みキャッシュにない本文だけをベクトル化
+
+        キャッシュの照会・登録はそれぞれ短く接続を借りる（ベクトル化の間は返しておき、
+        登録段も接続を持っていないため、1件の取り込みが同時に2本の接続を待つことはない）
+        """
+        if not self.use_embedding_cache:
+            return await self.embedding.embed_documents(texts)
+
+        keys = self.embedding.document_cache_keys(texts)
+        async with get_db_connection() as conn:
+            cached = await EmbeddingCacheRepository(conn).get_many(keys)
+
+        missing = [i for i, key in enumerate(keys) if key not in cached]
+        stats.cached_embeddings += len(texts) - len(missing)
+        if missing:
+            computed = await self.embedding.embed_documents([texts[i] for i in missing])
+            missing_keys = [keys[i] for i in missing]
+            async with get_db_connection() as conn:
+                await EmbeddingCacheRepository(conn).put_many(
+                    self.embedding.model_name, missing_keys, computed
+                )
+            cached.update(zip(missing_keys, computed))
+
+        return np.stack([cached[key] for key in keys]).astype(np.float32, copy=False)
+
+    async def _write_stage(
+        self,
+        document_id: int,
+        vectors: asyncio.Queue,
+        classification: List[asyncio.Task],
+        stats: IngestionStats
+    ) -> None:
+        """ベクトル化済みのチャンクを受け皿へCOPYし、最後に1トランザクションで差分を反映
+
+        copy_batch_size 件たまるごとに短く接続を借りて受け皿テーブル
+        （取り込みごとのrun_id付き）へCOPYするため、メモリに全チャンクを溜めず、
+        最後のトランザクションも既存チャンクとの差分反映 → 科目・ステータス更新だけになる。
+        HNSWインデックスへの追加は最後のINSERTで変わった分だけ。
+        新しいチャンクは科目と completed を入れた状態で登録し、登録後に
+        チャンクを更新しない（更新すると行がHNSWインデックスに追加し直される）。
+        失敗・キャンセル時は受け皿の取り込み分を削除する
+        """
+        run_id = uuid.uuid4()
+        try:
+            rows: List[tuple] = []
+            done = False
+            while not done:
+                item = await vectors.get()
+                if item is _DONE:
+                    done = True
+                else:
+                    batch, embeddings = item
+                    rows.extend(
+                        (document_id, content, chunk_index, embedding, metadata)
+                        for (chunk_index, content, metadata), embedding in zip(batch, embeddings)
+                    )
+                if rows and (done or len(rows) >= self.copy_batch_size):
+                    started = time.perf_counter()
+                    async with get_db_connection() as conn:
+                        await ChunkRepository(conn).stage_chunks(run_id, rows)
+                    stats.write_ms += int((time.perf_counter() - started) * 1000)
+                    rows = []
+
+            # 分類はOCR・ベクトル化と並行して進んでいる
+            subject = await classification[0]
+
+            started = time.perf_counter()
+            async with get_db_connection() as conn:
+                async with conn.transaction():
+                    # 同じ資料の登録が並行しても差分反映が重複しないよう資料の行をロック
+                    doc_repo = DocumentRepository(conn)
+                    await doc_repo.get_for_update(document_id)
+
+                    if subject:
+                        await doc_repo.update_subject(document_id, subject)
+                    inserted, deleted, kept = await ChunkRepository(conn).sync_from_staging(
+                        document_id, run_id, status="completed"
+                    )
+                    await doc_repo.update_status(document_id, "completed")
+            stats.write_ms += int((time.perf_counter() - started) * 1000)
+        except BaseException:
+            await self._discard_staged(run_id)
+            raise
+
+        stats.inserted_chunks = inserted
+        stats.deleted_chunks = deleted
+        stats.kept_chunks = kept
+        stats.chunks = inserted + kept
+
+    async def _discard_staged(self, run_id: uuid.UUID) -> None:
+        """中断した取り込みの受け皿の行を削除（失敗しても古い行は定期的に消える）"""
+        try:
+            async with get_db_connection() as conn:
+                await ChunkRepository(conn).delete_staged(run_id)
+        except Exception as e:
+            logger.warning(f"Failed to discard staged chunks for run {run_id}: {e}")
+
+    async def _classify(self, text: str) -> Optional[str]:
+        """先頭のテキストから科目を分類（失敗しても取り込みは続ける）"""
+        if not text.strip():
+            return None
+        try:
+            return await self.llm.classify_subject(text)
+        except Exception as e:
+            logger.warning(f"Subject classification failed: {e}")
+            return None
+
+    async def mark_failed(self, document_id: int, error: BaseException) -> None:
+        """資料の取り込み失敗を記録"""
+        message = "cancelled" if isinstance(error, asyncio.CancelledError) else str(error)
+        logger.error(f"Ingestion failed for document {document_id}: {message}")
+        try:
+            async with get_db_connection() as conn:
+                await DocumentRepository(conn).update_status(document_id, "failed", message)
+        except Exception as e:
+            logger.error(f"Failed to mark document {document_id} as failed: {e}")
+
+
+# 実行中の取り込みタスク（終了時に止める）
+_tasks: Set[asyncio.Task] = set()
+# 取り込み中・取り込み予約済みの資料ID（同じ資料を同時に取り込まない）
+_claimed: Set[int] = set()
+
+
+def claim_document(document_id: int) -> bool:
+    """資料の取り込みを予約（取り込み中ならFalse）
+
+    予約は start_ingestion のタスク終了時、または release_document で解除する
+    """
+    if document_id in _claimed:
+        return False
+    _claimed.add(document_id)
+    return True
+
+
+def release_document(document_id: int) -> None:
+    """取り込みを開始しなかった予約を解除"""
+    _claimed.discard(document_id)
+
+
+def start_ingestion(
+    pipeline: IngestionPipeline,
+    document_id: int,
+    path: str,
+    filename: str,
+    content_type: str
+) -> asyncio.Task:
+    """保存済みファイルの取り込みをバックグラウンドで開始（資料の予約は終了時に解除）"""
+
+    async def run() -> None:
+        try:
+            with open(path, "rb") as file:
+                await pipeline.run(document_id, file, filename, content_type)
+        except BaseException as e:
+            await pipeline.mark_failed(document_id, e)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+
+    _claimed.add(document_id)
+    task = asyncio.create_task(run())
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    task.add_done_callback(lambda _: _claimed.discard(document_id))
+    return task
+
+
+async def close_ingestion() -> None:
+    """実行中の取り込みを止める（lifespan終了時に呼ぶ）"""
+    tasks = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,185 @@
+"""取り込みジョブワーカー
+
+ingestion_jobs テーブルからジョブを FOR UPDATE SKIP LOCKED で取得して
+取り込みパイプラインを実行する。ワーカーは何プロセス・何ホストで
+起動してもよく、リースが切れたジョブ（落ちたワーカーの分）は他の
+ワーカーが取り直す
+"""
+import asyncio
+import os
+import socket
+import uuid
+from typing import Optional
+from ..config import settings
+from ..db import get_db_connection
+from ..db.repositories import ChunkRepository, DocumentRepository, JobRepository
+from ..utils.logger import setup_logger
+from .ingestion import IngestionPipeline
+
+logger = setup_logger()
+
+
+def retry_delay(attempts: int, base: float, maximum: float) -> float:
+    """指数バックオフの待ち時間（秒）"""
+    return min(base * (2 ** max(attempts - 1, 0)), maximum)
+
+
+class IngestionWorker:
+    """取り込みジョブを取得して実行するワーカー"""
+
+    def __init__(
+        self,
+        pipeline: IngestionPipeline,
+        concurrency: Optional[int] = None,
+        worker_id: Optional[str] = None
+    ):
+        """
+        Args:
+            pipeline: 取り込みパイプライン
+            concurrency: このプロセスで同時に実行するジョブ数
+            worker_id: ワーカー識別子（省略時はホスト名・PIDから生成）
+        """
+        self.pipeline = pipeline
+        self.concurrency = concurrency or settings.ingest_worker_concurrency
+        self.worker_id = worker_id or (
+            f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        )
+        self.lease_seconds = settings.ingest_job_lease_seconds
+        self._stopping = asyncio.Event()
+
+    def stop(self) -> None:
+        """新しいジョブの取得をやめる（実行中のジョブは最後まで処理する）"""
+        self._stopping.set()
+
+    async def run(self) -> None:
+        """stop() が呼ばれるまでジョブを処理"""
+        logger.info(f"Ingestion worker {self.worker_id} started (concurrency={self.concurrency})")
+        await self._purge_stale_staging()
+        await asyncio.gather(*(self._slot() for _ in range(self.concurrency)))
+        logger.info(f"Ingestion worker {self.worker_id} stopped")
+
+    async def _purge_stale_staging(self) -> None:
+        """異常終了した取り込みが受け皿テーブルに残した行を削除"""
+        try:
+            async with get_db_connection() as conn:
+                purged = await ChunkRepository(conn).delete_stale_staged(
+                    settings.ingest_staging_max_age_hours
+                )
+            if purged:
+                logger.info(f"Purged {purged} stale staged chunks")
+        except Exception as e:
+            logger.warning(f"Failed to purge stale staged chunks: {e}")
+
+    async def _slot(self) -> None:
+        """1件ずつジョブを取得して実行（なければ待機）"""
+        while not self._stopping.is_set():
+            try:
+                processed = await self.run_once()
+            except Exception as e:
+                logger.error(f"Ingestion worker error: {e}", exc_info=True)
+                processed = False
+
+            if not processed:
+                try:
+                    await asyncio.wait_for(
+                        self._stopping.wait(),
+                        timeout=settings.ingest_worker_poll_interval
+                    )
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run_once(self) -> bool:
+        """ジョブを1件取得して実行
+
+        Returns:
+            False: 実行可能なジョブがなかった
+        """
+        async with get_db_connection() as conn:
+            job_repo = JobRepository(conn)
+            for document_id in await job_repo.fail_expired():
+                await DocumentRepository(conn).update_status(
+                    document_id, "failed", "ingestion job lease expired"
+                )
+            job = await job_repo.claim(self.worker_id, self.lease_seconds)
+            document = (
+                await DocumentRepository(conn).get_by_id(job["document_id"]) if job else None
+            )
+
+        if job is None:
+            return False
+        if document is None:
+            # 資料が削除済み（ジョブもCASCADEで消える）
+            return True
+
+        logger.info(
+            f"Claimed job {job['id']} for document {document['id']} "
+            f"(attempt {job['attempts']}/{job['max_attempts']})"
+        )
+        work = asyncio.create_task(self._ingest(document))
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"], work))
+        try:
+            await work
+        except asyncio.CancelledError:
+            if not heartbeat.done():
+                raise
+            # リースを失った（他のワーカーが取り直した）ので結果は記録しない
+            logger.warning(f"Lost lease on job {job['id']}, abandoning")
+            return True
+        except Exception as e:
+            await self._record_failure(job, e)
+            return True
+        finally:
+            heartbeat.cancel()
+
+        async with get_db_connection() as conn:
+            await JobRepository(conn).complete(job["id"], self.worker_id)
+        return True
+
+    async def _ingest(self, document: dict) -> None:
+        """資料ファイルを開いてパイプラインを実行"""
+        path = document["original_path"]
+        if not path or not os.path.exists(path):
+            raise ValueError(f"Source file not found: {path}")
+        with open(path, "rb") as file:
+            await self.pipeline.run(
+                document["id"],
+                file,
+                document["filename"],
+                document.get("mime_type") or "application/octet-stream"
+            )
+
+    async def _heartbeat(self, job_id: int, work: asyncio.Task) -> None:
+        """リースの1/3ごとに延長し、失ったら実行中の処理を止める"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                async with get_db_connection() as conn:
+                    alive = await JobRepository(conn).heartbeat(
+                        job_id, self.worker_id, self.lease_seconds
+                    )
+            except Exception as e:
+                # 一時的なDB障害ではリース切れまで処理を続ける
+                logger.warning(f"Heartbeat failed for job {job_id}: {e}")
+                continue
+            if not alive:
+                work.cancel()
+                return
+
+    async def _record_failure(self, job: dict, error: Exception) -> None:
+        """失敗を記録し、再試行しない場合のみ資料を failed にする"""
+        delay = retry_delay(
+            job["attempts"],
+            settings.ingest_job_backoff_seconds,
+            settings.ingest_job_backoff_max_seconds
+        )
+        async with get_db_connection() as conn:
+            status = await JobRepository(conn).fail(
+                job["id"], self.worker_id, str(error), delay
+            )
+        if status == "failed":
+            await self.pipeline.mark_failed(job["document_id"], error)
+        elif status == "queued":
+            logger.warning(
+                f"Job {job['id']} failed (attempt {job['attempts']}), "
+                f"retrying in {delay:.0f}s: {error}"
+            )
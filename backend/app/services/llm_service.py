@@ -1,7 +1,9 @@
 """LLMサービス - Ollama連携"""
+import json
 import aiohttp
-from typing import Optional
+from typing import AsyncIterator, Optional
 from ..config import settings
+from .http_client import get_http_session
 
 
 class LLMService:
@@ -36,44 +38,124 @@ class LLMService:
         Raises:
             ValueError: Ollamaとの通信エラー
         """
-        temperature = temperature or settings.llm_temperature
+        payload = self._build_payload(
+            prompt, system, temperature, max_tokens, stream=False
+        )
 
         try:
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    "model": self.model,
-                    "prompt": prompt,
-                    "temperature": temperature,
-                    "stream": False
-                }
-
-                if system:
-                    payload["system"] = system
-
-                if max_tokens:
-                    payload["options"] = {"num_predict": max_tokens}
-
-                async with session.post(
-                    f"{self.base_url}/api/generate",
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=120)
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise ValueError(
-                            f"Ollama generate failed with status {response.status}: {error_text}"
-                        )
-
-                    result = await response.json()
-                    
-                    if "response" not in result:
-                        raise ValueError("Ollama response missing 'response' field")
-                    
-                    return result["response"]
+            session = get_http_session("ollama")
+            async with session.post(
+                f"{self.base_url}/api/generate",
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=settings.ollama_timeout)
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise ValueError(
+                        f"Ollama generate failed with status {response.status}: {error_text}"
+                    )
+
+                result = await response.json()
+                
+                if "response" not in result:
+                    raise ValueError("Ollama response missing 'response' field")
+                
+                return result["response"]
 
         except aiohttp.ClientError as e:
             raise ValueError(f"Ollama connection error: {e}")
 
+    async def generate_stream(
+        self,
+        prompt: str,
+        system: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """Ollamaで文章をストリーミング生成
+
+        Ollamaの`stream: true`応答（1行1JSON）を読み、トークン断片を届いた順に返す
+
+        Args:
+            prompt: プロンプト
+            system: システムメッセージ
+            temperature: 温度パラメータ（デフォルト: 0.7）
+            max_tokens: 最大トークン数
+
+        Yields:
+            生成されたテキスト断片
+
+        Raises:
+            ValueError: Ollamaとの通信エラー
+        """
+        payload = self._build_payload(
+            prompt, system, temperature, max_tokens, stream=True
+        )
+
+        try:
+            session = get_http_session("ollama")
+            # 生成全体の長さは読めないため、総時間ではなく無通信時間で打ち切る
+            async with session.post(
+                f"{self.base_url}/api/generate",
+                json=payload,
+                timeout=aiohttp.ClientTimeout(
+                    total=None,
+                    sock_read=settings.ollama_timeout
+                )
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise ValueError(
+                        f"Ollama generate failed with status {response.status}: {error_text}"
+                    )
+
+                async for line in response.content:
+                    if not line.strip():
+                        continue
+
+                    try:
+                        chunk = json.loads(line)
+                    except json.JSONDecodeError as e:
+                        raise ValueError(f"Malformed Ollama stream line: {e}")
+
+                    if "error" in chunk:
+                        raise ValueError(f"Ollama stream error: {chunk['error']}")
+
+                    token = chunk.get("response", "")
+                    if token:
+                        yield token
+
+                    if chunk.get("done"):
+                        return
+
+        except aiohttp.ClientError as e:
+            raise ValueError(f"Ollama connection error: {e}")
+
+    def _build_payload(
+        self,
+        prompt: str,
+        system: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        stream: bool
+    ) -> dict:
+        """/api/generate 用のリクエストボディを構築"""
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "temperature": temperature or settings.llm_temperature,
+            "stream": stream,
+            "keep_alive": settings.ollama_keep_alive
+        }
+
+        if system:
+            payload["system"] = system
+
+        if max_tokens:
+            payload["options"] = {"num_predict": max_tokens}
+
+        return payload
+
     async def classify_subject(self, text: str) -> str:
         """資料の科目分類
 
@@ -116,6 +198,25 @@ class LLMService:
         # 結果をクリーンアップ（前後の空白や句読点を除去）
         return result.strip().rstrip("。、")
 
+    async def preload(self) -> bool:
+        """モデルをOllamaのメモリに読み込ませる
+
+        プロンプトなしの /api/generate はモデルのロードのみを行う
+
+        Returns:
+            True: ロード成功, False: 失敗
+        """
+        try:
+            session = get_http_session("ollama")
+            async with session.post(
+                f"{self.base_url}/api/generate",
+                json={"model": self.model, "keep_alive": settings.ollama_keep_alive},
+                timeout=aiohttp.ClientTimeout(total=settings.warmup_timeout)
+            ) as response:
+                return response.status == 200
+        except aiohttp.ClientError:
+            return False
+
     async def health_check(self) -> bool:
         """Ollamaのヘルスチェック
 
@@ -123,17 +224,17 @@ class LLMService:
             True: 正常, False: 異常
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.base_url}/api/tags",
-                    timeout=aiohttp.ClientTimeout(total=5)
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        # モデルが存在するか確認
-                        models = data.get("models", [])
-                        return any(m.get("name") == self.model for m in models)
-                    return False
+            session = get_http_session("ollama")
+            async with session.get(
+                f"{self.base_url}/api/tags",
+                timeout=aiohttp.ClientTimeout(total=settings.health_check_timeout)
+            ) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    # モデルが存在するか確認
+                    models = data.get("models", [])
+                    return any(m.get("name") == self.model for m in models)
+                return False
         except Exception:
             return False
 
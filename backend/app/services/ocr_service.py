@@ -1,20 +1,71 @@
 """OCRサービス - DeepSeek-OCR連携"""
+import asyncio
+import hashlib
+import json
 import aiohttp
-from typing import Optional
+from typing import AsyncIterator, BinaryIO, Optional, Tuple, Union
 from ..config import settings
+from ..utils.lru_cache import LRUCache
+from .http_client import get_http_session
+
+
+# 画像ハッシュ → OCR結果（プロセス内で共有）
+_result_cache: Optional[LRUCache[str]] = None
+
+
+def get_ocr_cache() -> LRUCache[str]:
+    """共有OCR結果キャッシュを取得"""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = LRUCache(
+            max_entries=settings.ocr_cache_max_entries,
+            max_bytes=settings.ocr_cache_max_mb * 1024 * 1024,
+            sizeof=lambda markdown: len(markdown.encode("utf-8"))
+        )
+    return _result_cache
+
+
+def _hash_image(image: Union[bytes, BinaryIO]) -> str:
+    """画像のSHA-256（ファイルは全体を読み込まずにチャンク単位で計算）"""
+    if isinstance(image, bytes):
+        return hashlib.sha256(image).hexdigest()
+
+    digest = hashlib.sha256()
+    image.seek(0)
+    for chunk in iter(lambda: image.read(1024 * 1024), b""):
+        digest.update(chunk)
+    image.seek(0)
+    return digest.hexdigest()
 
 
 class OCRService:
     """OCRサービス（DeepSeek-OCR API呼び出し）"""
 
-    def __init__(self, base_url: Optional[str] = None):
+    def __init__(
+        self,
+        base_url: Optional[str] = None,
+        cache: Optional[LRUCache[str]] = None
+    ):
         self.base_url = base_url or settings.ocr_url
+        if cache is None and settings.ocr_cache_enabled:
+            cache = get_ocr_cache()
+        self.cache = cache
 
-    async def extract_text(self, image_bytes: bytes) -> str:
+    async def extract_text(
+        self,
+        image: Union[bytes, BinaryIO],
+        filename: str = "image.png",
+        content_type: str = "image/png"
+    ) -> str:
         """画像からMarkdown形式でテキスト抽出
 
+        同一画像（バイト列のSHA-256が一致）の結果はキャッシュから返す。
+        ファイルオブジェクトを渡した場合はメモリに読み込まずOCRサービスへ転送する
+
         Args:
-            image_bytes: 画像データ（バイナリ）
+            image: 画像データ（バイナリ、またはアップロードのファイルオブジェクト）
+            filename: 転送時のファイル名
+            content_type: 転送時のContent-Type（アップロード時の値を引き継ぐ）
 
         Returns:
             抽出されたMarkdownテキスト
@@ -23,33 +74,110 @@ class OCRService:
             aiohttp.ClientError: OCRサービスとの通信エラー
             ValueError: OCRサービスからのレスポンスが不正
         """
+        if self.cache is None:
+            return await self._request_ocr(image, filename, content_type)
+
+        if isinstance(image, bytes):
+            key = _hash_image(image)
+        else:
+            # ディスクに退避されたアップロードの読み込みでループを塞がない
+            loop = asyncio.get_running_loop()
+            key = await loop.run_in_executor(None, _hash_image, image)
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        markdown = await self._request_ocr(image, filename, content_type)
+        self.cache.put(key, markdown)
+        return markdown
+
+    async def _request_ocr(
+        self,
+        image: Union[bytes, BinaryIO],
+        filename: str,
+        content_type: str
+    ) -> str:
+        """OCRサービスに画像を送信してテキストを取得"""
+        try:
+            session = get_http_session("ocr")
+            form = aiohttp.FormData()
+            # ファイルオブジェクトはチャンク単位で送信される
+            form.add_field(
+                'image',
+                image,
+                filename=filename,
+                content_type=content_type
+            )
+
+            async with session.post(
+                f"{self.base_url}/api/ocr",
+                data=form,
+                timeout=aiohttp.ClientTimeout(total=settings.ocr_timeout)
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise ValueError(
+                        f"OCR failed with status {response.status}: {error_text}"
+                    )
+
+                result = await response.json()
+                
+                if "markdown" not in result:
+                    raise ValueError("OCR response missing 'markdown' field")
+                
+                return result["markdown"]
+
+        except aiohttp.ClientError as e:
+            raise ValueError(f"OCR service connection error: {e}")
+
+    async def extract_pages(
+        self,
+        file: BinaryIO,
+        filename: str,
+        content_type: str
+    ) -> AsyncIterator[Tuple[int, str]]:
+        """画像・PDFをページ単位でOCRし、届いた順に返す
+
+        OCRサービスの一括エンドポイントへファイルをチャンク単位で転送し、
+        NDJSONのページ結果を1行ずつ読む。呼び出し側が読み進めない間は
+        受信も止まるため、全ページの結果をメモリに溜めない
+
+        Args:
+            file: 画像またはPDFのファイルオブジェクト
+            filename: 転送時のファイル名
+            content_type: 転送時のContent-Type
+
+        Yields:
+            (ページ番号, Markdownテキスト)。OCRに失敗したページは空文字
+
+        Raises:
+            ValueError: OCRサービスとの通信エラー、またはレスポンスが不正
+        """
         try:
-            async with aiohttp.ClientSession() as session:
-                form = aiohttp.FormData()
-                form.add_field(
-                    'image',
-                    image_bytes,
-                    filename='image.png',
-                    content_type='image/png'
-                )
-
-                async with session.post(
-                    f"{self.base_url}/api/ocr",
-                    data=form,
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise ValueError(
-                            f"OCR failed with status {response.status}: {error_text}"
-                        )
-
-                    result = await response.json()
-                    
-                    if "markdown" not in result:
-                        raise ValueError("OCR response missing 'markdown' field")
-                    
-                    return result["markdown"]
+            session = get_http_session("ocr")
+            form = aiohttp.FormData()
+            form.add_field('files', file, filename=filename, content_type=content_type)
+
+            async with session.post(
+                f"{self.base_url}/api/ocr/batch",
+                data=form,
+                # 全体ではなく1ページあたりの待ち時間で打ち切る
+                timeout=aiohttp.ClientTimeout(total=None, sock_read=settings.ocr_timeout)
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise ValueError(
+                        f"OCR failed with status {response.status}: {error_text}"
+                    )
+
+                async for line in response.content:
+                    if not line.strip():
+                        continue
+                    event = json.loads(line)
+                    if event.get("type") != "page":
+                        continue
+                    yield event["index"], event.get("markdown", "")
 
         except aiohttp.ClientError as e:
             raise ValueError(f"OCR service connection error: {e}")
@@ -61,12 +189,12 @@ class OCRService:
             True: 正常, False: 異常
         """
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.base_url}/health",
-                    timeout=aiohttp.ClientTimeout(total=5)
-                ) as response:
-                    return response.status == 200
+            session = get_http_session("ocr")
+            async with session.get(
+                f"{self.base_url}/health",
+                timeout=aiohttp.ClientTimeout(total=settings.health_check_timeout)
+            ) as response:
+                return response.status == 200
         except Exception:
             return False
 
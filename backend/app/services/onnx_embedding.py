@@ -0,0 +1,305 @@
+"""ONNX Runtimeによる埋め込みバックエンド
+
+e5モデルをONNXにエクスポートし（任意でint8動的量子化）、CPU上でONNX Runtimeで実行する。
+参照モデル（SentenceTransformer）とのコサイン類似度を確認する検証関数も提供する
+
+エクスポートは起動前の明示的な手順とし、実行時にONNXファイルが無ければ起動時に失敗する
+（複数ワーカーが同時にエクスポートして不完全なファイルを読むことを防ぐ）
+
+使用例（エクスポートと検証）:
+    python -m app.services.onnx_embedding --quantize --verify
+"""
+import argparse
+import asyncio
+import inspect
+import os
+import tempfile
+import threading
+from typing import List, Optional
+import numpy as np
+from ..config import settings
+
+
+def _model_path(model_dir: str, quantize: bool) -> str:
+    """ONNXファイルのパス"""
+    return os.path.join(model_dir, "model.int8.onnx" if quantize else "model.onnx")
+
+
+def _default_model_dir(model_name: str) -> str:
+    """モデル名ごとのエクスポート先ディレクトリ"""
+    return os.path.join(settings.embedding_onnx_dir, model_name.replace("/", "__"))
+
+
+def _temp_path(path: str) -> str:
+    """同じディレクトリの一時ファイルパス（os.replaceで置き換えるため）"""
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path),
+        prefix=os.path.basename(path) + ".",
+        suffix=".tmp"
+    )
+    os.close(fd)
+    return temp_path
+
+
+def mean_pool_normalize(hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    """パディングを除いた平均プーリングとL2正規化（e5の文埋め込み）
+
+    Args:
+        hidden: (件数, トークン数, 次元) の最終隠れ状態
+        attention_mask: (件数, トークン数) のマスク
+
+    Returns:
+        (件数, 次元) の正規化済みfloat32配列
+    """
+    mask = attention_mask[..., None].astype(np.float32)
+    pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    return pooled.astype(np.float32)
+
+
+def export_onnx(model_name: str, model_dir: str, quantize: bool = False) -> str:
+    """HuggingFaceモデルをONNXにエクスポート
+
+    一時ファイルに書き出してからos.replaceで置き換えるため、
+    読み込み側が書きかけのファイルを見ることはない
+
+    Args:
+        model_name: HuggingFaceのモデル名
+        model_dir: 出力ディレクトリ（トークナイザーも保存）
+        quantize: int8動的量子化したファイルも作成するか
+
+    Returns:
+        実行に使うONNXファイルのパス
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(model_dir, exist_ok=True)
+    fp32_path = _model_path(model_dir, quantize=False)
+
+    if not os.path.exists(fp32_path):
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        model.config.return_dict = False
+
+        sample = tokenizer(
+            ["query: export"],
+            return_tensors="pt",
+            return_token_type_ids=False
+        )
+
+        export_kwargs = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            # 動的軸を扱うため従来のTorchScriptエクスポータを使う
+            export_kwargs["dynamo"] = False
+
+        # モデルファイルより先にトークナイザーを置く
+        tokenizer.save_pretrained(model_dir)
+
+        temp_path = _temp_path(fp32_path)
+        try:
+            with torch.no_grad():
+                torch.onnx.export(
+                    model,
+                    (sample["input_ids"], sample["attention_mask"]),
+                    temp_path,
+                    input_names=["input_ids", "attention_mask"],
+                    output_names=["last_hidden_state"],
+                    dynamic_axes={
+                        "input_ids": {0: "batch", 1: "sequence"},
+                        "attention_mask": {0: "batch", 1: "sequence"},
+                        "last_hidden_state": {0: "batch", 1: "sequence"},
+                    },
+                    opset_version=17,
+                    **export_kwargs
+                )
+            os.replace(temp_path, fp32_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    if not quantize:
+        return fp32_path
+
+    int8_path = _model_path(model_dir, quantize=True)
+    if not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        temp_path = _temp_path(int8_path)
+        try:
+            quantize_dynamic(fp32_path, temp_path, weight_type=QuantType.QInt8)
+            os.replace(temp_path, int8_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    return int8_path
+
+
+class OnnxEmbeddingBackend:
+    """ONNX Runtime（CPU）でe5モデルを実行するバックエンド"""
+
+    def __init__(
+        self,
+        model_name: str,
+        quantize: bool = False,
+        model_dir: Optional[str] = None
+    ):
+        self.model_name = model_name
+        self.quantize = quantize
+        self.model_dir = model_dir or _default_model_dir(model_name)
+        self._session = None
+        self._tokenizer = None
+        # 埋め込みはスレッドプールから呼ばれるため、初回ロードを直列化する
+        self._load_lock = threading.Lock()
+
+    @property
+    def cache_id(self) -> str:
+        """永続埋め込みキャッシュのキーに含める実行方式（量子化の有無を区別）"""
+        return "onnx-int8" if self.quantize else "onnx"
+
+    def load(self) -> None:
+        """ONNXモデルを遅延ロード
+
+        Raises:
+            FileNotFoundError: ONNXファイルがエクスポートされていない場合
+        """
+        if self._session is not None:
+            return
+
+        with self._load_lock:
+            if self._session is None:
+                self._load()
+
+    def _load(self) -> None:
+        """セッションとトークナイザーを作成（_load_lockを保持して呼ぶ）"""
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = _model_path(self.model_dir, self.quantize)
+        if not os.path.exists(path):
+            flag = " --quantize" if self.quantize else ""
+            raise FileNotFoundError(
+                f"ONNX model not found: {path}. Export it first with "
+                f"`python -m app.services.onnx_embedding --model {self.model_name}"
+                f" --output-dir {self.model_dir}{flag}`"
+            )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if settings.embedding_onnx_threads > 0:
+            options.intra_op_num_threads = settings.embedding_onnx_threads
+
+        # セッションを最後に設定し、ロック外の確認で作成途中を見せない
+        self._tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+        self._session = ort.InferenceSession(
+            path,
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+
+    def encode_sync(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """同期版encode（平均プーリング＋L2正規化）"""
+        self.load()
+
+        outputs = []
+        for start in range(0, len(texts), batch_size):
+            batch = texts[start:start + batch_size]
+            tokens = self._tokenizer(
+                batch,
+                padding=True,
+                truncation=True,
+                max_length=settings.embedding_max_seq_length,
+                return_tensors="np",
+                return_token_type_ids=False
+            )
+            attention_mask = tokens["attention_mask"].astype(np.int64)
+            (hidden,) = self._session.run(
+                ["last_hidden_state"],
+                {
+                    "input_ids": tokens["input_ids"].astype(np.int64),
+                    "attention_mask": attention_mask,
+                }
+            )
+
+            outputs.append(mean_pool_normalize(hidden, attention_mask))
+
+        return np.concatenate(outputs, axis=0)
+
+    async def encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        """プレフィックス付きテキストを正規化済みfloat32ベクトルに変換"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, lambda: self.encode_sync(texts, batch_size)
+        )
+
+
+def verify_against_reference(
+    backend: OnnxEmbeddingBackend,
+    texts: List[str],
+    tolerance: Optional[float] = None
+) -> float:
+    """参照モデル（SentenceTransformer）とのずれを確認
+
+    Args:
+        backend: 検証するONNXバックエンド
+        texts: 検証用テキスト（プレフィックス付き）
+        tolerance: 許容するコサイン距離（デフォルト: settings.embedding_onnx_tolerance）
+
+    Returns:
+        最小コサイン類似度
+
+    Raises:
+        ValueError: 許容範囲を超えてずれている場合
+    """
+    from sentence_transformers import SentenceTransformer
+
+    tolerance = tolerance if tolerance is not None else settings.embedding_onnx_tolerance
+
+    reference = SentenceTransformer(backend.model_name).encode(
+        texts,
+        normalize_embeddings=True,
+        show_progress_bar=False
+    )
+    candidate = backend.encode_sync(texts)
+
+    similarities = np.sum(np.asarray(reference, dtype=np.float32) * candidate, axis=1)
+    min_similarity = float(similarities.min())
+    if min_similarity < 1.0 - tolerance:
+        raise ValueError(
+            f"ONNX embeddings deviate from reference: "
+            f"min cosine {min_similarity:.4f} < {1.0 - tolerance:.4f}"
+        )
+    return min_similarity
+
+
+# 検証用のサンプル（質問と資料の両方の形式）
+VERIFY_TEXTS = [
+    "query: テイラー展開の定義を教えて",
+    "query: Find the acceleration of a block on a frictionless incline.",
+    "passage: 運動方程式 $F = ma$ は質量と加速度の積が力に等しいことを表す。",
+    "passage: The eigenvalues of a Hermitian matrix are real.",
+]
+
+
+def main() -> None:
+    """ONNXエクスポートと参照モデルとの比較"""
+    parser = argparse.ArgumentParser(description="Export e5 embedding model to ONNX")
+    parser.add_argument("--model", default=settings.embedding_model)
+    parser.add_argument("--output-dir", default=None)
+    parser.add_argument("--quantize", action="store_true", help="int8動的量子化")
+    parser.add_argument("--verify", action="store_true", help="参照モデルと比較")
+    args = parser.parse_args()
+
+    model_dir = args.output_dir or _default_model_dir(args.model)
+    path = export_onnx(args.model, model_dir, quantize=args.quantize)
+    print(f"Exported: {path}")
+
+    if args.verify:
+        backend = OnnxEmbeddingBackend(args.model, quantize=args.quantize, model_dir=model_dir)
+        min_similarity = verify_against_reference(backend, VERIFY_TEXTS)
+        print(f"Min cosine similarity vs reference: {min_similarity:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,44 @@
 """RAGサービス - 検索・プロンプト構築・解答生成"""
-from typing import List, Optional, Tuple
+import time
+from typing import AsyncIterator, List, Optional, Tuple
 import asyncpg
+import numpy as np
 from ..models.schemas import ReferencedDocument
 from ..config import settings
 from .embedding_service import EmbeddingService
 from .llm_service import LLMService
+from .answer_cache import SemanticAnswerCache, get_answer_cache
 from ..db.repositories import ChunkRepository
 
 
+# 解答生成時のシステムメッセージ
+SYSTEM_MESSAGE = """あなたは理系大学の学習支援AIアシスタントです。
+数学・物理などの問題に対して、正確でわかりやすい解答を提供してください。
+数式はLaTeX記法で記述し、論理的に段階を追って説明してください。"""
+
+
 class RAGService:
     """RAG（Retrieval-Augmented Generation）サービス"""
 
     def __init__(
         self,
         embedding_service: EmbeddingService,
-        llm_service: LLMService
+        llm_service: LLMService,
+        answer_cache: Optional[SemanticAnswerCache] = None
     ):
         self.embedding = embedding_service
         self.llm = llm_service
+        if answer_cache is None and settings.answer_cache_enabled:
+            answer_cache = get_answer_cache()
+        self.answer_cache = answer_cache
 
     async def search_relevant_chunks(
         self,
         conn: asyncpg.Connection,
         query_text: str,
         top_k: Optional[int] = None,
-        subject_filter: Optional[str] = None
+        subject_filter: Optional[str] = None,
+        query_vector: Optional[np.ndarray] = None
     ) -> List[dict]:
         """ベクトル検索で関連チャンクを取得
 
@@ -33,6 +47,7 @@ class RAGService:
             query_text: 検索クエリ
             top_k: 取得件数（デフォルト: settings.rag_top_k）
             subject_filter: 科目でフィルタ
+            query_vector: ベクトル化済みのクエリ（省略時はquery_textから生成）
 
         Returns:
             類似チャンクのリスト
@@ -40,14 +55,18 @@ class RAGService:
         top_k = top_k or settings.rag_top_k
 
         # クエリをベクトル化
-        query_vector = await self.embedding.embed_query(query_text)
+        if query_vector is None:
+            query_vector = await self.embedding.embed_query(query_text)
 
         # ベクトル検索
         chunk_repo = ChunkRepository(conn)
         chunks = await chunk_repo.vector_search(
             query_embedding=query_vector,
             top_k=top_k,
-            subject_filter=subject_filter
+            subject_filter=subject_filter,
+            index_mode=settings.vector_index_mode,
+            rerank_factor=settings.vector_rerank_factor,
+            iterative_scan=settings.vector_iterative_scan or None
         )
 
         return chunks
@@ -116,15 +135,60 @@ class RAGService:
 
         return prompt
 
+    async def retrieve(
+        self,
+        conn: asyncpg.Connection,
+        question: str,
+        use_rag: bool = True,
+        subject_filter: Optional[str] = None,
+        query_vector: Optional[np.ndarray] = None
+    ) -> Tuple[List[dict], List[ReferencedDocument]]:
+        """RAG検索を行い、チャンクと参照資料情報を返す
+
+        Args:
+            conn: データベース接続
+            question: 質問文
+            use_rag: RAG検索を使用するか
+            subject_filter: 科目フィルタ
+            query_vector: ベクトル化済みの質問（省略時は質問文から生成）
+
+        Returns:
+            (類似チャンクのリスト, 参照資料リスト)
+        """
+        if not use_rag:
+            return [], []
+
+        chunks = await self.search_relevant_chunks(
+            conn=conn,
+            query_text=question,
+            subject_filter=subject_filter,
+            query_vector=query_vector
+        )
+
+        # 参照資料情報を構築
+        referenced_docs = [
+            ReferencedDocument(
+                document_id=chunk.get("document_id", 0),
+                filename=chunk.get("filename", "不明"),
+                subject=chunk.get("subject"),
+                chunk_content=chunk.get("content", "")[:200] + "..."  # 最初の200文字
+            )
+            for chunk in chunks
+        ]
+
+        return chunks, referenced_docs
+
     async def generate_answer(
         self,
         conn: asyncpg.Connection,
         question: str,
         use_rag: bool = True,
         subject_filter: Optional[str] = None
-    ) -> Tuple[str, List[ReferencedDocument]]:
+    ) -> Tuple[str, List[ReferencedDocument], Optional[int]]:
         """解答を生成
 
+        解答キャッシュが有効な場合、類似質問かつ同一チャンクの解答があれば再利用する
+
         Args:
             conn: データベース接続
             question: 質問文
@@ -132,43 +196,71 @@ class RAGService:
             subject_filter: 科目フィルタ
 
         Returns:
-            (解答テキスト, 参照資料リスト)
+            (解答テキスト, 参照資料リスト, キャッシュヒットで省略した生成時間ms（ミス時はNone）)
         """
-        chunks = []
-        referenced_docs = []
-
-        # RAG検索
-        if use_rag:
-            chunks = await self.search_relevant_chunks(
-                conn=conn,
-                query_text=question,
-                subject_filter=subject_filter
-            )
+        query_vector = None
+        if use_rag or self.answer_cache is not None:
+            query_vector = await self.embedding.embed_query(question)
+
+        chunks, referenced_docs = await self.retrieve(
+            conn=conn,
+            question=question,
+            use_rag=use_rag,
+            subject_filter=subject_filter,
+            query_vector=query_vector
+        )
+        chunk_ids = [chunk.get("id", 0) for chunk in chunks]
 
-            # 参照資料情報を構築
-            for chunk in chunks:
-                referenced_docs.append(
-                    ReferencedDocument(
-                        document_id=chunk.get("document_id", 0),
-                        filename=chunk.get("filename", "不明"),
-                        subject=chunk.get("subject"),
-                        chunk_content=chunk.get("content", "")[:200] + "..."  # 最初の200文字
-                    )
-                )
+        # 解答キャッシュ
+        if self.answer_cache is not None:
+            cached = self.answer_cache.lookup(query_vector, chunk_ids)
+            if cached is not None:
+                return cached.answer, referenced_docs, cached.generation_time_ms
 
         # プロンプト構築
         prompt = self.build_prompt(question, chunks)
 
         # LLMで解答生成
-        system_message = """あなたは理系大学の学習支援AIアシスタントです。
-数学・物理などの問題に対して、正確でわかりやすい解答を提供してください。
-数式はLaTeX記法で記述し、論理的に段階を追って説明してください。"""
-
+        generation_start = time.time()
         answer = await self.llm.generate(
             prompt=prompt,
-            system=system_message,
+            system=SYSTEM_MESSAGE,
             temperature=settings.llm_temperature
         )
+        generation_time_ms = int((time.time() - generation_start) * 1000)
+
+        if self.answer_cache is not None:
+            self.answer_cache.store(
+                question_vector=query_vector,
+                chunk_ids=chunk_ids,
+                document_ids=[doc.document_id for doc in referenced_docs],
+                answer=answer,
+                generation_time_ms=generation_time_ms
+            )
 
-        return answer, referenced_docs
+        return answer, referenced_docs, None
 
+    async def stream_answer(
+        self,
+        question: str,
+        chunks: List[dict]
+    ) -> AsyncIterator[str]:
+        """検索済みチャンクから解答をストリーミング生成
+
+        DB接続を生成中に保持しないよう、検索（retrieve）とは分けて呼び出す
+
+        Args:
+            question: 質問文
+            chunks: retrieveで取得したチャンク
+
+        Yields:
+            解答テキストの断片
+        """
+        prompt = self.build_prompt(question, chunks)
+
+        async for token in self.llm.generate_stream(
+            prompt=prompt,
+            system=SYSTEM_MESSAGE,
+            temperature=settings.llm_temperature
+        ):
+            yield token
@@ -0,0 +1,73 @@
+"""起動時ウォームアップ
+
+埋め込みモデル・Ollamaモデル・OCRサービスを事前に温め、
+完了するまでレディネスを報告しない
+"""
+import asyncio
+import time
+from typing import Dict
+from ..config import settings
+from ..utils.logger import setup_logger
+from .embedding_service import EmbeddingService
+from .llm_service import LLMService
+from .ocr_service import OCRService
+
+logger = setup_logger()
+
+# ウォームアップの状態（プロセス内で共有）
+_ready = False
+_results: Dict[str, str] = {}
+
+
+def is_ready() -> bool:
+    """ウォームアップが完了しているか"""
+    return _ready
+
+
+def mark_ready() -> None:
+    """ウォームアップなしで準備完了にする"""
+    global _ready
+    _ready = True
+
+
+def warmup_results() -> Dict[str, str]:
+    """コンポーネントごとのウォームアップ結果"""
+    return dict(_results)
+
+
+async def _timed(name: str, coro) -> None:
+    """ウォームアップ処理を実行し、結果と所要時間を記録"""
+    start = time.time()
+    try:
+        ok = await asyncio.wait_for(coro, timeout=settings.warmup_timeout)
+        _results[name] = "ok" if ok is not False else "error"
+    except Exception as e:
+        _results[name] = "error"
+        logger.error(f"Warm-up of {name} failed: {e}")
+    elapsed_ms = int((time.time() - start) * 1000)
+    logger.info(f"Warm-up of {name}: {_results[name]} ({elapsed_ms}ms)")
+
+
+async def warm_up_services(
+    ocr_service: OCRService,
+    llm_service: LLMService,
+    embedding_service: EmbeddingService
+) -> Dict[str, str]:
+    """全サービスを並行してウォームアップ
+
+    失敗したコンポーネントはログに残し、ウォームアップ自体は完了扱いにする
+    （個別の稼働状態は /api/health で確認する）
+
+    Returns:
+        コンポーネントごとの結果（ok / error）
+    """
+    global _ready
+
+    await asyncio.gather(
+        _timed("embedding", embedding_service.warm_up()),
+        _timed("ollama", llm_service.preload()),
+        _timed("ocr", ocr_service.health_check()),
+    )
+
+    _ready = True
+    return warmup_results()
@@ -1,3 +1,4 @@
 """ユーティリティ"""
 from .logger import setup_logger
 
+from .lru_cache import LRUCache
@@ -0,0 +1,88 @@
+"""件数・メモリ上限付きLRUキャッシュ"""
+from collections import OrderedDict
+from typing import Any, Callable, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """件数とおおよそのバイト数で上限を設けるLRUキャッシュ
+
+    ヒット・ミス数を記録し、キャッシュ効果の計測に使う
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: Optional[int] = None,
+        sizeof: Optional[Callable[[Any], int]] = None
+    ):
+        """
+        Args:
+            max_entries: 最大件数
+            max_bytes: 最大バイト数（Noneなら件数のみで制限）
+            sizeof: 値のバイト数を返す関数（max_bytes指定時に使用）
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._sizeof = sizeof or (lambda value: 0)
+        self._entries: "OrderedDict[Hashable, V]" = OrderedDict()
+        self._sizes: dict = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """値を取得（ヒット時は最近使用に移動）"""
+        if key not in self._entries:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return self._entries[key]
+
+    def put(self, key: Hashable, value: V) -> None:
+        """値を登録し、上限を超えた分を古い順に破棄"""
+        if key in self._entries:
+            self._discard(key)
+
+        size = self._sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        self._entries[key] = value
+        self._sizes[key] = size
+        self.total_bytes += size
+
+        while len(self._entries) > self.max_entries or (
+            self.max_bytes is not None and self.total_bytes > self.max_bytes
+        ):
+            self._discard(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        """全エントリを破棄"""
+        self._entries.clear()
+        self._sizes.clear()
+        self.total_bytes = 0
+
+    def stats(self) -> dict:
+        """ヒット率などの統計情報"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _discard(self, key: Hashable) -> None:
+        """エントリを削除"""
+        del self._entries[key]
+        self.total_bytes -= self._sizes.pop(key)
@@ -0,0 +1,75 @@
+"""テキストのチャンク分割
+
+ページ単位で届くテキストを、全文を保持せずに chunk_size 文字・
+chunk_overlap 文字重複のチャンクへ順に切り出す
+"""
+from typing import Iterator, List, Tuple
+
+
+class StreamingTextSplitter:
+    """ページを追加しながらチャンクを切り出す分割器"""
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
+        """
+        Args:
+            chunk_size: チャンクの最大文字数
+            chunk_overlap: 隣接チャンクの重複文字数
+        """
+        if chunk_overlap >= chunk_size:
+            raise ValueError("chunk_overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self._buffer = ""
+        # (バッファ内の開始位置, ページ番号)
+        self._pages: List[Tuple[int, int]] = []
+
+    def add_page(self, text: str, page: int) -> Iterator[Tuple[str, dict]]:
+        """ページを追加し、確定したチャンクを返す
+
+        Yields:
+            (チャンク本文, メタデータ)
+        """
+        text = text.strip()
+        if not text:
+            return
+        if self._buffer:
+            self._buffer += "\n"
+        self._pages.append((len(self._buffer), page))
+        self._buffer += text
+
+        while len(self._buffer) >= self.chunk_size:
+            yield self._emit(self._split_point())
+
+    def finish(self) -> Iterator[Tuple[str, dict]]:
+        """残りのテキストを最後のチャンクとして返す"""
+        if self._buffer.strip():
+            yield self._emit(len(self._buffer))
+        self._buffer = ""
+        self._pages = []
+
+    def _split_point(self) -> int:
+        """chunk_size 以内で、後半にある最後の改行か空白の直後で切る"""
+        window = self._buffer[:self.chunk_size]
+        for separator in ("\n", " ", "。"):
+            index = window.rfind(separator)
+            if index >= self.chunk_size // 2:
+                return index + 1
+        return self.chunk_size
+
+    def _emit(self, end: int) -> Tuple[str, dict]:
+        """先頭から end 文字をチャンクとして切り出し、重複分を残す"""
+        content = self._buffer[:end].strip()
+        pages = sorted({page for start, page in self._pages if start < end})
+        metadata = {"pages": [pages[0], pages[-1]]} if pages else {}
+
+        keep_from = max(end - self.chunk_overlap, 0) if end < len(self._buffer) else end
+        self._buffer = self._buffer[keep_from:]
+        # 残したテキストに掛かるページだけを残し、位置をずらす
+        remaining = []
+        for index, (start, page) in enumerate(self._pages):
+            next_start = self._pages[index + 1][0] if index + 1 < len(self._pages) else None
+            if next_start is not None and next_start <= keep_from:
+                continue
+            remaining.append((max(start - keep_from, 0), page))
+        self._pages = remaining
+        return content, metadata
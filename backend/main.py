@@ -3,12 +3,24 @@
 FastAPIベースのREST APIサーバー
 OCR、RAG、LLMを統合した問題解答システム
 """
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.routes import health, ask_problem, documents
+from app.api.middleware import UploadSizeLimitMiddleware
 from app.db import init_db, close_db
+from app.services import (
+    init_http_clients,
+    close_http_clients,
+    init_conversation_logger,
+    close_conversation_logger,
+    close_ingestion,
+    warm_up_services,
+    mark_ready
+)
+from app.config import settings
 from app.utils.logger import setup_logger
 
 # ロガー設定
@@ -28,17 +40,60 @@ async def lifespan(app: FastAPI):
         logger.info("Database connection pool initialized")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
+
+    await init_http_clients()
+    logger.info("HTTP client pools initialized")
+
+    await init_conversation_logger()
+
+    # ウォームアップはバックグラウンドで行い、完了までレディネスを返さない
+    warmup_task = None
+    if settings.warmup_enabled:
+        ocr_service, llm_service, embedding_service, _ = ask_problem.get_services()
+        warmup_task = asyncio.create_task(
+            warm_up_services(ocr_service, llm_service, embedding_service)
+        )
+    else:
+        mark_ready()
     
     yield
+
+    if warmup_task is not None and not warmup_task.done():
+        warmup_task.cancel()
     
     # 終了時
     logger.info("Shutting down hight-agent-ai backend...")
+
+    # 実行中の取り込みを止める（資料は failed として記録される）
+    try:
+        await close_ingestion()
+    except Exception as e:
+        logger.error(f"Error stopping ingestion: {e}")
+
+    # 実行中の埋め込みバッチを止める
+    try:
+        await ask_problem.close_services()
+    except Exception as e:
+        logger.error(f"Error closing services: {e}")
+
+    # 書き込み待ちの会話履歴はDBを閉じる前に書き出す
+    try:
+        await close_conversation_logger()
+    except Exception as e:
+        logger.error(f"Error draining conversation log: {e}")
+
     try:
         await close_db()
         logger.info("Database connection pool closed")
     except Exception as e:
         logger.error(f"Error closing database: {e}")
 
+    try:
+        await close_http_clients()
+        logger.info("HTTP client pools closed")
+    except Exception as e:
+        logger.error(f"Error closing HTTP clients: {e}")
+
 
 # FastAPIアプリケーション
 app = FastAPI(
@@ -57,6 +112,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# アップロードサイズ上限（超過分は受信途中で打ち切る）
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=settings.max_upload_size_mb * 1024 * 1024
+)
+
 # ルーター登録
 app.include_router(health.router, prefix=API_PREFIX, tags=["health"])
 app.include_router(ask_problem.router, prefix=API_PREFIX, tags=["problem"])
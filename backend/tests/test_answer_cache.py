@@ -0,0 +1,62 @@
+"""セマンティック解答キャッシュのテスト"""
+import numpy as np
+from app.services.answer_cache import SemanticAnswerCache
+
+
+def _unit(values):
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_hit_requires_similar_question_and_same_chunks():
+    """類似度が閾値以上かつチャンクIDが一致する場合のみヒット"""
+    cache = SemanticAnswerCache(max_entries=10, ttl_seconds=60, similarity_threshold=0.95)
+    cache.store(_unit([1, 0, 0]), [1, 2], [10], "answer", generation_time_ms=1500)
+
+    hit = cache.lookup(_unit([1, 0.05, 0]), [1, 2])
+    assert hit is not None
+    assert hit.answer == "answer"
+    assert hit.generation_time_ms == 1500
+
+    assert cache.lookup(_unit([1, 0.05, 0]), [1, 3]) is None
+    assert cache.lookup(_unit([0, 1, 0]), [1, 2]) is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_lru_eviction_and_ttl():
+    """上限超過で最も古く使われたものを破棄し、期限切れは返さない"""
+    cache = SemanticAnswerCache(max_entries=2, ttl_seconds=60, similarity_threshold=0.95)
+    cache.store(_unit([1, 0]), [1], [10], "a", 100)
+    cache.store(_unit([0, 1]), [2], [20], "b", 100)
+    assert cache.lookup(_unit([1, 0]), [1]) is not None  # aを最近使用に
+    cache.store(_unit([1, 1]), [3], [30], "c", 100)
+
+    assert len(cache) == 2
+    assert cache.lookup(_unit([0, 1]), [2]) is None
+
+    expired = SemanticAnswerCache(max_entries=2, ttl_seconds=1e-9, similarity_threshold=0.95)
+    expired.store(_unit([1, 0]), [1], [10], "a", 100)
+    assert expired.lookup(_unit([1, 0]), [1]) is None
+    assert len(expired) == 0
+
+
+def test_invalidate_document():
+    """削除された資料を参照する解答だけを破棄"""
+    cache = SemanticAnswerCache(max_entries=10, ttl_seconds=60, similarity_threshold=0.95)
+    cache.store(_unit([1, 0]), [1], [10, 11], "a", 100)
+    cache.store(_unit([0, 1]), [2], [20], "b", 100)
+
+    assert cache.invalidate_document(11) == 1
+    assert cache.lookup(_unit([1, 0]), [1]) is None
+    assert cache.lookup(_unit([0, 1]), [2]) is not None
+
+
+def test_zero_disables_instead_of_falling_back_to_defaults():
+    """明示した0は設定値に置き換えず、キャッシュしない・即時失効として扱う"""
+    disabled = SemanticAnswerCache(max_entries=0, ttl_seconds=60, similarity_threshold=0.95)
+    disabled.store(_unit([1, 0]), [1], [10], "a", 100)
+    assert len(disabled) == 0
+
+    no_ttl = SemanticAnswerCache(max_entries=10, ttl_seconds=0, similarity_threshold=0.95)
+    no_ttl.store(_unit([1, 0]), [1], [10], "a", 100)
+    assert no_ttl.lookup(_unit([1, 0]), [1]) is None
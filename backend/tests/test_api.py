@@ -56,3 +56,53 @@ def test_documents_list_with_filters():
     assert "documents" in data
     assert "total" in data
 
+
+
+def test_upload_size_limit():
+    """Content-Lengthが上限を超えるアップロードは本文を読まずに413"""
+    from app.config import settings
+
+    too_large = settings.max_upload_size_mb * 1024 * 1024 + 1
+    response = client.post(
+        "/api/ask_problem_image",
+        content=b"",
+        headers={"Content-Length": str(too_large), "Content-Type": "multipart/form-data; boundary=x"}
+    )
+    assert response.status_code == 413
+
+
+def test_upload_invalid_content_length():
+    """数値でないContent-Lengthは400"""
+    response = client.post(
+        "/api/ask_problem_image",
+        content=b"",
+        headers={"Content-Length": "abc", "Content-Type": "multipart/form-data; boundary=x"}
+    )
+    assert response.status_code == 400
+
+
+def test_liveness():
+    """ライブネスは依存サービスに関係なく200"""
+    response = client.get("/api/livez")
+    assert response.status_code == 200
+    assert response.json() == {"status": "ok"}
+
+
+def test_readiness_before_warm_up(monkeypatch):
+    """ウォームアップ完了前のレディネスは503"""
+    from app.api.routes import health
+
+    monkeypatch.setattr(health, "is_ready", lambda: False)
+    assert client.get("/api/readyz").status_code == 503
+
+    monkeypatch.setattr(health, "is_ready", lambda: True)
+    assert client.get("/api/readyz").status_code == 200
+
+
+def test_upload_document_rejects_unsupported_type():
+    """対応していない拡張子は取り込まない"""
+    response = client.post(
+        "/api/documents/upload",
+        files={"file": ("notes.exe", b"MZ", "application/octet-stream")}
+    )
+    assert response.status_code == 400
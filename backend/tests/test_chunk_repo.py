@@ -0,0 +1,149 @@
+"""チャンクリポジトリのテスト"""
+import uuid
+from contextlib import asynccontextmanager
+import numpy as np
+import pytest
+from app.db.repositories import ChunkRepository
+
+
+class RecordingConnection:
+    """発行したSQLと引数を記録する接続"""
+
+    def __init__(self):
+        self.executed = []
+        self.arguments = []
+        self.fetched = []
+        self.copied = []
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    async def execute(self, query, *args):
+        self.executed.append(query)
+        self.arguments.append(args)
+        return "INSERT 0 0"
+
+    async def fetchval(self, query, *args):
+        return 0
+
+    async def copy_records_to_table(self, table, records, columns):
+        self.copied.append((table, list(records), columns))
+
+    async def fetch(self, query, *args):
+        self.fetched.append((query, args))
+        return []
+
+
+@pytest.mark.asyncio
+async def test_halfvec_search_reranks_candidates():
+    """halfvec索引で top_k×倍率 件の候補を取り、float32距離で並べ直す"""
+    conn = RecordingConnection()
+    query = np.zeros(1024, dtype=np.float32)
+
+    await ChunkRepository(conn).vector_search(
+        query, top_k=5, subject_filter="数学", index_mode="halfvec", rerank_factor=4
+    )
+
+    sql, args = conn.fetched[0]
+    assert "embedding::halfvec(1024)) <=>" in sql
+    assert sql.rstrip().endswith("LIMIT $4")
+    assert args[1:] == ("数学", 20, 5)
+    assert "SET LOCAL hnsw.ef_search = 40" in conn.executed[0]
+
+
+@pytest.mark.asyncio
+async def test_subject_filter_uses_chunk_columns():
+    """科目・ステータスはchunksの複製列で絞り込み、反復スキャンとカスタムプランを指定する"""
+    conn = RecordingConnection()
+
+    await ChunkRepository(conn).vector_search(
+        np.zeros(1024, dtype=np.float32), top_k=5, subject_filter="数学",
+        iterative_scan="relaxed_order"
+    )
+
+    sql, _ = conn.fetched[0]
+    candidates = sql.split(")\n            SELECT")[0]
+    assert "c.status = 'completed' AND c.subject = $2" in candidates
+    assert "documents" not in candidates
+    assert "SET LOCAL hnsw.iterative_scan = relaxed_order" in conn.executed
+    assert "SET LOCAL plan_cache_mode = force_custom_plan" in conn.executed
+
+
+@pytest.mark.asyncio
+async def test_unknown_iterative_scan_is_rejected():
+    with pytest.raises(ValueError):
+        await ChunkRepository(RecordingConnection()).vector_search(
+            np.zeros(1024, dtype=np.float32), iterative_scan="on"
+        )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("index_mode", ["pq", "vector"])
+async def test_unknown_index_mode_is_rejected(index_mode):
+    """float32の索引は作らないため、vector モードも受け付けない"""
+    with pytest.raises(ValueError):
+        await ChunkRepository(RecordingConnection()).vector_search(
+            np.zeros(1024, dtype=np.float32), index_mode=index_mode
+        )
+
+
+def test_settings_reject_vector_index_mode_without_index(monkeypatch):
+    """索引のないモードは設定の読み込み時に拒否する"""
+    from pydantic import ValidationError
+    from app.config import Settings
+
+    monkeypatch.setenv("VECTOR_INDEX_MODE", "vector")
+    with pytest.raises(ValidationError):
+        Settings()
+
+    monkeypatch.setenv("VECTOR_INDEX_MODE", "bit")
+    assert Settings().vector_index_mode == "bit"
+
+
+@pytest.mark.asyncio
+async def test_bulk_create_copies_document_subject_and_status():
+    """一括登録は資料の科目・ステータスをチャンクに複製する（検索の絞り込み対象になる）"""
+    conn = RecordingConnection()
+
+    await ChunkRepository(conn).bulk_create([])
+
+    insert = next(q for q in conn.executed if "INSERT INTO chunks" in q)
+    assert "subject, status" in insert
+    assert "d.subject, d.status" in insert
+
+
+@pytest.mark.asyncio
+async def test_staged_rows_are_scoped_to_the_ingestion_run():
+    """受け皿の行はrun_id付きでCOPYし、差分反映はその取り込み分だけを読んで削除する"""
+    conn = RecordingConnection()
+    repo = ChunkRepository(conn)
+    run_id = uuid.uuid4()
+    embedding = np.zeros(1024, dtype=np.float32)
+
+    await repo.stage_chunks(run_id, [(3, "本文", 0, embedding, {"pages": [1, 1]})])
+    await repo.sync_from_staging(3, run_id, status="completed")
+
+    table, records, columns = conn.copied[0]
+    assert table == "chunk_ingest_staging"
+    assert columns[0] == "run_id" and records[0][0] == run_id
+    assert records[0][-1] == '{"pages": [1, 1]}'
+
+    reads = [q for q in conn.executed if "FROM chunk_ingest_staging" in q and "DELETE" not in q]
+    assert reads and all("run_id = $2" in q for q in reads)
+    assert conn.arguments[0] == (3, run_id)
+    delete = conn.executed.index("DELETE FROM chunk_ingest_staging WHERE run_id = $1")
+    assert conn.arguments[delete] == (run_id,)
+
+
+@pytest.mark.asyncio
+async def test_sync_replaces_chunks_whose_embedding_changed():
+    """本文が同じでも埋め込みが違えば残さず、対応表はコミットで必ず消える"""
+    conn = RecordingConnection()
+
+    await ChunkRepository(conn).sync_from_staging(3, uuid.uuid4())
+
+    create = conn.executed[0]
+    assert "CREATE TEMP TABLE chunks_matched ON COMMIT DROP" in create
+    assert "o.embedding = s.embedding" in create
+    assert conn.executed[-1] == "DROP TABLE chunks_matched"
@@ -0,0 +1,86 @@
+"""会話履歴の非同期バッチ書き込みのテスト"""
+import asyncio
+from contextlib import asynccontextmanager
+import pytest
+from app.services import conversation_logger as module
+from app.services.conversation_logger import ConversationLogger
+
+
+class FakeConversationRepository:
+    """書き込まれたバッチを記録するリポジトリ"""
+
+    batches: list = []
+
+    def __init__(self, conn):
+        pass
+
+    async def create_batch(self, records):
+        FakeConversationRepository.batches.append(records)
+        return len(records)
+
+
+@asynccontextmanager
+async def fake_db_connection():
+    yield None
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    monkeypatch.setattr(module, "get_db_connection", fake_db_connection)
+    monkeypatch.setattr(module, "ConversationRepository", FakeConversationRepository)
+    FakeConversationRepository.batches = []
+    return FakeConversationRepository
+
+
+def _record(i: int) -> dict:
+    return {"session_id": "s", "question": f"q{i}", "answer": f"a{i}"}
+
+
+@pytest.mark.asyncio
+async def test_flushes_in_batches(fake_db):
+    """件数の閾値ごとにまとめて書き込む"""
+    conv_logger = ConversationLogger(batch_size=2, flush_interval=10.0)
+    conv_logger.start()
+    for i in range(4):
+        conv_logger.log(**_record(i))
+
+    await asyncio.sleep(0.05)
+    assert [len(b) for b in fake_db.batches] == [2, 2]
+    assert conv_logger.stats()["written"] == 4
+
+    await conv_logger.close()
+
+
+@pytest.mark.asyncio
+async def test_drops_when_queue_full_and_drains_on_close(fake_db):
+    """キュー満杯時は破棄して数え、停止時に残りを書き出す"""
+    conv_logger = ConversationLogger(max_queue=2, batch_size=10)
+    assert conv_logger.log(**_record(0))
+    assert conv_logger.log(**_record(1))
+    assert not conv_logger.log(**_record(2))
+
+    await conv_logger.close()
+
+    stats = conv_logger.stats()
+    assert stats["dropped"] == 1
+    assert stats["written"] == 2
+    assert stats["queued"] == 0
+    assert [r["question"] for r in fake_db.batches[0]] == ["q0", "q1"]
+
+
+@pytest.mark.asyncio
+async def test_close_writes_batch_in_progress(fake_db):
+    """書き込み間隔の待ち中に停止しても、取り出し済みの会話を書き出す"""
+    conv_logger = ConversationLogger(batch_size=10, flush_interval=10.0)
+    conv_logger.start()
+    for i in range(5):
+        conv_logger.log(**_record(i))
+    await asyncio.sleep(0.1)
+    assert fake_db.batches == []
+
+    await conv_logger.close(timeout=1.0)
+
+    stats = conv_logger.stats()
+    assert stats["written"] == 5
+    assert stats["queued"] == 0
+    assert [r["question"] for b in fake_db.batches for r in b] == [f"q{i}" for i in range(5)]
@@ -0,0 +1,42 @@
+"""DB接続管理のテスト"""
+import numpy as np
+import pytest
+from pgvector.asyncpg import register_vector
+from app.db import connection
+
+
+@pytest.mark.asyncio
+async def test_pool_registers_pgvector_codec(monkeypatch):
+    """プールの各接続に pgvector のバイナリコーデックを登録する"""
+    created = {}
+
+    async def create_pool(**kwargs):
+        created.update(kwargs)
+        return object()
+
+    monkeypatch.setattr(connection, "_pool", None)
+    monkeypatch.setattr(connection.asyncpg, "create_pool", create_pool)
+
+    await connection.init_db()
+
+    assert created["init"] is register_vector
+
+
+@pytest.mark.asyncio
+async def test_vector_codec_round_trips_float32():
+    """vector はバイナリで送り、float32配列として受け取る"""
+    codecs = {}
+
+    class Conn:
+        async def set_type_codec(self, name, encoder, decoder, format, **kwargs):
+            codecs[name] = (encoder, decoder, format)
+
+    await register_vector(Conn())
+
+    encoder, decoder, format = codecs["vector"]
+    vector = np.random.default_rng(0).standard_normal(1024).astype(np.float32)
+    decoded = decoder(encoder(vector))
+
+    assert format == "binary"
+    assert decoded.dtype == np.float32
+    np.testing.assert_array_equal(decoded, vector)
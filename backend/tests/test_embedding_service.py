@@ -0,0 +1,169 @@
+"""埋め込みサービスのテスト"""
+import asyncio
+import numpy as np
+import pytest
+from app.services.embedding_service import EmbeddingService
+
+
+class FakeModel:
+    """encode呼び出しを記録するモデル"""
+
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, sentences, **kwargs):
+        self.calls.append(sentences)
+        if isinstance(sentences, str):
+            return np.ones(4, dtype=np.float32) / 2
+        return np.ones((len(sentences), 4), dtype=np.float32) / 2
+
+
+@pytest.mark.asyncio
+async def test_embed_query_uses_cache():
+    """前後の空白だけが違うクエリはモデルを再実行しない"""
+    service = EmbeddingService(model_name="fake")
+    model = FakeModel()
+    service.backend._model = model
+
+    first = await service.embed_query("テイラー展開とは")
+    second = await service.embed_query(" テイラー展開とは ")
+
+    assert first is second
+    assert first.dtype == np.float32
+    assert first.tolist() == [0.5] * 4
+    assert model.calls == [["query: テイラー展開とは"]]
+    assert service.query_cache.stats()["hits"] == 1
+    assert service.query_cache.total_bytes == 16
+
+
+@pytest.mark.asyncio
+async def test_embed_query_keys_cache_on_model_input():
+    """表記の違うクエリ（x² と x2）は別エントリとし、モデルには原文を渡す"""
+    service = EmbeddingService(model_name="fake")
+    model = FakeModel()
+    service.backend._model = model
+
+    await service.embed_query("x² の微分")
+    await service.embed_query("x2 の微分")
+
+    assert model.calls == [["query: x² の微分"], ["query: x2 の微分"]]
+    assert len(service.query_cache) == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_queries_are_batched():
+    """同時に届いたクエリは1回のencodeにまとめ、重複は1件として計算"""
+    service = EmbeddingService(model_name="fake")
+    model = FakeModel()
+    service.backend._model = model
+
+    results = await asyncio.gather(
+        service.embed_query("質問A"),
+        service.embed_query("質問B"),
+        service.embed_query("質問A"),
+    )
+
+    assert all(result.tolist() == [0.5] * 4 for result in results)
+    assert model.calls == [["query: 質問A", "query: 質問B"]]
+
+
+@pytest.mark.asyncio
+async def test_close_cancels_in_flight_batches():
+    """終了時に実行中のバッチを止め、待っている呼び出し元をキャンセルする"""
+    service = EmbeddingService(model_name="fake")
+    started = asyncio.Event()
+
+    async def slow_encode(texts, batch_size=32):
+        started.set()
+        await asyncio.sleep(10)
+
+    service.backend.encode = slow_encode
+    query = asyncio.ensure_future(service.embed_query("質問"))
+    await started.wait()
+    assert len(service._batch_tasks) == 1
+
+    await service.close()
+
+    with pytest.raises(asyncio.CancelledError):
+        await query
+    assert not service._batch_tasks
+
+
+def test_document_cache_keys_depend_on_backend():
+    """実行方式が違えば同じ本文でも別のキャッシュキーになる"""
+    from app.services.onnx_embedding import OnnxEmbeddingBackend
+
+    torch_keys = EmbeddingService(model_name="fake").document_cache_keys(["本文"])
+    int8 = EmbeddingService(
+        model_name="fake",
+        backend=OnnxEmbeddingBackend("fake", quantize=True, model_dir="unused")
+    )
+
+    assert torch_keys == EmbeddingService(model_name="fake").document_cache_keys(["本文"])
+    assert int8.document_cache_keys(["本文"]) != torch_keys
+
+
+def test_remote_backend_is_selected_by_url():
+    """ワーカーURLを指定するとリモートバックエンドを使う"""
+    from app.services.embedding_backends import RemoteEmbeddingBackend, create_backend
+
+    backend = create_backend("fake", service_url="http://embedding-service:8090")
+    assert isinstance(backend, RemoteEmbeddingBackend)
+    assert backend.base_url == "http://embedding-service:8090"
+
+
+class FakeResponse:
+    """埋め込みワーカーの応答"""
+
+    def __init__(self, vectors, headers):
+        self.status = 200
+        self.headers = headers
+        self._body = np.asarray(vectors, dtype="<f4").tobytes()
+
+    async def read(self):
+        return self._body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    def __init__(self, response):
+        self.response = response
+
+    def post(self, url, **kwargs):
+        return self.response
+
+
+@pytest.mark.asyncio
+async def test_remote_backend_cache_id_comes_from_config(monkeypatch):
+    """キャッシュキーの計算方式は設定から決まり、ワーカーの応答と照合する"""
+    from app.services import embedding_backends
+    from app.services.embedding_backends import RemoteEmbeddingBackend
+
+    monkeypatch.setattr(embedding_backends.settings, "embedding_service_backend", "onnx-int8")
+    backend = RemoteEmbeddingBackend("http://embedding-service:8090", "fake")
+    assert backend.cache_id == "onnx-int8"
+
+    # 別方式の埋め込みキーとは一致しない
+    remote_keys = EmbeddingService(model_name="fake", backend=backend).document_cache_keys(["本文"])
+    assert remote_keys != EmbeddingService(model_name="fake").document_cache_keys(["本文"])
+
+    matching = FakeResponse(
+        [[1.0, 0.0], [0.0, 1.0]],
+        {"X-Embedding-Model": "fake", "X-Embedding-Backend": "onnx-int8"}
+    )
+    monkeypatch.setattr(embedding_backends, "get_http_session", lambda name: FakeSession(matching))
+    vectors = await backend.encode(["a", "b"])
+    assert vectors.shape == (2, 2) and vectors.dtype == np.float32
+
+    mismatched = FakeResponse(
+        [[1.0, 0.0]],
+        {"X-Embedding-Model": "fake", "X-Embedding-Backend": "sentence-transformers"}
+    )
+    monkeypatch.setattr(embedding_backends, "get_http_session", lambda name: FakeSession(mismatched))
+    with pytest.raises(ValueError, match="sentence-transformers"):
+        await backend.encode(["a"])
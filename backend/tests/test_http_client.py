@@ -0,0 +1,24 @@
+"""共有HTTPクライアントのテスト"""
+import pytest
+from app.services import http_client
+
+
+@pytest.mark.asyncio
+async def test_session_is_shared_per_upstream():
+    """同じ上流には同じセッションを返し、上流ごとに接続上限を分ける"""
+    await http_client.init_http_clients()
+    try:
+        ollama = http_client.get_http_session("ollama")
+        assert http_client.get_http_session("ollama") is ollama
+        assert http_client.get_http_session("ocr") is not ollama
+        assert ollama.connector.limit == http_client.settings.ollama_max_connections
+    finally:
+        await http_client.close_http_clients()
+
+    assert ollama.closed
+
+
+def test_unknown_upstream():
+    """未定義の上流はエラー"""
+    with pytest.raises(ValueError):
+        http_client.get_http_session("unknown")
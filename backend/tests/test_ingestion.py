@@ -0,0 +1,352 @@
+"""資料取り込みパイプラインのテスト"""
+import asyncio
+import io
+from contextlib import asynccontextmanager
+import numpy as np
+import pytest
+from app.services import ingestion
+from app.services.ingestion import IngestionPipeline
+from app.utils.text_splitter import StreamingTextSplitter
+
+
+def test_splitter_overlap_and_pages():
+    """チャンクは上限以内で重複し、元のページ範囲を持つ"""
+    splitter = StreamingTextSplitter(chunk_size=100, chunk_overlap=20)
+    chunks = []
+    for page in (1, 2):
+        chunks.extend(splitter.add_page(f"p{page} " * 60, page))
+    chunks.extend(splitter.finish())
+
+    assert all(len(content) <= 100 for content, _ in chunks)
+    assert chunks[0][1] == {"pages": [1, 1]}
+    assert chunks[-1][1]["pages"][-1] == 2
+    assert any(meta["pages"] == [1, 2] for _, meta in chunks)
+    # 隣接チャンクの末尾と先頭が重なる
+    assert chunks[0][0][-10:] in chunks[1][0]
+
+
+class FakeOCRService:
+    def __init__(self, pages):
+        self.pages = pages
+
+    async def extract_pages(self, file, filename, content_type):
+        for index, text in enumerate(self.pages, 1):
+            yield index, text
+
+
+class FakeLLMService:
+    async def classify_subject(self, text):
+        return "数学"
+
+
+class FakeEmbeddingService:
+    model_name = "fake"
+
+    def __init__(self):
+        self.batches = []
+        self.texts = []
+
+    def document_cache_keys(self, texts):
+        return [f"passage: {text}".encode() for text in texts]
+
+    async def embed_documents(self, texts):
+        self.batches.append(len(texts))
+        self.texts.extend(texts)
+        return np.zeros((len(texts), 4), dtype=np.float32)
+
+
+class FakeConnection:
+    """トランザクションだけを持つ接続"""
+
+    def __init__(self, db):
+        self.db = db
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+
+class FakeDB:
+    """登録されたチャンクとステータス更新を記録"""
+
+    def __init__(self):
+        self.chunks = []
+        # run_id → 受け皿テーブルの行
+        self.staged = {}
+        self.copies = []
+        self.inserted = []
+        self.cache = {}
+        self.status = {}
+        self.subject = {}
+        # 同時に借りている接続数
+        self.open = 0
+        self.max_open = 0
+        self.locked = []
+
+    def chunk_repo(self, conn):
+        db = self
+
+        class Repo:
+            async def stage_chunks(self, run_id, rows):
+                db.copies.append(len(rows))
+                db.staged.setdefault(run_id, []).extend(rows)
+                return len(rows)
+
+            async def delete_staged(self, run_id):
+                return len(db.staged.pop(run_id, []))
+
+            async def sync_from_staging(self, document_id, run_id, status="processing"):
+                staged = db.staged.pop(run_id, [])
+                old = [c for c in db.chunks if c[0] == document_id]
+                old_texts = [c[1] for c in old]
+                new = [c for c in staged if c[1] not in old_texts]
+                new_texts = [c[1] for c in staged]
+                gone = [c for c in old if c[1] not in new_texts]
+                db.chunks = [c for c in db.chunks if c not in gone] + new
+                db.inserted.extend(new)
+                return len(new), len(gone), len(old) - len(gone)
+
+        return Repo()
+
+    def cache_repo(self, conn):
+        db = self
+
+        class Repo:
+            async def get_many(self, keys):
+                return {k: db.cache[k] for k in keys if k in db.cache}
+
+            async def put_many(self, model, keys, embeddings):
+                db.cache.update(zip(keys, embeddings))
+
+        return Repo()
+
+    def document_repo(self, conn):
+        db = self
+
+        class Repo:
+            async def update_status(self, document_id, status, error_message=None):
+                db.status[document_id] = (status, error_message)
+                return True
+
+            async def update_subject(self, document_id, subject):
+                db.subject[document_id] = subject
+                return True
+
+            async def get_for_update(self, document_id):
+                db.locked.append(document_id)
+                return {"id": document_id}
+
+        return Repo()
+
+
+@pytest.fixture
+def fake_db(monkeypatch):
+    db = FakeDB()
+
+    @asynccontextmanager
+    async def fake_db_connection():
+        db.open += 1
+        db.max_open = max(db.max_open, db.open)
+        try:
+            yield FakeConnection(db)
+        finally:
+            db.open -= 1
+
+    monkeypatch.setattr(ingestion, "get_db_connection", fake_db_connection)
+    monkeypatch.setattr(ingestion, "ChunkRepository", db.chunk_repo)
+    monkeypatch.setattr(ingestion, "DocumentRepository", db.document_repo)
+    monkeypatch.setattr(ingestion, "EmbeddingCacheRepository", db.cache_repo)
+    return db
+
+
+@pytest.mark.asyncio
+async def test_pipeline_ingests_document(fake_db):
+    """OCR→分割→ベクトル化→登録が流れ、completedと科目が記録される"""
+    embedding = FakeEmbeddingService()
+    pipeline = IngestionPipeline(
+        FakeOCRService(["微分 " * 100, "", "積分 " * 100]),
+        FakeLLMService(),
+        embedding,
+        chunk_size=50,
+        chunk_overlap=10,
+        queue_size=2,
+        embed_batch_size=4,
+        copy_batch_size=8
+    )
+
+    stats = await pipeline.run(7, io.BytesIO(b""), "calc.pdf", "application/pdf")
+
+    assert stats.pages == 3
+    assert stats.empty_pages == 1
+    assert stats.chunks == len(fake_db.chunks)
+    assert [c[2] for c in fake_db.chunks] == list(range(len(fake_db.chunks)))
+    assert max(embedding.batches) <= 4
+    # COPYは copy_batch_size 件ずつまとめて送る
+    assert all(n >= 8 for n in fake_db.copies[:-1])
+    assert fake_db.status[7] == ("completed", None)
+    assert fake_db.subject[7] == "数学"
+    # 差分反映の前に資料の行をロックする
+    assert fake_db.locked == [7]
+    # 反映後は受け皿に残さない
+    assert fake_db.staged == {}
+
+
+@pytest.mark.asyncio
+async def test_pipeline_marks_failed(fake_db):
+    """途中のステージが失敗したら既存のチャンクを残したまま例外を送出する"""
+
+    class FailingEmbeddingService(FakeEmbeddingService):
+        async def embed_documents(self, texts):
+            raise ValueError("model not loaded")
+
+    pipeline = IngestionPipeline(
+        FakeOCRService(["本文 " * 100]),
+        FakeLLMService(),
+        FailingEmbeddingService(),
+        chunk_size=50,
+        chunk_overlap=10
+    )
+
+    fake_db.chunks = [(8, "旧版", 0, [0.0] * 4, None)]
+
+    with pytest.raises(ValueError) as excinfo:
+        await pipeline.run(8, io.BytesIO(b""), "a.png", "image/png")
+
+    assert fake_db.chunks == [(8, "旧版", 0, [0.0] * 4, None)]
+    assert 8 not in fake_db.status
+    assert fake_db.staged == {}
+
+    await pipeline.mark_failed(8, excinfo.value)
+    assert fake_db.status[8] == ("failed", "model not loaded")
+
+
+@pytest.mark.asyncio
+async def test_reingest_reuses_cached_embeddings_and_unchanged_chunks(fake_db):
+    """本文が同じチャンクは再計算も再登録もせず、変わった分だけ反映する"""
+    embedding = FakeEmbeddingService()
+    pipeline = IngestionPipeline(
+        FakeOCRService(["第1章 極限", "第2章 微分"]),
+        FakeLLMService(),
+        embedding,
+        chunk_size=10,
+        chunk_overlap=0
+    )
+    await pipeline.run(9, io.BytesIO(b""), "v1.pdf", "application/pdf")
+    first_texts = list(embedding.texts)
+    fake_db.inserted = []
+    embedding.texts = []
+
+    pipeline.ocr = FakeOCRService(["第1章 極限", "第2章 積分"])
+    stats = await pipeline.run(9, io.BytesIO(b""), "v2.pdf", "application/pdf")
+
+    assert len(first_texts) == 2
+    assert embedding.texts == [t for t in [c[1] for c in fake_db.chunks] if t not in first_texts]
+    assert stats.cached_embeddings == 1
+    assert (stats.inserted_chunks, stats.deleted_chunks, stats.kept_chunks) == (1, 1, 1)
+    assert [c[1] for c in fake_db.inserted] == embedding.texts
+
+
+@pytest.mark.asyncio
+async def test_pipeline_holds_no_connection_while_processing(fake_db):
+    """OCR・ベクトル化を待つ間はDB接続を借りず、COPYと反映のときだけ短く借りる"""
+    open_during_ocr = []
+
+    class RecordingOCRService(FakeOCRService):
+        async def extract_pages(self, file, filename, content_type):
+            async for page in super().extract_pages(file, filename, content_type):
+                open_during_ocr.append(fake_db.open)
+                yield page
+
+    pipeline = IngestionPipeline(
+        RecordingOCRService(["微分 " * 100] * 5),
+        FakeLLMService(),
+        FakeEmbeddingService(),
+        chunk_size=50,
+        chunk_overlap=10,
+        queue_size=1,
+        embed_batch_size=2,
+        use_embedding_cache=False
+    )
+
+    await pipeline.run(11, io.BytesIO(b""), "calc.pdf", "application/pdf")
+
+    assert open_during_ocr == [0] * 5
+    assert fake_db.max_open == 1
+    assert fake_db.status[11] == ("completed", None)
+
+
+@pytest.mark.asyncio
+async def test_embedding_cache_never_needs_a_second_connection(fake_db):
+    """キャッシュ照会と登録が同じ取り込み内で接続を取り合わない（プール枯渇時のデッドロック防止）"""
+    pipeline = IngestionPipeline(
+        FakeOCRService(["積分 " * 100] * 4),
+        FakeLLMService(),
+        FakeEmbeddingService(),
+        chunk_size=50,
+        chunk_overlap=10,
+        queue_size=1,
+        embed_batch_size=2
+    )
+
+    await pipeline.run(12, io.BytesIO(b""), "calc.pdf", "application/pdf")
+
+    assert fake_db.cache
+    assert fake_db.max_open == 1
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_staged_while_ocr_is_still_running(fake_db):
+    """ベクトル化済みのチャンクはOCRの完了を待たずに受け皿へCOPYする"""
+    staged_before_last_page = []
+
+    class RecordingOCRService(FakeOCRService):
+        async def extract_pages(self, file, filename, content_type):
+            pages = [page async for page in super().extract_pages(file, filename, content_type)]
+            for page in pages[:-1]:
+                yield page
+            # 下流が進むのを待ってから最後のページを返す
+            for _ in range(50):
+                await asyncio.sleep(0)
+            staged_before_last_page.append(sum(len(rows) for rows in fake_db.staged.values()))
+            yield pages[-1]
+
+    pipeline = IngestionPipeline(
+        RecordingOCRService(["微分 " * 100] * 6),
+        FakeLLMService(),
+        FakeEmbeddingService(),
+        chunk_size=50,
+        chunk_overlap=10,
+        queue_size=2,
+        embed_batch_size=4,
+        copy_batch_size=4,
+        use_embedding_cache=False
+    )
+
+    stats = await pipeline.run(14, io.BytesIO(b""), "calc.pdf", "application/pdf")
+
+    assert staged_before_last_page[0] > 0
+    assert len(fake_db.copies) > 1
+    assert stats.chunks == sum(fake_db.copies)
+    assert fake_db.staged == {}
+
+
+@pytest.mark.asyncio
+async def test_document_is_claimed_while_ingesting(tmp_path):
+    """取り込み中の資料は予約済みで、終了すると再び取り込める"""
+    release = asyncio.Event()
+
+    class BlockingPipeline:
+        async def run(self, document_id, file, filename, content_type):
+            await release.wait()
+
+    path = tmp_path / "a.png"
+    path.write_bytes(b"")
+    task = ingestion.start_ingestion(BlockingPipeline(), 13, str(path), "a.png", "image/png")
+    await asyncio.sleep(0)
+
+    assert not ingestion.claim_document(13)
+
+    release.set()
+    await task
+    assert ingestion.claim_document(13)
+    ingestion.release_document(13)
@@ -0,0 +1,127 @@
+"""取り込みジョブワーカーのテスト"""
+from contextlib import asynccontextmanager
+import pytest
+from app.services import ingestion_worker
+from app.services.ingestion_worker import IngestionWorker, retry_delay
+
+
+def test_retry_delay_backs_off_exponentially():
+    assert [retry_delay(n, 10, 60) for n in (1, 2, 3, 4)] == [10, 20, 40, 60]
+
+
+class FakeJobStore:
+    """ジョブと資料の状態をメモリで持つ"""
+
+    def __init__(self, job, path):
+        self.job = job
+        self.document = {
+            "id": job["document_id"],
+            "filename": "calc.pdf",
+            "original_path": path,
+            "mime_type": "application/pdf",
+        }
+        self.events = []
+
+    def job_repo(self, conn):
+        store = self
+
+        class Repo:
+            async def fail_expired(self):
+                return []
+
+            async def claim(self, worker_id, lease_seconds):
+                job, store.job = store.job, None
+                return job
+
+            async def heartbeat(self, job_id, worker_id, lease_seconds):
+                return True
+
+            async def complete(self, job_id, worker_id):
+                store.events.append(("complete", job_id))
+                return True
+
+            async def fail(self, job_id, worker_id, error_message, retry_delay_seconds):
+                store.events.append(("fail", job_id, error_message))
+                return "failed" if store.final else "queued"
+
+        return Repo()
+
+    def document_repo(self, conn):
+        store = self
+
+        class Repo:
+            async def get_by_id(self, document_id):
+                return store.document
+
+            async def update_status(self, document_id, status, error_message=None):
+                store.events.append(("document", status))
+                return True
+
+        return Repo()
+
+
+class FakePipeline:
+    def __init__(self, error=None):
+        self.error = error
+        self.ran = []
+        self.failed = []
+
+    async def run(self, document_id, file, filename, content_type):
+        self.ran.append(document_id)
+        if self.error:
+            raise self.error
+
+    async def mark_failed(self, document_id, error):
+        self.failed.append(document_id)
+
+
+@pytest.fixture
+def make_store(monkeypatch, tmp_path):
+    path = tmp_path / "calc.pdf"
+    path.write_bytes(b"%PDF")
+
+    @asynccontextmanager
+    async def fake_db_connection():
+        yield None
+
+    def make(final=False):
+        store = FakeJobStore(
+            {"id": 1, "document_id": 5, "attempts": 1, "max_attempts": 3},
+            str(path)
+        )
+        store.final = final
+        monkeypatch.setattr(ingestion_worker, "get_db_connection", fake_db_connection)
+        monkeypatch.setattr(ingestion_worker, "JobRepository", store.job_repo)
+        monkeypatch.setattr(ingestion_worker, "DocumentRepository", store.document_repo)
+        return store
+
+    return make
+
+
+@pytest.mark.asyncio
+async def test_run_once_completes_job(make_store):
+    store = make_store()
+    pipeline = FakePipeline()
+    worker = IngestionWorker(pipeline, concurrency=1, worker_id="w1")
+
+    assert await worker.run_once()
+    assert pipeline.ran == [5]
+    assert store.events == [("complete", 1)]
+    # キューが空なら何もしない
+    assert not await worker.run_once()
+
+
+@pytest.mark.asyncio
+async def test_failure_is_retried_before_marking_document_failed(make_store):
+    """再試行が残っていれば資料は processing のまま、使い切ったら failed"""
+    store = make_store(final=False)
+    pipeline = FakePipeline(error=ValueError("OCR down"))
+    worker = IngestionWorker(pipeline, concurrency=1, worker_id="w1")
+
+    assert await worker.run_once()
+    assert store.events == [("fail", 1, "OCR down")]
+    assert pipeline.failed == []
+
+    store = make_store(final=True)
+    assert await worker.run_once()
+    assert pipeline.failed == [5]
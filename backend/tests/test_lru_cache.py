@@ -0,0 +1,42 @@
+"""LRUキャッシュとOCR結果キャッシュのテスト"""
+import io
+import pytest
+from app.utils.lru_cache import LRUCache
+from app.services.ocr_service import OCRService
+
+
+def test_lru_evicts_by_entries_and_bytes():
+    """件数・バイト数のどちらかを超えたら古い順に破棄"""
+    cache = LRUCache(max_entries=3, max_bytes=10, sizeof=len)
+    cache.put("a", "1234")
+    cache.put("b", "1234")
+    assert cache.get("a") == "1234"  # aを最近使用に
+    cache.put("c", "1234")  # 12バイト > 10 なのでbを破棄
+
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+    assert cache.total_bytes == 8
+    assert cache.stats()["hits"] == 1
+
+    cache.put("big", "x" * 11)  # 単体で上限超過は登録しない
+    assert "big" not in cache
+
+
+@pytest.mark.asyncio
+async def test_ocr_service_caches_by_image_hash(monkeypatch):
+    """同一画像はOCRサービスを再度呼ばない"""
+    calls = []
+
+    async def fake_request(image, filename, content_type):
+        calls.append(image if isinstance(image, bytes) else image.read())
+        return "# OCR抽出結果"
+
+    service = OCRService(cache=LRUCache(max_entries=10))
+    monkeypatch.setattr(service, "_request_ocr", fake_request)
+
+    assert await service.extract_text(b"image") == "# OCR抽出結果"
+    # ファイルオブジェクトでも同じ内容ならヒット
+    assert await service.extract_text(io.BytesIO(b"image")) == "# OCR抽出結果"
+    await service.extract_text(io.BytesIO(b"other"), "other.jpg", "image/jpeg")
+
+    assert calls == [b"image", b"other"]
@@ -0,0 +1,112 @@
+"""ONNX埋め込みバックエンドのテスト"""
+import threading
+import numpy as np
+import pytest
+from app.services import onnx_embedding
+from app.services.onnx_embedding import (
+    OnnxEmbeddingBackend,
+    export_onnx,
+    mean_pool_normalize,
+    verify_against_reference,
+)
+
+
+def test_mean_pool_ignores_padding_and_normalizes():
+    """パディング位置は平均に含めず、結果は単位ベクトルになる"""
+    hidden = np.array([
+        [[3.0, 4.0], [100.0, 100.0]],
+        [[1.0, 0.0], [0.0, 1.0]],
+    ], dtype=np.float32)
+    mask = np.array([[1, 0], [1, 1]])
+
+    pooled = mean_pool_normalize(hidden, mask)
+
+    assert pooled.dtype == np.float32
+    np.testing.assert_allclose(pooled[0], [0.6, 0.8], rtol=1e-6)
+    np.testing.assert_allclose(pooled[1], [2 ** -0.5, 2 ** -0.5], rtol=1e-6)
+
+
+def test_load_fails_fast_when_model_is_not_exported(tmp_path):
+    """未エクスポートなら実行時にエクスポートせず、手順を示して失敗する"""
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("transformers")
+    backend = OnnxEmbeddingBackend("fake", quantize=True, model_dir=str(tmp_path))
+
+    with pytest.raises(FileNotFoundError, match="--quantize"):
+        backend.load()
+    assert not list(tmp_path.iterdir())
+
+
+def test_concurrent_load_creates_one_session(tmp_path, monkeypatch):
+    """複数スレッドから同時に呼ばれてもロードは1回だけ"""
+    backend = OnnxEmbeddingBackend("fake", model_dir=str(tmp_path))
+    loads = []
+    barrier = threading.Barrier(4)
+
+    def slow_load():
+        loads.append(threading.get_ident())
+        threading.Event().wait(0.05)
+        backend._session = object()
+
+    monkeypatch.setattr(backend, "_load", slow_load)
+
+    def worker():
+        barrier.wait()
+        backend.load()
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+
+
+@pytest.fixture(scope="module")
+def tiny_model_dir(tmp_path_factory):
+    """ネットワーク不要の小さなBERTモデル（ランダム重み）"""
+    pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+
+    model_dir = tmp_path_factory.mktemp("tiny-bert")
+    vocab = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "query", "passage", ":"]
+    vocab += list("abcdefghijklmnopqrstuvwxyz") + ["運", "動", "方", "程", "式"]
+    vocab_file = model_dir / "vocab.txt"
+    vocab_file.write_text("\n".join(vocab) + "\n", encoding="utf-8")
+
+    config = transformers.BertConfig(
+        vocab_size=len(vocab),
+        hidden_size=32,
+        num_hidden_layers=2,
+        num_attention_heads=2,
+        intermediate_size=64,
+        max_position_embeddings=64,
+    )
+    transformers.BertModel(config).save_pretrained(model_dir)
+    transformers.BertTokenizer(str(vocab_file)).save_pretrained(model_dir)
+    return str(model_dir)
+
+
+@pytest.mark.parametrize("quantize", [False, True])
+def test_matches_sentence_transformers(tiny_model_dir, tmp_path, monkeypatch, quantize):
+    """エクスポートしたONNXモデルは参照モデルと許容範囲内で一致する"""
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("sentence_transformers")
+    monkeypatch.setattr(onnx_embedding.settings, "embedding_max_seq_length", 64)
+
+    output_dir = str(tmp_path / "onnx")
+    path = export_onnx(tiny_model_dir, output_dir, quantize=quantize)
+    # 一時ファイルは残らない
+    assert not [name for name in tmp_path.joinpath("onnx").iterdir() if name.suffix == ".tmp"]
+
+    backend = OnnxEmbeddingBackend(tiny_model_dir, quantize=quantize, model_dir=output_dir)
+    texts = ["query: abc", "passage: 運動方程式 the quick brown fox", "query: z"]
+    vectors = backend.encode_sync(texts, batch_size=2)
+
+    assert path.endswith("model.int8.onnx" if quantize else "model.onnx")
+    assert vectors.shape == (3, 32) and vectors.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(vectors, axis=1), 1.0, rtol=1e-5)
+
+    tolerance = 0.02 if quantize else 1e-4
+    assert verify_against_reference(backend, texts, tolerance=tolerance) >= 1.0 - tolerance
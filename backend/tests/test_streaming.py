@@ -0,0 +1,128 @@
+"""ストリーミング解答エンドポイントのテスト"""
+import asyncio
+import json
+from contextlib import asynccontextmanager
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from app.api.routes import ask_problem
+from app.services import llm_service
+from app.services.llm_service import LLMService
+from app.models.schemas import ReferencedDocument
+
+client = TestClient(app)
+
+
+class FakeRAGService:
+    """検索とトークン生成を固定値で返すRAGサービス"""
+
+    async def retrieve(self, conn, question, use_rag=True, subject_filter=None):
+        docs = [
+            ReferencedDocument(
+                document_id=1,
+                filename="calc.pdf",
+                subject="数学",
+                chunk_content="..."
+            )
+        ]
+        return [{"document_id": 1}], docs
+
+    async def stream_answer(self, question, chunks):
+        for token in ["答え", "は", "$x=1$"]:
+            yield token
+
+
+class FakeConversationLogger:
+    """書き込み待ちの内容を記録する会話ロガー"""
+
+    def __init__(self):
+        self.saved = []
+
+    def log(self, **kwargs):
+        self.saved.append(kwargs)
+        return True
+
+
+@asynccontextmanager
+async def fake_db_connection():
+    yield None
+
+
+def test_ask_problem_text_stream(monkeypatch):
+    """参照資料→トークン→完了の順でNDJSONが返り、完了後に会話が書き込み待ちに積まれる"""
+    monkeypatch.setattr(
+        ask_problem, "get_services",
+        lambda: (None, None, None, FakeRAGService())
+    )
+    monkeypatch.setattr(ask_problem, "get_db_connection", fake_db_connection)
+    conversation_logger = FakeConversationLogger()
+    monkeypatch.setattr(ask_problem, "get_conversation_logger", lambda: conversation_logger)
+
+    response = client.post(
+        "/api/ask_problem_text/stream",
+        json={"question": "xを求めよ", "session_id": "s-1"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    events = [json.loads(line) for line in response.text.splitlines() if line]
+    assert events[0]["type"] == "referenced_documents"
+    assert events[0]["referenced_documents"][0]["filename"] == "calc.pdf"
+    assert [e["content"] for e in events if e["type"] == "token"] == ["答え", "は", "$x=1$"]
+    assert events[-1]["type"] == "done"
+
+    assert conversation_logger.saved[0]["answer"] == "答えは$x=1$"
+    assert conversation_logger.saved[0]["session_id"] == "s-1"
+
+
+def test_stream_ends_with_error_event_on_unexpected_failure(monkeypatch):
+    """生成途中の想定外の例外でも error イベントで終わり、会話は保存しない"""
+
+    class BrokenRAGService(FakeRAGService):
+        async def stream_answer(self, question, chunks):
+            yield "答え"
+            raise RuntimeError("connection reset")
+
+    monkeypatch.setattr(
+        ask_problem, "get_services",
+        lambda: (None, None, None, BrokenRAGService())
+    )
+    monkeypatch.setattr(ask_problem, "get_db_connection", fake_db_connection)
+    conversation_logger = FakeConversationLogger()
+    monkeypatch.setattr(ask_problem, "get_conversation_logger", lambda: conversation_logger)
+
+    response = client.post("/api/ask_problem_text/stream", json={"question": "xを求めよ"})
+
+    events = [json.loads(line) for line in response.text.splitlines() if line]
+    assert [e["type"] for e in events] == ["referenced_documents", "token", "error"]
+    assert conversation_logger.saved == []
+
+
+def test_generate_stream_wraps_malformed_lines(monkeypatch):
+    """Ollamaの壊れた行は ValueError として呼び出し元に伝える"""
+    class FakeResponse:
+        status = 200
+
+        def __init__(self):
+            async def lines():
+                yield b'{"response": "a"}\n'
+                yield b'{"response": \n'
+            self.content = lines()
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc):
+            return False
+
+    class FakeSession:
+        def post(self, *args, **kwargs):
+            return FakeResponse()
+
+    monkeypatch.setattr(llm_service, "get_http_session", lambda upstream: FakeSession())
+
+    async def consume():
+        return [token async for token in LLMService().generate_stream("q")]
+
+    with pytest.raises(ValueError):
+        asyncio.run(consume())
@@ -0,0 +1,37 @@
+"""起動時ウォームアップのテスト"""
+import pytest
+from app.services import warmup
+
+
+class FakeService:
+    """呼び出しを記録するサービス"""
+
+    def __init__(self, result=True):
+        self.result = result
+        self.called = False
+
+    async def _call(self):
+        self.called = True
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+    warm_up = preload = health_check = _call
+
+
+@pytest.mark.asyncio
+async def test_warm_up_marks_ready_and_records_results(monkeypatch):
+    """全コンポーネントを温め、失敗があっても完了後はレディにする"""
+    monkeypatch.setattr(warmup, "_ready", False)
+    monkeypatch.setattr(warmup, "_results", {})
+
+    ocr = FakeService(result=False)
+    llm = FakeService(result=RuntimeError("ollama down"))
+    embedding = FakeService()
+
+    assert not warmup.is_ready()
+    results = await warmup.warm_up_services(ocr, llm, embedding)
+
+    assert warmup.is_ready()
+    assert all(s.called for s in (ocr, llm, embedding))
+    assert results == {"embedding": "ok", "ollama": "error", "ocr": "error"}
@@ -0,0 +1,47 @@
+"""hight-agent-ai 取り込みワーカー
+
+ingestion_jobs テーブルのジョブを処理する。取り込み能力を増やすには
+このプロセスを（別ホストでも）追加で起動する
+
+    python worker.py
+"""
+import asyncio
+import signal
+
+from app.db import init_db, close_db
+from app.services import (
+    OCRService,
+    LLMService,
+    EmbeddingService,
+    IngestionPipeline,
+    IngestionWorker,
+    init_http_clients,
+    close_http_clients
+)
+from app.utils.logger import setup_logger
+
+# ロガー設定
+logger = setup_logger()
+
+
+async def main() -> None:
+    """ワーカーを起動し、SIGTERM / SIGINT で取得を止めて終了"""
+    await init_db()
+    await init_http_clients()
+
+    pipeline = IngestionPipeline(OCRService(), LLMService(), EmbeddingService())
+    worker = IngestionWorker(pipeline)
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+
+    try:
+        await worker.run()
+    finally:
+        await close_http_clients()
+        await close_db()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
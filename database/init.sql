@@ -31,6 +31,8 @@ CREATE TABLE IF NOT EXISTS chunks (
     chunk_index INTEGER NOT NULL,          -- チャンク順序
     embedding VECTOR(1024) NOT NULL,       -- multilingual-e5-large (1024次元)
     metadata JSONB,                        -- 追加情報（ページ番号など）
+    subject TEXT,                          -- documents.subject の複製（絞り込み検索用）
+    status TEXT NOT NULL DEFAULT 'processing',  -- documents.status の複製
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -39,9 +41,61 @@ CREATE INDEX IF NOT EXISTS idx_chunks_document_id ON chunks(document_id);
 CREATE INDEX IF NOT EXISTS idx_chunks_chunk_index ON chunks(document_id, chunk_index);
 
 -- ベクトル類似度検索用インデックス（HNSW）
-CREATE INDEX IF NOT EXISTS idx_chunks_embedding ON chunks 
-USING hnsw (embedding vector_cosine_ops) 
-WITH (m = 16, ef_construction = 64);
+-- float32のまま索引せず、halfvec（float16）にした式で索引してサイズを半分にする。
+-- 検索は候補をこの索引で取り、テーブルのfloat32ベクトルで並べ直す（VECTOR_INDEX_MODE=halfvec）
+-- 式は ChunkRepository の候補検索の距離式と一致させること
+-- 検索対象は completed の資料のチャンクのみのため、部分インデックスにする
+CREATE INDEX IF NOT EXISTS idx_chunks_embedding_halfvec ON chunks
+USING hnsw ((embedding::halfvec(1024)) halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE status = 'completed';
+
+-- 科目ごとの部分インデックス（科目で絞り込んでも top_k 件が索引から直接取れる）
+-- 科目は LLMService.classify_subject の科目リストと一致させること。
+-- リスト外の科目は上の索引と反復スキャン（VECTOR_ITERATIVE_SCAN）で検索する
+DO $$
+DECLARE
+    subjects TEXT[] := ARRAY[
+        '数学', '物理(力学)', '物理(電磁気)', '物理(熱力学)', '物理(量子力学)',
+        '化学', '生物学', '情報科学', '工学', 'その他'
+    ];
+    i INTEGER;
+BEGIN
+    FOR i IN 1 .. array_length(subjects, 1) LOOP
+        EXECUTE format(
+            'CREATE INDEX IF NOT EXISTS %I ON chunks '
+            'USING hnsw ((embedding::halfvec(1024)) halfvec_cosine_ops) '
+            'WITH (m = 16, ef_construction = 64) '
+            'WHERE status = %L AND subject = %L',
+            'idx_chunks_embedding_subject_' || i, 'completed', subjects[i]
+        );
+    END LOOP;
+END $$;
+
+-- 埋め込みキャッシュ（sha256(モデル名, 実行方式, プレフィックス付きチャンク本文) → ベクトル）
+-- 再取り込み時に同じ本文のチャンクを再計算しないために使う
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    key BYTEA PRIMARY KEY,
+    model TEXT NOT NULL,
+    embedding VECTOR(1024) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 取り込み中のチャンクの受け皿（取り込みごとのrun_idで区別）
+-- ベクトル化済みのバッチを届いた順にCOPYし、最後のトランザクションでchunksへ差分を反映して削除する。
+-- 再作成できる途中データのためWALを書かない（UNLOGGED）
+CREATE UNLOGGED TABLE IF NOT EXISTS chunk_ingest_staging (
+    run_id UUID NOT NULL,
+    document_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    embedding VECTOR(1024) NOT NULL,
+    metadata JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_chunk_ingest_staging_run_id ON chunk_ingest_staging(run_id);
+CREATE INDEX IF NOT EXISTS idx_chunk_ingest_staging_created_at ON chunk_ingest_staging(created_at);
 
 -- 会話履歴テーブル
 CREATE TABLE IF NOT EXISTS conversations (
@@ -59,6 +113,27 @@ CREATE TABLE IF NOT EXISTS conversations (
 CREATE INDEX IF NOT EXISTS idx_conversations_session_id ON conversations(session_id);
 CREATE INDEX IF NOT EXISTS idx_conversations_created_at ON conversations(created_at DESC);
 
+-- 資料取り込みジョブテーブル（ワーカーが FOR UPDATE SKIP LOCKED で取得）
+CREATE TABLE IF NOT EXISTS ingestion_jobs (
+    id SERIAL PRIMARY KEY,
+    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    status TEXT NOT NULL DEFAULT 'queued', -- queued | running | completed | failed
+    attempts INTEGER NOT NULL DEFAULT 0,   -- 取得された回数
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, -- 再試行の待ち合わせ
+    locked_by TEXT,                        -- 実行中のワーカーID
+    lease_expires_at TIMESTAMP,            -- 期限切れなら他のワーカーが取り直す
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_queued ON ingestion_jobs(run_after, id)
+WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_running ON ingestion_jobs(lease_expires_at)
+WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_document_id ON ingestion_jobs(document_id);
+
 -- updated_at自動更新用トリガー
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -0,0 +1,23 @@
+-- 既存データベースへの取り込みジョブテーブル追加
+-- 実行例: psql "$DATABASE_URL" -f database/migrations/001_ingestion_jobs.sql
+
+-- 資料取り込みジョブテーブル（ワーカーが FOR UPDATE SKIP LOCKED で取得）
+CREATE TABLE IF NOT EXISTS ingestion_jobs (
+    id SERIAL PRIMARY KEY,
+    document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    status TEXT NOT NULL DEFAULT 'queued', -- queued | running | completed | failed
+    attempts INTEGER NOT NULL DEFAULT 0,   -- 取得された回数
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP, -- 再試行の待ち合わせ
+    locked_by TEXT,                        -- 実行中のワーカーID
+    lease_expires_at TIMESTAMP,            -- 期限切れなら他のワーカーが取り直す
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_queued ON ingestion_jobs(run_after, id)
+WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_running ON ingestion_jobs(lease_expires_at)
+WHERE status = 'running';
+CREATE INDEX IF NOT EXISTS idx_ingestion_jobs_document_id ON ingestion_jobs(document_id);
@@ -0,0 +1,11 @@
+-- 既存データベースへの埋め込みキャッシュテーブル追加
+-- 実行例: psql "$DATABASE_URL" -f database/migrations/002_embedding_cache.sql
+
+-- 埋め込みキャッシュ（sha256(モデル名, 実行方式, プレフィックス付きチャンク本文) → ベクトル）
+-- 再取り込み時に同じ本文のチャンクを再計算しないために使う
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    key BYTEA PRIMARY KEY,
+    model TEXT NOT NULL,
+    embedding VECTOR(1024) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,12 @@
+-- 既存データベースのベクトル索引を halfvec（float16）の式インデックスに置き換える
+-- 索引サイズが約半分になる。検索は VECTOR_INDEX_MODE=halfvec（デフォルト）で
+-- この索引から候補を取り、float32ベクトルで並べ直す
+-- CONCURRENTLY を使うためトランザクション外で実行する:
+--   psql "$DATABASE_URL" -f database/migrations/003_halfvec_index.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_embedding_halfvec ON chunks
+USING hnsw ((embedding::halfvec(1024)) halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64);
+
+-- 新しい索引の作成後にfloat32の索引を削除（float32の索引で検索するモードはない）
+DROP INDEX CONCURRENTLY IF EXISTS idx_chunks_embedding;
@@ -0,0 +1,9 @@
+-- （任意）2値量子化＋ハミング距離の式インデックスを追加
+-- 索引サイズは float32 の約1/32。VECTOR_INDEX_MODE=bit で候補検索に使い、
+-- VECTOR_RERANK_FACTOR 倍の候補をfloat32ベクトルで並べ直す
+-- （2値化は精度が落ちるため、倍率は halfvec より大きめ（10程度）を推奨）
+--   psql "$DATABASE_URL" -f database/migrations/004_bit_index.sql
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_embedding_bit ON chunks
+USING hnsw ((binary_quantize(embedding)::bit(1024)) bit_hamming_ops)
+WITH (m = 16, ef_construction = 64);
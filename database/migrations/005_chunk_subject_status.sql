@@ -0,0 +1,73 @@
+-- 資料の科目・ステータスを chunks に複製し、絞り込み検索を部分インデックスで行う
+-- 以降は DocumentRepository.update_status / update_subject がチャンク側も更新する。
+-- CONCURRENTLY を使うためトランザクション外で実行する:
+--   psql "$DATABASE_URL" -f database/migrations/005_chunk_subject_status.sql
+
+ALTER TABLE chunks ADD COLUMN IF NOT EXISTS subject TEXT;
+ALTER TABLE chunks ADD COLUMN IF NOT EXISTS status TEXT NOT NULL DEFAULT 'processing';
+
+-- 全行の更新で索引項目を作り直さないよう、先に全件のベクトル索引を削除する
+-- （削除から部分インデックスの作成完了までは索引なしの検索になる）
+DROP INDEX CONCURRENTLY IF EXISTS idx_chunks_embedding_halfvec;
+
+UPDATE chunks c
+SET subject = d.subject, status = d.status
+FROM documents d
+WHERE d.id = c.document_id;
+
+-- completed のチャンクのみの索引
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_embedding_halfvec ON chunks
+USING hnsw ((embedding::halfvec(1024)) halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE status = 'completed';
+
+-- 科目ごとの部分インデックス（LLMService.classify_subject の科目リスト）
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_embedding_subject_1 ON chunks
+USING hnsw ((embedding::halfvec(1024)) halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE status = 'completed' AND subject = '数学';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_embedding_subject_2 ON chunks
+USING hnsw ((embedding::halfvec(1024)) halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE status = 'completed' AND subject = '物理(力学)';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_embedding_subject_3 ON chunks
+USING hnsw ((embedding::halfvec(1024)) halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE status = 'completed' AND subject = '物理(電磁気)';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_embedding_subject_4 ON chunks
+USING hnsw ((embedding::halfvec(1024)) halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE status = 'completed' AND subject = '物理(熱力学)';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_embedding_subject_5 ON chunks
+USING hnsw ((embedding::halfvec(1024)) halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE status = 'completed' AND subject = '物理(量子力学)';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_embedding_subject_6 ON chunks
+USING hnsw ((embedding::halfvec(1024)) halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE status = 'completed' AND subject = '化学';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_embedding_subject_7 ON chunks
+USING hnsw ((embedding::halfvec(1024)) halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE status = 'completed' AND subject = '生物学';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_embedding_subject_8 ON chunks
+USING hnsw ((embedding::halfvec(1024)) halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE status = 'completed' AND subject = '情報科学';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_embedding_subject_9 ON chunks
+USING hnsw ((embedding::halfvec(1024)) halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE status = 'completed' AND subject = '工学';
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chunks_embedding_subject_10 ON chunks
+USING hnsw ((embedding::halfvec(1024)) halfvec_cosine_ops)
+WITH (m = 16, ef_construction = 64)
+WHERE status = 'completed' AND subject = 'その他';
@@ -0,0 +1,18 @@
+-- 既存データベースへの取り込み用受け皿テーブル追加
+-- 実行例: psql "$DATABASE_URL" -f database/migrations/006_chunk_ingest_staging.sql
+
+-- 取り込み中のチャンクの受け皿（取り込みごとのrun_idで区別）
+-- ベクトル化済みのバッチを届いた順にCOPYし、最後のトランザクションでchunksへ差分を反映して削除する。
+-- 再作成できる途中データのためWALを書かない（UNLOGGED）
+CREATE UNLOGGED TABLE IF NOT EXISTS chunk_ingest_staging (
+    run_id UUID NOT NULL,
+    document_id INTEGER NOT NULL,
+    content TEXT NOT NULL,
+    chunk_index INTEGER NOT NULL,
+    embedding VECTOR(1024) NOT NULL,
+    metadata JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_chunk_ingest_staging_run_id ON chunk_ingest_staging(run_id);
+CREATE INDEX IF NOT EXISTS idx_chunk_ingest_staging_created_at ON chunk_ingest_staging(created_at);
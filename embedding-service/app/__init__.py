@@ -0,0 +1 @@
+"""埋め込みワーカーアプリケーション"""
@@ -0,0 +1,102 @@
+"""動的バッチ処理モジュール
+
+複数リクエストから届いたテキストを短い待ち時間で集め、1回のencodeで処理する
+"""
+import asyncio
+from typing import List, Optional, Tuple
+import numpy as np
+
+
+class DynamicBatcher:
+    """encode要求をまとめて実行するバッチャー"""
+
+    def __init__(
+        self,
+        encode_fn,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5.0
+    ):
+        """
+        Args:
+            encode_fn: テキストのリストを(件数, 次元)のfloat32配列に変換する同期関数
+            max_batch_size: 1回のencodeで処理する最大件数
+            max_wait_ms: 最初の要求からバッチを締め切るまでの待ち時間
+        """
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue: Optional["asyncio.Queue[Tuple[List[str], asyncio.Future]]"] = None
+        self._task: Optional[asyncio.Task] = None
+        self.batches = 0
+        self.texts = 0
+
+    def start(self) -> None:
+        """バッチ処理ループを開始"""
+        if self._task is None:
+            # キューは実行中のイベントループに結び付くため、開始時に作る
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """バッチ処理ループを停止"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def encode(self, texts: List[str]) -> np.ndarray:
+        """テキストをバッチに積み、結果を待つ"""
+        if self._queue is None:
+            raise RuntimeError("DynamicBatcher is not started")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((texts, future))
+        return await future
+
+    async def _run(self) -> None:
+        """要求を集めてencodeするループ"""
+        loop = asyncio.get_running_loop()
+        while True:
+            requests = [await self._queue.get()]
+            size = len(requests[0][0])
+            deadline = loop.time() + self.max_wait_ms / 1000
+
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    request = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                requests.append(request)
+                size += len(request[0])
+
+            await self._process(requests)
+
+    async def _process(self, requests: List[Tuple[List[str], asyncio.Future]]) -> None:
+        """まとめたテキストをencodeし、要求ごとに結果を切り分ける"""
+        texts = [text for request_texts, _ in requests for text in request_texts]
+
+        try:
+            # モデル推論はスレッドで実行し、イベントループを塞がない
+            embeddings = await asyncio.get_running_loop().run_in_executor(
+                None, self.encode_fn, texts
+            )
+        except Exception as e:
+            for _, future in requests:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.batches += 1
+        self.texts += len(texts)
+
+        offset = 0
+        for request_texts, future in requests:
+            count = len(request_texts)
+            if not future.done():
+                future.set_result(embeddings[offset:offset + count])
+            offset += count
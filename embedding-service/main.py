@@ -0,0 +1,120 @@
+"""hight-agent-ai 埋め込みワーカー
+
+multilingual-e5-large をホストごとに1つだけ読み込み、
+複数のバックエンドワーカーから共有する埋め込みサービス
+"""
+import os
+from contextlib import asynccontextmanager
+from typing import List, Optional
+import numpy as np
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response
+from pydantic import BaseModel, Field
+from sentence_transformers import SentenceTransformer
+
+from app.batcher import DynamicBatcher
+
+MODEL_NAME = os.getenv("EMBEDDING_MODEL", "intfloat/multilingual-e5-large")
+MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64"))
+MAX_WAIT_MS = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+MAX_TEXTS_PER_REQUEST = int(os.getenv("EMBEDDING_MAX_TEXTS_PER_REQUEST", "256"))
+# 計算方式（バックエンドの永続埋め込みキャッシュのキーに使われる）
+BACKEND_ID = "sentence-transformers"
+
+# 起動時（lifespan）に読み込むモデル
+model: Optional[SentenceTransformer] = None
+
+
+def encode(texts: List[str]) -> np.ndarray:
+    """正規化済みfloat32ベクトルに変換"""
+    embeddings = model.encode(
+        texts,
+        normalize_embeddings=True,
+        batch_size=MAX_BATCH_SIZE,
+        show_progress_bar=False
+    )
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+batcher = DynamicBatcher(encode, max_batch_size=MAX_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """モデルの読み込みとバッチ処理ループの開始・停止"""
+    global model
+    if model is None:
+        model = SentenceTransformer(MODEL_NAME)
+    batcher.start()
+    yield
+    await batcher.stop()
+
+
+app = FastAPI(
+    title="hight-agent-ai Embedding Service",
+    description="テキストをベクトル化する埋め込みワーカー",
+    version="0.1.0",
+    lifespan=lifespan
+)
+
+
+class EmbedRequest(BaseModel):
+    """埋め込みリクエスト"""
+    texts: List[str] = Field(..., min_length=1, description="プレフィックス付きテキスト")
+    batch_size: int = Field(32, ge=1, description="クライアント側のバッチサイズ（参考値）")
+
+
+@app.post("/api/embed")
+async def embed(req: EmbedRequest, request: Request):
+    """テキストをベクトル化
+
+    Accept: application/octet-stream の場合はリトルエンディアンfloat32の
+    生バイト列（件数×次元）を返し、それ以外はJSONで返す
+    """
+    if len(req.texts) > MAX_TEXTS_PER_REQUEST:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many texts: {len(req.texts)} > {MAX_TEXTS_PER_REQUEST}"
+        )
+
+    embeddings = await batcher.encode(req.texts)
+    headers = {
+        "X-Embedding-Model": MODEL_NAME,
+        "X-Embedding-Backend": BACKEND_ID,
+        "X-Embedding-Shape": f"{embeddings.shape[0]},{embeddings.shape[1]}",
+    }
+
+    if "application/octet-stream" in request.headers.get("accept", ""):
+        return Response(
+            content=embeddings.astype("<f4").tobytes(),
+            media_type="application/octet-stream",
+            headers=headers
+        )
+
+    return {
+        "model": MODEL_NAME,
+        "backend": BACKEND_ID,
+        "dimension": int(embeddings.shape[1]),
+        "embeddings": embeddings.tolist()
+    }
+
+
+@app.get("/health")
+async def health_check():
+    """ヘルスチェック（モデルは起動時に読み込み済み）"""
+    return {
+        "status": "ok",
+        "model": MODEL_NAME,
+        "batches": batcher.batches,
+        "texts": batcher.texts
+    }
+
+
+@app.get("/")
+async def root():
+    """ルートエンドポイント"""
+    return {
+        "message": "hight-agent-ai Embedding Service",
+        "version": "0.1.0",
+        "docs": "/docs"
+    }
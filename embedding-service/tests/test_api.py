@@ -0,0 +1,52 @@
+"""埋め込みAPIのテスト"""
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+import main
+
+
+class FakeModel:
+    """テキストの長さを値に持つ3次元ベクトルを返すモデル"""
+
+    def encode(self, texts, **kwargs):
+        return np.array([[len(text), 0.5, -1.0] for text in texts], dtype=np.float64)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(main, "model", FakeModel())
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def test_binary_response_is_little_endian_float32(client):
+    """octet-stream では件数×次元のfloat32生バイト列を返す"""
+    response = client.post(
+        "/api/embed",
+        json={"texts": ["passage: a", "passage: bbb"]},
+        headers={"Accept": "application/octet-stream"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["X-Embedding-Shape"] == "2,3"
+    assert response.headers["X-Embedding-Model"] == main.MODEL_NAME
+    assert response.headers["X-Embedding-Backend"] == main.BACKEND_ID
+
+    vectors = np.frombuffer(response.content, dtype="<f4").reshape(2, -1)
+    assert vectors.dtype == np.float32
+    assert vectors.tolist() == [[10.0, 0.5, -1.0], [12.0, 0.5, -1.0]]
+
+
+def test_json_response(client):
+    """Accept未指定ではJSONで返す"""
+    response = client.post("/api/embed", json={"texts": ["query: x"]})
+
+    data = response.json()
+    assert data["dimension"] == 3
+    assert data["embeddings"] == [[8.0, 0.5, -1.0]]
+
+
+def test_too_many_texts_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(main, "MAX_TEXTS_PER_REQUEST", 1)
+    response = client.post("/api/embed", json={"texts": ["a", "b"]})
+    assert response.status_code == 413
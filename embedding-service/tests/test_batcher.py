@@ -0,0 +1,78 @@
+"""動的バッチ処理のテスト"""
+import asyncio
+import numpy as np
+import pytest
+from app.batcher import DynamicBatcher
+
+
+class RecordingEncoder:
+    """呼び出しごとのテキストを記録し、(件数, 2) の配列を返すencode関数"""
+
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[len(text), index] for index, text in enumerate(texts)], dtype=np.float32)
+
+
+@pytest.mark.asyncio
+async def test_flushes_when_batch_is_full():
+    """max_batch_size 件集まったら待ち時間を待たずにencodeする"""
+    encoder = RecordingEncoder()
+    batcher = DynamicBatcher(encoder, max_batch_size=4, max_wait_ms=10_000)
+    batcher.start()
+    try:
+        results = await asyncio.wait_for(
+            asyncio.gather(batcher.encode(["a", "bb"]), batcher.encode(["ccc", "d"])),
+            timeout=1.0
+        )
+    finally:
+        await batcher.stop()
+
+    assert encoder.calls == [["a", "bb", "ccc", "d"]]
+    # 要求ごとに自分の分だけを受け取る
+    assert results[0][:, 0].tolist() == [1, 2]
+    assert results[1][:, 0].tolist() == [3, 1]
+    assert (batcher.batches, batcher.texts) == (1, 4)
+
+
+@pytest.mark.asyncio
+async def test_flushes_after_wait_time():
+    """件数が揃わなくても max_wait_ms で締め切る"""
+    encoder = RecordingEncoder()
+    batcher = DynamicBatcher(encoder, max_batch_size=64, max_wait_ms=20)
+    batcher.start()
+    try:
+        first = await asyncio.wait_for(batcher.encode(["a"]), timeout=1.0)
+        second = await asyncio.wait_for(batcher.encode(["b"]), timeout=1.0)
+    finally:
+        await batcher.stop()
+
+    assert encoder.calls == [["a"], ["b"]]
+    assert first.shape == (1, 2) and second.shape == (1, 2)
+
+
+@pytest.mark.asyncio
+async def test_error_is_propagated_to_every_waiter():
+    """encodeの失敗はバッチ内のすべての要求に伝わり、ループは動き続ける"""
+    calls = []
+
+    def failing(texts):
+        calls.append(texts)
+        if len(calls) == 1:
+            raise RuntimeError("out of memory")
+        return np.zeros((len(texts), 2), dtype=np.float32)
+
+    batcher = DynamicBatcher(failing, max_batch_size=2, max_wait_ms=10_000)
+    batcher.start()
+    try:
+        results = await asyncio.gather(
+            batcher.encode(["a"]), batcher.encode(["b"]), return_exceptions=True
+        )
+        assert [type(r) for r in results] == [RuntimeError, RuntimeError]
+
+        after = await asyncio.wait_for(batcher.encode(["c", "d"]), timeout=1.0)
+        assert after.shape == (2, 2)
+    finally:
+        await batcher.stop()
@@ -0,0 +1,120 @@
+"""レイアウト解析モジュール
+
+二値マスクの射影を使った再帰的XYカットでテキスト領域を検出し、
+読み順（段組みは左から右、段内は上から下）に並べる
+"""
+from typing import List, Optional, Tuple
+import numpy as np
+
+# (left, top, right, bottom)
+Box = Tuple[int, int, int, int]
+
+
+def _runs(profile: np.ndarray) -> List[Tuple[int, int]]:
+    """射影プロファイルで値が正の連続区間 [start, end) を列挙"""
+    padded = np.concatenate(([0], (profile > 0).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(padded))
+    return [(int(start), int(end)) for start, end in zip(edges[::2], edges[1::2])]
+
+
+def _split(runs: List[Tuple[int, int]], min_gap: int) -> List[Tuple[int, int]]:
+    """間隔がmin_gap未満の区間を結合"""
+    merged: List[Tuple[int, int]] = []
+    for start, end in runs:
+        if merged and start - merged[-1][1] < min_gap:
+            merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def median_line_height(ink: np.ndarray) -> Optional[float]:
+    """行の高さの中央値"""
+    heights = [end - start for start, end in _runs(ink.sum(axis=1)) if end - start >= 3]
+    return float(np.median(heights)) if heights else None
+
+
+def _xy_cut(
+    ink: np.ndarray,
+    left: int,
+    top: int,
+    min_col_gap: int,
+    min_block_gap: int,
+    depth: int,
+    boxes: List[Box]
+) -> None:
+    """再帰的XYカット（段組み→ブロックの順に分割）"""
+    height, width = ink.shape
+
+    # 縦方向の空白で段組みを分割（左から右）
+    columns = _split(_runs(ink.sum(axis=0)), min_col_gap)
+    if len(columns) > 1 and depth > 0:
+        for start, end in columns:
+            _xy_cut(ink[:, start:end], left + start, top, min_col_gap, min_block_gap, depth - 1, boxes)
+        return
+
+    # 横方向の空白でブロックを分割（上から下）
+    blocks = _split(_runs(ink.sum(axis=1)), min_block_gap)
+    if len(blocks) > 1 and depth > 0:
+        for start, end in blocks:
+            _xy_cut(ink[start:end, :], left, top + start, min_col_gap, min_block_gap, depth - 1, boxes)
+        return
+
+    rows = np.flatnonzero(ink.any(axis=1))
+    cols = np.flatnonzero(ink.any(axis=0))
+    if rows.size and cols.size:
+        boxes.append((
+            left + int(cols[0]), top + int(rows[0]),
+            left + int(cols[-1]) + 1, top + int(rows[-1]) + 1
+        ))
+
+
+def _split_lines(ink: np.ndarray, box: Box, lines_per_region: int) -> List[Box]:
+    """行数の多いブロックを行境界でlines_per_region行ずつに分ける"""
+    left, top, right, bottom = box
+    lines = _runs(ink[top:bottom, left:right].sum(axis=1))
+    if len(lines) <= lines_per_region:
+        return [box]
+
+    regions = []
+    for i in range(0, len(lines), lines_per_region):
+        group = lines[i:i + lines_per_region]
+        regions.append((left, top + group[0][0], right, top + group[-1][1]))
+    return regions
+
+
+def detect_regions(
+    ink: np.ndarray,
+    lines_per_region: int = 8,
+    min_region_pixels: int = 16,
+    max_depth: int = 6
+) -> List[Box]:
+    """テキスト領域を読み順で検出
+
+    Args:
+        ink: 文字画素をTrueとする二値マスク
+        lines_per_region: 1領域あたりの最大行数（並列度を確保するため）
+        min_region_pixels: これより小さい領域はノイズとして捨てる
+        max_depth: XYカットの最大再帰深さ
+
+    Returns:
+        読み順に並んだ領域のリスト
+    """
+    line_height = median_line_height(ink)
+    if line_height is None:
+        return []
+
+    # 段間は行高さの2.5倍以上、ブロック間は1.2倍以上の空白とみなす
+    min_col_gap = max(8, int(line_height * 2.5))
+    min_block_gap = max(4, int(line_height * 1.2))
+
+    boxes: List[Box] = []
+    _xy_cut(ink, 0, 0, min_col_gap, min_block_gap, max_depth, boxes)
+
+    regions: List[Box] = []
+    for box in boxes:
+        left, top, right, bottom = box
+        if (right - left) * (bottom - top) < min_region_pixels:
+            continue
+        regions.extend(_split_lines(ink, box, lines_per_region))
+    return regions
@@ -0,0 +1,87 @@
+"""OCR結果キャッシュ
+
+画像バイト列のSHA-256で完全一致のみを引く。
+数値だけが違う問題用紙は縮小画像ではほぼ同じになり、近似一致では別の問題の
+OCR結果を返してしまうため、再エンコード・リサイズされた画像は別画像として扱う
+"""
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from .ocr_processor import OCRResult
+
+
+def image_digest(image_bytes: bytes) -> str:
+    """画像バイト列のSHA-256（大きな画像ではイベントループ外で呼ぶ）"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def _result_size(result: OCRResult) -> int:
+    """キャッシュ上のおおよそのバイト数"""
+    return len(result.markdown.encode("utf-8")) + len(result.lang)
+
+
+class OCRResultCache:
+    """件数・バイト数上限と有効期間付きLRUのOCR結果キャッシュ"""
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl_seconds: Optional[float] = None
+    ):
+        """
+        Args:
+            max_entries: 最大件数
+            max_bytes: OCR結果テキストの合計の最大バイト数
+            ttl_seconds: 有効期間（秒。Noneなら期限なし。OCR設定の変更を反映させる目安）
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # SHA-256 → (バイト数, OCR結果, 登録時刻)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: str) -> Optional[OCRResult]:
+        """キャッシュを検索（ミス時None）"""
+        entry = self._entries.get(digest)
+        if entry is not None and self.ttl_seconds is not None:
+            if time.monotonic() - entry[2] >= self.ttl_seconds:
+                del self._entries[digest]
+                self.total_bytes -= entry[0]
+                entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(digest)
+        return entry[1]
+
+    def store(self, digest: str, result: OCRResult) -> None:
+        """OCR結果を登録（上限超過時は最も古く使われたものを破棄）"""
+        size = _result_size(result)
+        if size > self.max_bytes:
+            return
+
+        old = self._entries.pop(digest, None)
+        if old is not None:
+            self.total_bytes -= old[0]
+        self._entries[digest] = (size, result, time.monotonic())
+        self.total_bytes += size
+
+        while len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes:
+            _, (evicted_size, _, _) = self._entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def stats(self) -> dict:
+        """統計情報"""
+        return {
+            "entries": len(self._entries),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
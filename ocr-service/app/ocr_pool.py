@@ -0,0 +1,216 @@
+"""OCRワーカープール
+
+Tesseractの実行をプロセスプールに逃がし、イベントループを塞がずに
+複数画像を並列処理する。待ち行列が上限に達した場合は受付を拒否する。
+ワーカープロセスが異常終了した場合はプールを作り直す
+"""
+import asyncio
+import math
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+
+from .ocr_processor import OCRProcessor, OCRResult
+from .preprocess import PreprocessOptions
+
+
+# ワーカープロセス内のOCRプロセッサ（initializerで生成）
+_processor: Optional[OCRProcessor] = None
+
+
+def _init_worker(processor_options: dict) -> None:
+    """ワーカープロセスの初期化（エンジンはプロセスごとに1つ保持）"""
+    global _processor
+    _processor = OCRProcessor(**processor_options)
+
+
+def _process_image(image_bytes: bytes) -> OCRResult:
+    """ワーカープロセスでOCRを実行"""
+    return _processor.process_image(image_bytes)
+
+
+def pdf_render_scale(width: float, height: float, dpi: int, max_pixels: int) -> float:
+    """ページのラスタライズ倍率（画素数が max_pixels を超えないようDPIを下げる）
+
+    Args:
+        width: ページ幅（pt）
+        height: ページ高さ（pt）
+        dpi: 指定DPI
+        max_pixels: 画素数の上限
+    """
+    scale = dpi / 72
+    area = width * height
+    if area > 0 and area * scale * scale > max_pixels:
+        scale = math.sqrt(max_pixels / area)
+    return scale
+
+
+def _process_pdf_page(pdf_path: str, page_index: int, dpi: int) -> OCRResult:
+    """ワーカープロセスでPDFの1ページをラスタライズしてOCR
+
+    ページ画像をプロセス間で受け渡さないよう、各ワーカーがPDFを直接開く。
+    巨大なページは画像と同じ画素数上限に収まるよう解像度を下げる
+    """
+    import pypdfium2 as pdfium
+
+    options = _processor.preprocess_options or PreprocessOptions()
+    try:
+        pdf = pdfium.PdfDocument(pdf_path)
+        try:
+            page = pdf[page_index]
+            width, height = page.get_size()
+            scale = pdf_render_scale(width, height, dpi, options.max_image_pixels)
+            image = page.render(scale=scale).to_pil()
+        finally:
+            pdf.close()
+    except Exception as e:
+        raise ValueError(f"PDF rasterization failed: {e}")
+
+    return _processor.process_pil_image(image)
+
+
+def count_pdf_pages(pdf_path: str) -> int:
+    """PDFのページ数を取得
+
+    Raises:
+        ValueError: PDFとして読めない場合
+    """
+    import pypdfium2 as pdfium
+
+    try:
+        pdf = pdfium.PdfDocument(pdf_path)
+    except Exception as e:
+        raise ValueError(f"Invalid PDF: {e}")
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+class PoolBusyError(Exception):
+    """待ち行列が満杯で受け付けられない"""
+
+
+class WorkerCrashedError(PoolBusyError):
+    """ワーカープロセスが異常終了した（プールは作り直すため再試行できる）"""
+
+
+class OCRWorkerPool:
+    """待ち行列上限付きのOCRプロセスプール"""
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        processor_options: Optional[dict] = None
+    ):
+        """
+        Args:
+            workers: ワーカープロセス数（デフォルト: CPUコア数）
+            max_queue: 実行待ちとして受け付ける最大件数（デフォルト: ワーカー数×2）
+            processor_options: 各ワーカーのOCRProcessorに渡す引数
+        """
+        self.processor_options = processor_options or {}
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue if max_queue is not None else self.workers * 2
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+
+    @property
+    def in_flight(self) -> int:
+        """実行中＋実行待ちの件数（呼び出し側が待つのをやめてもワーカーが終えるまで数える）"""
+        return self._in_flight
+
+    @property
+    def running(self) -> bool:
+        """ワーカープールが起動済みか"""
+        return self._executor is not None
+
+    @property
+    def capacity(self) -> int:
+        """同時に受け付けられる最大件数"""
+        return self.workers + self.max_queue
+
+    def start(self) -> None:
+        """プロセスプールを起動"""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(self.processor_options,)
+            )
+
+    def shutdown(self) -> None:
+        """プロセスプールを停止"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _discard_broken(self, executor: ProcessPoolExecutor) -> None:
+        """壊れたプロセスプールを捨てる（次の start() で作り直す）"""
+        if self._executor is executor:
+            self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, loop: asyncio.AbstractEventLoop) -> None:
+        """ワーカーでの実行が終わったら件数を戻す（完了コールバック用）"""
+        try:
+            loop.call_soon_threadsafe(self._finish)
+        except RuntimeError:
+            # イベントループ終了後の完了
+            self._finish()
+
+    def _finish(self) -> None:
+        self._in_flight -= 1
+
+    async def run(self, func, *args, enforce_limit: bool = True):
+        """ワーカープロセスで関数を実行（満杯ならPoolBusyError）
+
+        Args:
+            enforce_limit: Falseなら上限を確認しない（呼び出し側で同時実行数を
+                制限している一括処理用）
+        """
+        if enforce_limit and self._in_flight >= self.capacity:
+            raise PoolBusyError(
+                f"OCR queue is full ({self._in_flight}/{self.capacity})"
+            )
+
+        self.start()
+        executor = self._executor
+        loop = asyncio.get_running_loop()
+        try:
+            future: Future = executor.submit(func, *args)
+        except BrokenProcessPool as e:
+            self._discard_broken(executor)
+            raise WorkerCrashedError(f"OCR worker pool is restarting: {e}")
+
+        # 件数は待機側ではなくワーカーでの実行に紐付ける
+        self._in_flight += 1
+        future.add_done_callback(lambda _: self._release(loop))
+
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool as e:
+            self._discard_broken(executor)
+            raise WorkerCrashedError(f"OCR worker crashed: {e}")
+
+    async def process_image(self, image_bytes: bytes) -> OCRResult:
+        """画像からMarkdownテキストを抽出
+
+        Raises:
+            PoolBusyError: 待ち行列が満杯、またはワーカーが異常終了（再試行可能）
+            ValueError: OCR処理に失敗
+        """
+        return await self.run(_process_image, image_bytes)
+
+    async def process_pdf_page(self, pdf_path: str, page_index: int, dpi: int) -> OCRResult:
+        """PDFの1ページからMarkdownテキストを抽出（一括処理用）"""
+        return await self.run(
+            _process_pdf_page, pdf_path, page_index, dpi,
+            enforce_limit=False
+        )
+
+    async def process_image_unlimited(self, image_bytes: bytes) -> OCRResult:
+        """上限確認なしで画像を処理（一括処理用）"""
+        return await self.run(_process_image, image_bytes, enforce_limit=False)
@@ -1,51 +1,267 @@
 """OCR処理モジュール"""
 import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from PIL import Image
+import numpy as np
 import pytesseract
-from typing import Optional
+from typing import Dict, List, Optional
+
+from .layout import detect_regions
+from .preprocess import PreprocessOptions, ink_mask, load_image, preprocess
+
+logger = logging.getLogger(__name__)
+
+# 対応エンジン
+ENGINE_PYTESSERACT = "pytesseract"  # 画像ごとにtesseractプロセスを起動
+ENGINE_TESSEROCR = "tesserocr"      # C-APIハンドルを保持し言語データを再利用
+
+# レイアウトモード
+LAYOUT_BLOCK = "block"      # 画像全体を1ブロックとして認識
+LAYOUT_REGIONS = "regions"  # テキスト領域を検出し、領域ごとに並列認識
+
+# 言語の自動選択
+LANG_AUTO = "auto"            # 画像ごとに文字種を判定して言語を選ぶ
+LANG_FALLBACK = "jpn+eng"     # 判定できない場合の言語
+# Tesseract OSDのスクリプト名 → 認識言語
+SCRIPT_LANGS = {
+    "Latin": "eng",
+    "Japanese": "jpn",
+    "Han": "jpn",
+    "Hiragana": "jpn",
+    "Katakana": "jpn",
+}
+
+
+@dataclass
+class OCRResult:
+    """OCR結果"""
+    markdown: str
+    lang: str  # 認識に使った言語
+
+
+def lang_for_script(script: Optional[str], confidence: float, min_confidence: float) -> str:
+    """OSDの判定結果から認識言語を選ぶ
+
+    確信度が低い場合や未知の文字種は日本語+英語にフォールバックする
+    """
+    if script is None or confidence < min_confidence:
+        return LANG_FALLBACK
+    return SCRIPT_LANGS.get(script, LANG_FALLBACK)
 
 
 class OCRProcessor:
     """OCR処理クラス（Tesseract OCR使用）"""
 
-    def __init__(self, lang: str = "jpn+eng"):
+    def __init__(
+        self,
+        lang: str = "jpn+eng",
+        engine: str = ENGINE_PYTESSERACT,
+        preprocess_options: Optional[PreprocessOptions] = None,
+        layout: str = LAYOUT_BLOCK,
+        region_threads: int = 4,
+        auto_lang_min_confidence: float = 2.0
+    ):
         """
         Args:
-            lang: 使用言語（デフォルト: 日本語+英語）
+            lang: 使用言語（デフォルト: 日本語+英語）。
+                auto の場合は画像ごとにOSDで文字種を判定し eng / jpn / jpn+eng を選ぶ
+            engine: OCRエンジン（pytesseract / tesserocr）。
+                tesserocrが使えない環境ではpytesseractにフォールバックする
+            preprocess_options: 前処理の設定（Noneなら従来どおりグレースケール化のみ）
+            layout: レイアウトモード（block / regions）
+            region_threads: regionsモードで同時に認識する領域数
+            auto_lang_min_confidence: 自動選択で単一言語にするOSD確信度の下限
         """
+        if layout not in (LAYOUT_BLOCK, LAYOUT_REGIONS):
+            raise ValueError(f"Unknown layout mode: {layout}")
+
         self.lang = lang
+        self.engine = engine
+        self.preprocess_options = preprocess_options
+        self.layout = layout
+        self.region_threads = region_threads
+        self.auto_lang_min_confidence = auto_lang_min_confidence
+        self._region_executor: Optional[ThreadPoolExecutor] = None
+        # スレッド・言語ごとのTesseract APIハンドル（tesserocr使用時）
+        self._local = threading.local()
+        self._all_apis: List[object] = []
+        self._apis_lock = threading.Lock()
+
+        if engine == ENGINE_TESSEROCR:
+            try:
+                self._get_api(LANG_FALLBACK if lang == LANG_AUTO else lang)
+            except Exception as e:
+                logger.warning(f"tesserocr unavailable, falling back to pytesseract: {e}")
+                self.engine = ENGINE_PYTESSERACT
+        elif engine != ENGINE_PYTESSERACT:
+            raise ValueError(f"Unknown OCR engine: {engine}")
+
+    def _get_api(self, lang: str):
+        """言語データを読み込み済みのAPIハンドルを取得（スレッドごとに初回のみ生成）
+
+        APIハンドルはスレッドセーフではないため、スレッドごとに持つ
+        （領域並列・ヘルスチェックなど、呼び出し元のスレッドが変わっても共有しない）。
+        lang="osd" の場合は文字種判定専用のハンドルを返す
+        """
+        apis: Dict[str, object] = getattr(self._local, "apis", None)
+        if apis is None:
+            apis = self._local.apis = {}
+
+        api = apis.get(lang)
+        if api is None:
+            from tesserocr import PyTessBaseAPI, PSM
+
+            psm = PSM.OSD_ONLY if lang == "osd" else PSM.SINGLE_BLOCK
+            api = PyTessBaseAPI(lang=lang, psm=psm)
+            apis[lang] = api
+            with self._apis_lock:
+                self._all_apis.append(api)
+        return api
+
+    def _detect_script(self, image: Image.Image) -> tuple:
+        """Tesseract OSDで主な文字種を判定
+
+        Returns:
+            (スクリプト名, 確信度)。文字が少ないなど判定できない場合は (None, 0.0)
+        """
+        try:
+            if self.engine == ENGINE_TESSEROCR:
+                api = self._get_api("osd")
+                api.SetImage(image)
+                result = api.DetectOrientationScript()
+                if not result:
+                    return None, 0.0
+                return result["script_name"], float(result["script_conf"])
+
+            osd = pytesseract.image_to_osd(
+                image,
+                config='--psm 0',
+                output_type=pytesseract.Output.DICT
+            )
+            return osd["script"], float(osd["script_conf"])
+        except Exception as e:
+            logger.debug(f"Script detection failed: {e}")
+            return None, 0.0
+
+    def _select_lang(self, image: Image.Image) -> str:
+        """画像に使う認識言語を決定（auto以外は設定値をそのまま使う）"""
+        if self.lang != LANG_AUTO:
+            return self.lang
+        script, confidence = self._detect_script(image)
+        return lang_for_script(script, confidence, self.auto_lang_min_confidence)
 
-    def process_image(self, image_bytes: bytes) -> str:
+    def _recognize(self, image: Image.Image, lang: Optional[str] = None) -> str:
+        """Tesseractで文字認識（--psm 6: 単一の均一なテキストブロック）"""
+        lang = lang or self.lang
+        if lang == LANG_AUTO:
+            lang = LANG_FALLBACK
+
+        if self.engine == ENGINE_TESSEROCR:
+            api = self._get_api(lang)
+            api.SetImage(image)
+            return api.GetUTF8Text()
+
+        return pytesseract.image_to_string(
+            image,
+            lang=lang,
+            config='--psm 6'  # Assume a single uniform block of text
+        )
+
+    def _recognize_regions(self, image: Image.Image, lang: Optional[str] = None) -> str:
+        """テキスト領域ごとに並列で文字認識し、読み順に連結
+
+        pytesseractはサブプロセス、tesserocrは認識中にGILを解放するため、
+        スレッドで複数コアを使える
+        """
+        regions = detect_regions(ink_mask(np.asarray(image)))
+        if len(regions) <= 1:
+            return self._recognize(image, lang)
+
+        if self._region_executor is None:
+            self._region_executor = ThreadPoolExecutor(max_workers=self.region_threads)
+
+        pad = 4
+        crops = [
+            image.crop((
+                max(0, left - pad), max(0, top - pad),
+                min(image.size[0], right + pad), min(image.size[1], bottom + pad)
+            ))
+            for left, top, right, bottom in regions
+        ]
+        texts = self._region_executor.map(lambda crop: self._recognize(crop, lang), crops)
+        return "\n".join(text.strip("\n") for text in texts)
+
+    def close(self) -> None:
+        """APIハンドルとスレッドを解放"""
+        if self._region_executor is not None:
+            self._region_executor.shutdown(wait=True)
+            self._region_executor = None
+        with self._apis_lock:
+            for api in self._all_apis:
+                api.End()
+            self._all_apis.clear()
+
+    def process_image(self, image_bytes: bytes) -> OCRResult:
         """画像からテキストを抽出
 
         Args:
             image_bytes: 画像バイナリデータ
 
         Returns:
-            抽出されたテキスト（Markdown形式）
+            抽出されたテキスト（Markdown形式）と使用した言語
 
         Raises:
             ValueError: 画像の読み込みまたはOCR処理に失敗した場合
         """
         try:
-            # バイナリデータをPIL Imageに変換
-            image = Image.open(io.BytesIO(image_bytes))
+            if self.preprocess_options is not None:
+                # 画素数を確認し、必要な解像度までの縮小デコード
+                image = load_image(image_bytes, self.preprocess_options)
+            else:
+                # バイナリデータをPIL Imageに変換
+                image = Image.open(io.BytesIO(image_bytes))
+        except Exception as e:
+            raise ValueError(f"OCR processing failed: {e}")
+
+        return self.process_pil_image(image)
 
+    def process_pil_image(self, image: Image.Image) -> OCRResult:
+        """デコード済み画像（PDFのラスタライズ結果など）からテキストを抽出
+
+        Args:
+            image: PIL画像
+
+        Returns:
+            抽出されたテキスト（Markdown形式）と使用した言語
+
+        Raises:
+            ValueError: OCR処理に失敗した場合
+        """
+        try:
             # グレースケールに変換（OCR精度向上のため）
             if image.mode != 'L':
                 image = image.convert('L')
 
+            # 縮小・傾き補正・二値化・余白切り取り
+            if self.preprocess_options is not None:
+                image = preprocess(image, self.preprocess_options)
+
+            # 文字種から認識言語を選択（英語のみの画像は eng で高速に処理）
+            lang = self._select_lang(image)
+
             # Tesseract OCRで文字認識
-            text = pytesseract.image_to_string(
-                image,
-                lang=self.lang,
-                config='--psm 6'  # Assume a single uniform block of text
-            )
+            if self.layout == LAYOUT_REGIONS:
+                text = self._recognize_regions(image, lang)
+            else:
+                text = self._recognize(image, lang)
 
             # Markdown形式に整形
             markdown = self._format_as_markdown(text)
 
-            return markdown
+            return OCRResult(markdown=markdown, lang=lang)
 
         except Exception as e:
             raise ValueError(f"OCR processing failed: {e}")
@@ -88,7 +304,7 @@ class OCRProcessor:
         try:
             # ダミー画像でテスト
             test_image = Image.new('L', (100, 50), color=255)
-            pytesseract.image_to_string(test_image, lang=self.lang)
+            self._recognize(test_image)
             return True
         except Exception:
             return False
@@ -0,0 +1,180 @@
+"""OCR前処理モジュール
+
+大きな写真を必要十分な解像度でデコードし、傾き補正・二値化・余白の切り取りを行う。
+JPEGはドラフトモードで縮小デコードするため、フル解像度の展開を避けられる
+"""
+import io
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+from PIL import Image
+
+
+@dataclass
+class PreprocessOptions:
+    """前処理の設定"""
+    max_image_pixels: int = 40_000_000   # これを超える画像は拒否（解凍爆弾対策）
+    max_long_side: int = 3000            # デコード時の長辺上限
+    target_text_height: int = 32         # 縮小後の目標行高さ（px）
+    deskew: bool = True
+    max_skew_degrees: float = 5.0
+    binarize: bool = True
+    crop_margins: bool = True
+    margin_padding: int = 16
+
+
+def load_image(image_bytes: bytes, options: PreprocessOptions) -> Image.Image:
+    """画素数を確認したうえで、長辺上限以下のグレースケール画像としてデコード
+
+    Raises:
+        ValueError: 画像として読めない、または画素数が上限を超える場合
+    """
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+    except Exception as e:
+        raise ValueError(f"Invalid image: {e}")
+
+    # ヘッダのサイズだけで判定し、展開前に拒否する
+    width, height = image.size
+    if width * height > options.max_image_pixels:
+        raise ValueError(
+            f"Image too large: {width}x{height} exceeds {options.max_image_pixels} pixels"
+        )
+
+    scale = min(1.0, options.max_long_side / max(width, height))
+    target_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+
+    # JPEGは1/2・1/4・1/8の縮小デコード（target_size以上の最小サイズ）
+    image.draft('L', target_size)
+    image = image.convert('L')
+
+    if image.size[0] > target_size[0]:
+        image = image.resize(target_size, Image.LANCZOS)
+    return image
+
+
+def _otsu_threshold(gray: np.ndarray) -> int:
+    """大津の方法で二値化しきい値を求める"""
+    histogram = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = gray.size
+    levels = np.arange(256)
+
+    weight_bg = np.cumsum(histogram)
+    weight_fg = total - weight_bg
+    sum_bg = np.cumsum(histogram * levels)
+    mean_bg = sum_bg / np.maximum(weight_bg, 1)
+    mean_fg = (sum_bg[-1] - sum_bg) / np.maximum(weight_fg, 1)
+
+    between = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+    return int(np.argmax(between))
+
+
+def ink_mask(gray: np.ndarray) -> np.ndarray:
+    """文字（暗い画素）のマスク"""
+    return gray <= _otsu_threshold(gray)
+
+
+def estimate_line_height(ink: np.ndarray) -> Optional[float]:
+    """水平射影から行の高さ（中央値）を推定
+
+    Returns:
+        行の高さ（px）。行が見つからなければNone
+    """
+    row_has_ink = ink.mean(axis=1) > 0.01
+    heights = []
+    run = 0
+    for has_ink in row_has_ink:
+        if has_ink:
+            run += 1
+        elif run:
+            heights.append(run)
+            run = 0
+    if run:
+        heights.append(run)
+
+    heights = [h for h in heights if h >= 3]
+    if not heights:
+        return None
+
+    median = float(np.median(heights))
+    # 行が分離できていない（図や写真が大半を占める）場合は推定しない
+    if median > ink.shape[0] / 4:
+        return None
+    return median
+
+
+def estimate_skew(ink: np.ndarray, max_degrees: float, step: float = 0.25) -> float:
+    """射影プロファイル法で傾き角度（度）を推定
+
+    行方向の黒画素和の分散が最大になる回転角を探す
+    """
+    mask = Image.fromarray((ink * 255).astype(np.uint8))
+    # 角度探索は縮小画像で行う
+    if max(mask.size) > 800:
+        ratio = 800 / max(mask.size)
+        mask = mask.resize(
+            (max(1, int(mask.size[0] * ratio)), max(1, int(mask.size[1] * ratio))),
+            Image.BILINEAR
+        )
+
+    def score(angle: float) -> float:
+        rotated = np.asarray(mask.rotate(angle, resample=Image.NEAREST, fillcolor=0))
+        return float(rotated.sum(axis=1, dtype=np.float64).var())
+
+    # 0度より明確に良い角度がなければ補正しない（白紙などで無駄に回転させない）
+    best_angle, best_score = 0.0, score(0.0)
+    for angle in np.arange(-max_degrees, max_degrees + step / 2, step):
+        angle_score = score(float(angle))
+        if angle_score > best_score * 1.01:
+            best_angle, best_score = float(angle), angle_score
+    return best_angle
+
+
+def preprocess(image: Image.Image, options: PreprocessOptions) -> Image.Image:
+    """デコード済み画像に縮小・傾き補正・二値化・余白切り取りを適用
+
+    Args:
+        image: 入力画像
+        options: 前処理の設定
+
+    Returns:
+        OCR用のグレースケール（二値化時は0/255）画像
+    """
+    if image.mode != 'L':
+        image = image.convert('L')
+
+    ink = ink_mask(np.asarray(image))
+
+    # 行の高さは傾きがあると正しく測れないため、先に傾きを補正する
+    if options.deskew:
+        angle = estimate_skew(ink, options.max_skew_degrees)
+        if abs(angle) >= 0.25:
+            image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+            ink = ink_mask(np.asarray(image))
+
+    # 行の高さが目標より十分大きければ縮小（拡大はしない）
+    line_height = estimate_line_height(ink)
+    if line_height and line_height > options.target_text_height * 1.25:
+        ratio = options.target_text_height / line_height
+        image = image.resize(
+            (max(1, int(image.size[0] * ratio)), max(1, int(image.size[1] * ratio))),
+            Image.LANCZOS
+        )
+        ink = ink_mask(np.asarray(image))
+
+    if options.binarize:
+        image = Image.fromarray(np.where(ink, 0, 255).astype(np.uint8))
+
+    if options.crop_margins and ink.any():
+        rows = np.flatnonzero(ink.any(axis=1))
+        cols = np.flatnonzero(ink.any(axis=0))
+        pad = options.margin_padding
+        box = (
+            max(0, int(cols[0]) - pad),
+            max(0, int(rows[0]) - pad),
+            min(image.size[0], int(cols[-1]) + pad + 1),
+            min(image.size[1], int(rows[-1]) + pad + 1),
+        )
+        image = image.crop(box)
+
+    return image
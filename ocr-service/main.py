@@ -2,16 +2,80 @@
 
 Tesseract OCRを使用した画像テキスト抽出サービス
 """
+import asyncio
+import json
+import os
+import shutil
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
 from fastapi import FastAPI, UploadFile, File, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
 from app.ocr_processor import OCRProcessor
+from app.preprocess import PreprocessOptions
+from app.ocr_cache import OCRResultCache, image_digest
+from app.ocr_pool import OCRWorkerPool, PoolBusyError, count_pdf_pages
+
+# 認識言語: auto（画像ごとにOSDで eng / jpn / jpn+eng を選択） | jpn+eng などの固定値
+OCR_LANG = os.getenv("OCR_LANG", "auto")
+OCR_ENGINE = os.getenv("OCR_ENGINE", "pytesseract")  # pytesseract | tesserocr
+OCR_PDF_DPI = int(os.getenv("OCR_PDF_DPI", "200"))
+OCR_BATCH_MAX_PAGES = int(os.getenv("OCR_BATCH_MAX_PAGES", "500"))
+# 詳細ヘルスチェック（実際のOCR実行）の結果を再利用する秒数
+OCR_HEALTH_DEEP_TTL = float(os.getenv("OCR_HEALTH_DEEP_TTL", "60"))
+
+
+def _env_int(name: str) -> Optional[int]:
+    """整数の環境変数を取得（未設定ならNone）"""
+    value = os.getenv(name)
+    return int(value) if value else None
+
+
+# 前処理: bounded（縮小デコード・傾き補正・二値化・余白切り取り） | legacy（グレースケール化のみ）
+OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "bounded")
+
+PROCESSOR_OPTIONS = {
+    "lang": OCR_LANG,
+    "engine": OCR_ENGINE,
+    "preprocess_options": PreprocessOptions(
+        max_image_pixels=_env_int("OCR_MAX_IMAGE_PIXELS") or 40_000_000,
+        max_long_side=_env_int("OCR_MAX_LONG_SIDE") or 3000,
+        target_text_height=_env_int("OCR_TARGET_TEXT_HEIGHT") or 32,
+    ) if OCR_PREPROCESS == "bounded" else None,
+    # block（全体を1ブロック） | regions（領域検出して並列認識）
+    "layout": os.getenv("OCR_LAYOUT", "block"),
+    "region_threads": _env_int("OCR_REGION_THREADS") or 4,
+    "auto_lang_min_confidence": float(os.getenv("OCR_AUTO_LANG_MIN_CONF", "2.0")),
+}
+
+# OCRワーカープール（Tesseractを別プロセスで並列実行）
+ocr_pool = OCRWorkerPool(
+    workers=_env_int("OCR_WORKERS"),
+    max_queue=_env_int("OCR_MAX_QUEUE"),
+    processor_options=PROCESSOR_OPTIONS
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """ワーカープールの起動と停止"""
+    ocr_pool.start()
+    yield
+    ocr_pool.shutdown()
+    _health_executor.shutdown(wait=True)
+    ocr_processor.close()
+
 
 app = FastAPI(
     title="hight-agent-ai OCR Service",
     description="画像からテキストを抽出するOCRサービス",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -22,8 +86,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# OCRプロセッサのインスタンス
-ocr_processor = OCRProcessor(lang="jpn+eng")
+# ヘルスチェック用のOCRプロセッサ
+ocr_processor = OCRProcessor(**PROCESSOR_OPTIONS)
+# ヘルスチェック専用スレッド（tesserocrのAPIハンドルはスレッドセーフではないため、
+# 常に同じ1スレッドから使い、ハンドルもスレッドごとに増やさない）
+_health_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ocr-health")
+
+# OCR結果キャッシュ（同じ問題画像の再OCRを省く）
+ocr_cache = OCRResultCache(
+    max_entries=int(os.getenv("OCR_CACHE_MAX_ENTRIES", "512")),
+    max_bytes=int(os.getenv("OCR_CACHE_MAX_MB", "32")) * 1024 * 1024,
+    # 秒（未設定なら期限なし）
+    ttl_seconds=float(os.getenv("OCR_CACHE_TTL")) if os.getenv("OCR_CACHE_TTL") else None
+)
 
 
 @app.post("/api/ocr")
@@ -34,7 +109,7 @@ async def extract_text(image: UploadFile = File(..., description="OCR処理す
         image: 画像ファイル
 
     Returns:
-        抽出されたMarkdownテキストと処理時間
+        抽出されたMarkdownテキスト、認識に使った言語と処理時間
     """
     start_time = time.time()
 
@@ -42,34 +117,212 @@ async def extract_text(image: UploadFile = File(..., description="OCR処理す
         # 画像データを読み込み
         image_bytes = await image.read()
 
-        # OCR処理
-        markdown = ocr_processor.process_image(image_bytes)
+        # キャッシュ確認（大きな画像のハッシュ計算でイベントループを塞がない）
+        loop = asyncio.get_running_loop()
+        digest = await loop.run_in_executor(None, image_digest, image_bytes)
+        result = ocr_cache.get(digest)
+        cached = result is not None
+
+        # OCR処理（ワーカープロセスで実行）
+        if not cached:
+            result = await ocr_pool.process_image(image_bytes)
+            ocr_cache.store(digest, result)
 
         processing_time_ms = int((time.time() - start_time) * 1000)
 
         return {
-            "markdown": markdown,
-            "processing_time_ms": processing_time_ms
+            "markdown": result.markdown,
+            "lang": result.lang,
+            "processing_time_ms": processing_time_ms,
+            "cached": cached
         }
 
+    except PoolBusyError as e:
+        # 満杯時は待たせずに拒否し、クライアントに再試行させる
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Internal server error: {e}")
 
 
+def _is_pdf(upload: UploadFile) -> bool:
+    """アップロードがPDFか"""
+    return (
+        upload.content_type == "application/pdf"
+        or (upload.filename or "").lower().endswith(".pdf")
+    )
+
+
+def _save_to_temp(upload: UploadFile) -> str:
+    """アップロードを一時ファイルに保存（ワーカーがパスで開けるように）"""
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
+        shutil.copyfileobj(upload.file, tmp)
+        return tmp.name
+
+
+def _ndjson(event: dict) -> bytes:
+    """イベントをNDJSONの1行にエンコード"""
+    return (json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _remove_files(paths: List[str]) -> None:
+    """一時ファイルを削除"""
+    for path in paths:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+async def _stream_batch(jobs: List[tuple]) -> AsyncIterator[bytes]:
+    """ページ単位のジョブを並列にOCRし、ページ順に結果を返す
+
+    同時実行数はワーカー数までに抑え、1つの一括リクエストが待ち行列を占有しないようにする。
+    1ページの失敗（ワーカー異常を含む）はそのページのエラーイベントとして返し、最後まで続ける
+    """
+    start_time = time.time()
+    semaphore = asyncio.Semaphore(ocr_pool.workers)
+
+    async def run(job) -> tuple:
+        _, _, func, args = job
+        async with semaphore:
+            page_start = time.time()
+            result = await func(*args)
+            return result, int((time.time() - page_start) * 1000)
+
+    tasks = [asyncio.ensure_future(run(job)) for job in jobs]
+    try:
+        for index, (job, task) in enumerate(zip(jobs, tasks), 1):
+            filename, page, _, _ = job
+            event = {"type": "page", "index": index, "filename": filename, "page": page}
+            try:
+                result, processing_time_ms = await task
+                event.update(
+                    markdown=result.markdown,
+                    lang=result.lang,
+                    processing_time_ms=processing_time_ms
+                )
+            except Exception as e:
+                event.update(error=str(e) or type(e).__name__)
+                if isinstance(e, PoolBusyError):
+                    # ワーカー異常終了（プールは作り直し済み）はそのページだけ再試行できる
+                    event.update(retryable=True)
+            yield _ndjson(event)
+
+        yield _ndjson({
+            "type": "done",
+            "pages": len(jobs),
+            "processing_time_ms": int((time.time() - start_time) * 1000)
+        })
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+@app.post("/api/ocr/batch")
+async def extract_text_batch(
+    files: List[UploadFile] = File(..., description="OCR処理する画像またはPDF（複数可）")
+):
+    """複数画像・複数ページPDFを一括でOCR
+
+    PDFは OCR_PDF_DPI でページごとにラスタライズし、ページをワーカー間で並列処理する。
+    結果はページ順にNDJSON（1行1ページ）でストリーミング返却する
+
+    Args:
+        files: 画像またはPDFファイル
+
+    Returns:
+        application/x-ndjson のストリーミングレスポンス
+    """
+    if ocr_pool.in_flight >= ocr_pool.capacity:
+        raise HTTPException(
+            status_code=503,
+            detail="OCR queue is full",
+            headers={"Retry-After": "1"}
+        )
+
+    loop = asyncio.get_running_loop()
+    temp_paths: List[str] = []
+    # (ファイル名, ページ番号, 実行関数, 引数)
+    jobs: List[tuple] = []
+
+    try:
+        for upload in files:
+            if _is_pdf(upload):
+                path = await loop.run_in_executor(None, _save_to_temp, upload)
+                temp_paths.append(path)
+                page_count = await loop.run_in_executor(None, count_pdf_pages, path)
+                jobs.extend(
+                    (upload.filename, index + 1, ocr_pool.process_pdf_page, (path, index, OCR_PDF_DPI))
+                    for index in range(page_count)
+                )
+            else:
+                image_bytes = await upload.read()
+                jobs.append(
+                    (upload.filename, 1, ocr_pool.process_image_unlimited, (image_bytes,))
+                )
+
+            if len(jobs) > OCR_BATCH_MAX_PAGES:
+                raise HTTPException(
+                    status_code=413,
+                    detail=f"Too many pages: more than {OCR_BATCH_MAX_PAGES}"
+                )
+
+    except HTTPException:
+        _remove_files(temp_paths)
+        raise
+    except ValueError as e:
+        _remove_files(temp_paths)
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # 一時ファイルはレスポンス終了後に削除する
+    # （ストリーム開始前にクライアントが切断した場合もバックグラウンドタスクは実行される）
+    return StreamingResponse(
+        _stream_batch(jobs),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(_remove_files, temp_paths)
+    )
+
+
+# 直近の詳細ヘルスチェック結果（monotonic時刻, 結果）
+_deep_health: Optional[tuple] = None
+
+
+async def _deep_health_check() -> bool:
+    """ダミー画像で実際にOCRを実行（OCR_HEALTH_DEEP_TTL の間は結果を再利用）"""
+    global _deep_health
+
+    now = time.monotonic()
+    if _deep_health is not None and now - _deep_health[0] < OCR_HEALTH_DEEP_TTL:
+        return _deep_health[1]
+
+    # イベントループを塞がないよう専用スレッドで実行
+    loop = asyncio.get_running_loop()
+    ocr_ok = await loop.run_in_executor(_health_executor, ocr_processor.health_check)
+    _deep_health = (time.monotonic(), ocr_ok)
+    return ocr_ok
+
+
 @app.get("/health")
-async def health_check():
+async def health_check(deep: bool = False):
     """ヘルスチェック
 
-    OCRエンジンの動作確認を含む
+    通常はTesseractの存在とワーカープールの状態のみ確認する。
+    deep=true の場合はダミー画像で実際にOCRを実行する（結果はキャッシュ）
     """
-    ocr_ok = ocr_processor.health_check()
+    ocr_ok = ocr_pool.running and shutil.which("tesseract") is not None
+    if deep and ocr_ok:
+        ocr_ok = await _deep_health_check()
 
     return {
         "status": "ok" if ocr_ok else "error",
-        "ocr_engine": "tesseract",
-        "languages": "jpn+eng"
+        "ocr_engine": f"tesseract ({ocr_processor.engine})",
+        "languages": OCR_LANG,
+        "preprocess": OCR_PREPROCESS,
+        "workers": ocr_pool.workers,
+        "in_flight": ocr_pool.in_flight,
+        "capacity": ocr_pool.capacity
     }
 
 
@@ -0,0 +1,90 @@
+"""一括OCRエンドポイントのテスト"""
+import io
+import json
+import os
+import pypdfium2 as pdfium
+import pytest
+from fastapi.testclient import TestClient
+import main
+from app.ocr_pool import WorkerCrashedError, pdf_render_scale
+from app.ocr_processor import OCRResult
+
+
+def _pdf_bytes(pages: int) -> bytes:
+    """A4白紙ページのPDF"""
+    pdf = pdfium.PdfDocument.new()
+    for _ in range(pages):
+        pdf.new_page(595, 842)
+    buffer = io.BytesIO()
+    pdf.save(buffer)
+    pdf.close()
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """OCRをワーカープロセスに送らず、ページ番号を返す偽の処理に差し替える"""
+    seen_paths = []
+
+    async def process_pdf_page(pdf_path, page_index, dpi):
+        seen_paths.append(pdf_path)
+        if page_index == 1:
+            raise WorkerCrashedError("OCR worker crashed")
+        return OCRResult(markdown=f"page {page_index + 1}", lang="eng")
+
+    async def process_image_unlimited(image_bytes):
+        return OCRResult(markdown=image_bytes.decode(), lang="jpn")
+
+    monkeypatch.setattr(main.ocr_pool, "process_pdf_page", process_pdf_page)
+    monkeypatch.setattr(main.ocr_pool, "process_image_unlimited", process_image_unlimited)
+    with TestClient(main.app) as test_client:
+        test_client.seen_paths = seen_paths
+        yield test_client
+
+
+def test_batch_streams_one_ndjson_line_per_page(client):
+    """ページ順に1行1イベントで返し、失敗したページも最後まで続ける"""
+    response = client.post(
+        "/api/ocr/batch",
+        files=[
+            ("files", ("sheet.pdf", _pdf_bytes(3), "application/pdf")),
+            ("files", ("photo.png", b"photo text", "image/png")),
+        ]
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.content.decode("utf-8").splitlines()
+    events = [json.loads(line) for line in lines]
+
+    assert [e["type"] for e in events] == ["page"] * 4 + ["done"]
+    assert [(e["index"], e["filename"], e["page"]) for e in events[:4]] == [
+        (1, "sheet.pdf", 1), (2, "sheet.pdf", 2), (3, "sheet.pdf", 3), (4, "photo.png", 1)
+    ]
+    assert events[0]["markdown"] == "page 1"
+    assert events[1]["error"] == "OCR worker crashed" and events[1]["retryable"] is True
+    assert events[3]["markdown"] == "photo text" and events[3]["lang"] == "jpn"
+    assert events[4]["pages"] == 4
+
+    # 一時PDFはレスポンス後に削除される
+    assert client.seen_paths and not any(os.path.exists(p) for p in client.seen_paths)
+
+
+def test_batch_rejects_invalid_pdf(client):
+    response = client.post(
+        "/api/ocr/batch",
+        files=[("files", ("broken.pdf", b"not a pdf", "application/pdf"))]
+    )
+    assert response.status_code == 400
+
+
+def test_pdf_render_scale_caps_pixels():
+    """指定DPIで上限を超えるページだけ解像度を下げる"""
+    a4 = (595, 842)
+    assert pdf_render_scale(*a4, dpi=200, max_pixels=40_000_000) == pytest.approx(200 / 72)
+
+    scale = pdf_render_scale(*a4, dpi=600, max_pixels=4_000_000)
+    assert scale < 600 / 72
+    assert a4[0] * a4[1] * scale * scale == pytest.approx(4_000_000)
+
+    assert pdf_render_scale(0, 0, dpi=200, max_pixels=1) == pytest.approx(200 / 72)
@@ -0,0 +1,65 @@
+"""認識言語の自動選択のテスト"""
+import pytest
+from PIL import Image
+from app import ocr_processor
+from app.ocr_processor import LANG_FALLBACK, OCRProcessor, lang_for_script
+
+
+@pytest.mark.parametrize("script, expected", [
+    ("Latin", "eng"),
+    ("Japanese", "jpn"),
+    ("Han", "jpn"),
+    ("Katakana", "jpn"),
+    ("Cyrillic", LANG_FALLBACK),
+    (None, LANG_FALLBACK),
+])
+def test_lang_for_script(script, expected):
+    assert lang_for_script(script, confidence=10.0, min_confidence=2.0) == expected
+
+
+def test_low_confidence_falls_back_to_japanese_and_english():
+    """確信度が下限未満なら文字種にかかわらず jpn+eng を使う"""
+    assert lang_for_script("Latin", confidence=1.9, min_confidence=2.0) == LANG_FALLBACK
+    assert lang_for_script("Latin", confidence=2.0, min_confidence=2.0) == "eng"
+
+
+def _fake_tesseract(monkeypatch, osd):
+    """OSDの結果を固定し、認識に使われた言語を記録する"""
+    used = []
+
+    def image_to_osd(image, config, output_type):
+        if isinstance(osd, Exception):
+            raise osd
+        return osd
+
+    def image_to_string(image, lang, config):
+        used.append(lang)
+        return "text"
+
+    monkeypatch.setattr(ocr_processor.pytesseract, "image_to_osd", image_to_osd)
+    monkeypatch.setattr(ocr_processor.pytesseract, "image_to_string", image_to_string)
+    return used
+
+
+@pytest.mark.parametrize("osd, expected", [
+    ({"script": "Latin", "script_conf": 8.5}, "eng"),
+    ({"script": "Latin", "script_conf": 0.5}, LANG_FALLBACK),
+    # 文字が少なくOSDが失敗した場合
+    (RuntimeError("Too few characters"), LANG_FALLBACK),
+])
+def test_auto_lang_uses_osd(monkeypatch, osd, expected):
+    used = _fake_tesseract(monkeypatch, osd)
+    processor = OCRProcessor(lang="auto", auto_lang_min_confidence=2.0)
+
+    result = processor.process_pil_image(Image.new("L", (60, 30), 255))
+
+    assert result.lang == expected
+    assert used == [expected]
+
+
+def test_fixed_lang_skips_osd(monkeypatch):
+    used = _fake_tesseract(monkeypatch, AssertionError("OSD must not run"))
+
+    result = OCRProcessor(lang="jpn").process_pil_image(Image.new("L", (60, 30), 255))
+
+    assert result.lang == "jpn" and used == ["jpn"]
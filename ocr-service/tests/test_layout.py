@@ -0,0 +1,54 @@
+"""レイアウト解析のテスト"""
+import numpy as np
+from app.layout import detect_regions
+
+
+def _lines(ink: np.ndarray, left: int, right: int, top: int, count: int,
+           height: int = 10, pitch: int = 20) -> None:
+    """left〜rightの範囲にcount行の文字行を描く"""
+    for i in range(count):
+        y = top + i * pitch
+        ink[y:y + height, left:right] = True
+
+
+def test_two_columns_are_read_left_then_right():
+    """段組みは左の段を上から下、次に右の段の順に返す"""
+    ink = np.zeros((400, 600), dtype=bool)
+    _lines(ink, 20, 260, top=20, count=5)
+    _lines(ink, 340, 580, top=20, count=5)
+
+    regions = detect_regions(ink)
+
+    assert regions == [(20, 20, 260, 110), (340, 20, 580, 110)]
+
+
+def test_blocks_within_a_column_are_top_to_bottom():
+    """大きな空白で区切られたブロックは上から順に別領域になる"""
+    ink = np.zeros((400, 300), dtype=bool)
+    _lines(ink, 20, 280, top=20, count=3)
+    _lines(ink, 20, 280, top=200, count=2)
+
+    regions = detect_regions(ink)
+
+    assert regions == [(20, 20, 280, 70), (20, 200, 280, 230)]
+
+
+def test_long_blocks_are_split_by_lines():
+    """行数の多いブロックはlines_per_region行ずつに分ける"""
+    ink = np.zeros((300, 200), dtype=bool)
+    _lines(ink, 10, 190, top=10, count=10)
+
+    regions = detect_regions(ink, lines_per_region=4)
+
+    assert [bottom - top for _, top, _, bottom in regions] == [70, 70, 30]
+    assert regions[0][1] == 10 and regions[-1][3] == 200
+
+
+def test_noise_and_blank_pages():
+    """文字が無ければ空、小さな点はノイズとして捨てる"""
+    assert detect_regions(np.zeros((100, 100), dtype=bool)) == []
+
+    ink = np.zeros((200, 200), dtype=bool)
+    _lines(ink, 10, 190, top=10, count=2)
+    ink[150:152, 100:102] = True
+    assert detect_regions(ink) == [(10, 10, 190, 40)]
@@ -0,0 +1,61 @@
+"""OCR結果キャッシュのテスト"""
+from app import ocr_cache
+from app.ocr_cache import OCRResultCache, image_digest
+from app.ocr_processor import OCRResult
+
+
+def _result(text: str) -> OCRResult:
+    return OCRResult(markdown=text, lang="jpn+eng")
+
+
+def test_hit_requires_identical_bytes():
+    """同じバイト列だけが一致し、1バイト違えば別画像として扱う"""
+    cache = OCRResultCache()
+    digest = image_digest(b"image-a")
+    cache.store(digest, _result("x = 1"))
+
+    assert cache.get(image_digest(b"image-a")).markdown == "x = 1"
+    assert cache.get(image_digest(b"image-b")) is None
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used():
+    """件数上限を超えると最も古く使われたものから捨てる"""
+    cache = OCRResultCache(max_entries=2)
+    cache.store("a", _result("a"))
+    cache.store("b", _result("b"))
+    cache.get("a")
+    cache.store("c", _result("c"))
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+
+
+def test_byte_limit():
+    """合計バイト数を超えたら古いものを捨て、上限より大きい結果は登録しない"""
+    cache = OCRResultCache(max_bytes=30)
+    cache.store("a", _result("a" * 10))
+    cache.store("b", _result("b" * 10))
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 10 + len("jpn+eng")
+
+    cache.store("huge", _result("x" * 100))
+    assert cache.get("huge") is None
+
+
+def test_expired_entries_are_dropped(monkeypatch):
+    """有効期間を過ぎた結果は返さず、バイト数からも除く"""
+    now = [1000.0]
+    monkeypatch.setattr(ocr_cache.time, "monotonic", lambda: now[0])
+    cache = OCRResultCache(ttl_seconds=60)
+    cache.store("a", _result("a"))
+
+    now[0] += 59
+    assert cache.get("a") is not None
+
+    now[0] += 1
+    assert cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+    assert cache.stats()["bytes"] == 0
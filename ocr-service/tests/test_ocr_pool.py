@@ -0,0 +1,74 @@
+"""OCRワーカープールのテスト"""
+import asyncio
+import os
+import time
+import pytest
+from app.ocr_pool import OCRWorkerPool, PoolBusyError, WorkerCrashedError
+
+
+def _sleep(seconds: float) -> float:
+    time.sleep(seconds)
+    return seconds
+
+
+def _crash() -> None:
+    os._exit(1)
+
+
+@pytest.fixture
+def pool():
+    pool = OCRWorkerPool(workers=1, max_queue=0)
+    yield pool
+    pool.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_at_capacity(pool):
+    """ワーカー数＋待ち行列を超える要求は待たせずに拒否する"""
+    first = asyncio.ensure_future(pool.run(_sleep, 0.3))
+    await asyncio.sleep(0)
+    assert pool.in_flight == pool.capacity == 1
+
+    with pytest.raises(PoolBusyError):
+        await pool.run(_sleep, 0)
+
+    # 上限確認なしの一括処理用は受け付ける
+    assert await pool.run(_sleep, 0, enforce_limit=False) == 0
+    assert await first == 0.3
+    assert pool.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_in_flight_counts_work_until_worker_finishes(pool):
+    """呼び出し側がキャンセルしても、ワーカーで実行中の間は件数に含める"""
+    task = asyncio.ensure_future(pool.run(_sleep, 0.3))
+    await asyncio.sleep(0.1)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert pool.in_flight == 1
+    with pytest.raises(PoolBusyError):
+        await pool.run(_sleep, 0)
+
+    for _ in range(50):
+        if pool.in_flight == 0:
+            break
+        await asyncio.sleep(0.05)
+    assert pool.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_crashed_worker_is_retryable_and_pool_is_recreated(pool):
+    """ワーカーの異常終了は再試行可能なエラーにし、次の要求で新しいプールを使う"""
+    pool.start()
+    broken = pool._executor
+
+    with pytest.raises(WorkerCrashedError) as exc_info:
+        await pool.run(_crash)
+    assert isinstance(exc_info.value, PoolBusyError)
+    assert pool._executor is None
+
+    assert await pool.run(_sleep, 0) == 0
+    assert pool._executor is not broken
+    assert pool.in_flight == 0
@@ -0,0 +1,89 @@
+"""OCR処理のテスト"""
+import sys
+import threading
+import types
+from PIL import Image
+import pytest
+from app import ocr_processor
+from app.ocr_processor import ENGINE_PYTESSERACT, ENGINE_TESSEROCR, OCRProcessor
+
+
+def test_tesserocr_falls_back_to_pytesseract_when_unavailable(monkeypatch):
+    """tesserocrを読み込めない環境ではpytesseractで動く"""
+    monkeypatch.setitem(sys.modules, "tesserocr", None)
+    recognized = []
+
+    def image_to_string(image, lang, config):
+        recognized.append(lang)
+        return "テスト"
+
+    monkeypatch.setattr(ocr_processor.pytesseract, "image_to_string", image_to_string)
+
+    processor = OCRProcessor(lang="jpn+eng", engine=ENGINE_TESSEROCR)
+    assert processor.engine == ENGINE_PYTESSERACT
+
+    assert processor.health_check() is True
+    assert recognized == ["jpn+eng"]
+    processor.close()
+
+
+class FakeTessBaseAPI:
+    """言語データを読み込んだAPIハンドルの代わり"""
+
+    def __init__(self, lang, psm):
+        self.lang = lang
+        self.ended = False
+
+    def End(self):
+        self.ended = True
+
+
+def test_tesserocr_handles_are_per_thread(monkeypatch):
+    """APIハンドルはスレッドごとに作り、close()ですべて解放する"""
+    fake = types.SimpleNamespace(
+        PyTessBaseAPI=FakeTessBaseAPI,
+        PSM=types.SimpleNamespace(OSD_ONLY=0, SINGLE_BLOCK=6)
+    )
+    monkeypatch.setitem(sys.modules, "tesserocr", fake)
+
+    processor = OCRProcessor(lang="jpn+eng", engine=ENGINE_TESSEROCR)
+    assert processor.engine == ENGINE_TESSEROCR
+    main_api = processor._get_api("jpn+eng")
+    assert processor._get_api("jpn+eng") is main_api
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(processor._get_api("jpn+eng")))
+    thread.start()
+    thread.join()
+
+    assert other[0] is not main_api
+    processor.close()
+    assert main_api.ended and other[0].ended
+
+
+def test_unknown_engine_is_rejected():
+    with pytest.raises(ValueError):
+        OCRProcessor(engine="easyocr")
+
+
+def test_health_check_reports_engine_failure(monkeypatch):
+    """認識に失敗したらFalseを返す"""
+    def image_to_string(image, lang, config):
+        raise RuntimeError("tesseract is not installed")
+
+    monkeypatch.setattr(ocr_processor.pytesseract, "image_to_string", image_to_string)
+    assert OCRProcessor().health_check() is False
+
+
+def test_process_pil_image_formats_markdown(monkeypatch):
+    """認識結果の空行を除き、数式らしい行はブロック数式にする"""
+    monkeypatch.setattr(
+        ocr_processor.pytesseract, "image_to_string",
+        lambda image, lang, config: "問題1\n\nx + 1 = 2\n"
+    )
+
+    result = OCRProcessor().process_pil_image(Image.new("RGB", (40, 20), "white"))
+
+    assert result.lang == "jpn+eng"
+    assert "問題1" in result.markdown
+    assert "$$\nx + 1 = 2\n$$" in result.markdown
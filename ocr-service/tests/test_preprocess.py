@@ -0,0 +1,92 @@
+"""OCR前処理のテスト"""
+import io
+import numpy as np
+import pytest
+from PIL import Image
+from app.preprocess import (
+    PreprocessOptions,
+    estimate_line_height,
+    estimate_skew,
+    ink_mask,
+    load_image,
+    preprocess,
+)
+
+
+def _png(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _text_lines(width=600, height=400, line_height=12, gap=24) -> Image.Image:
+    """黒い横棒を行に見立てた白地の画像"""
+    pixels = np.full((height, width), 255, dtype=np.uint8)
+    for top in range(40, height - 40, line_height + gap):
+        pixels[top:top + line_height, 60:width - 60] = 0
+    return Image.fromarray(pixels)
+
+
+def test_load_image_rejects_too_many_pixels():
+    """画素数の上限を超える画像は展開前に拒否する"""
+    data = _png(Image.new("L", (200, 200), 255))
+
+    with pytest.raises(ValueError, match="too large"):
+        load_image(data, PreprocessOptions(max_image_pixels=10_000))
+
+
+def test_load_image_rejects_non_image():
+    with pytest.raises(ValueError, match="Invalid image"):
+        load_image(b"not an image", PreprocessOptions())
+
+
+def test_load_image_limits_long_side():
+    """長辺上限まで縮小したグレースケール画像を返す"""
+    data = _png(Image.new("RGB", (1200, 600), "white"))
+
+    image = load_image(data, PreprocessOptions(max_long_side=300))
+
+    assert image.mode == "L"
+    assert image.size == (300, 150)
+
+
+def test_estimate_skew_finds_rotation():
+    """3度傾いた行を検出し、戻す向きの角度を返す"""
+    skewed = _text_lines().rotate(3, resample=Image.BICUBIC, expand=True, fillcolor=255)
+
+    angle = estimate_skew(ink_mask(np.asarray(skewed)), max_degrees=5)
+
+    assert angle == pytest.approx(-3, abs=0.5)
+
+
+def test_estimate_skew_leaves_straight_and_blank_pages():
+    assert estimate_skew(ink_mask(np.asarray(_text_lines())), max_degrees=5) == 0.0
+    blank = np.zeros((100, 100), dtype=bool)
+    assert estimate_skew(blank, max_degrees=5) == 0.0
+
+
+def test_estimate_line_height():
+    assert estimate_line_height(ink_mask(np.asarray(_text_lines(line_height=12)))) == 12
+    assert estimate_line_height(np.zeros((50, 50), dtype=bool)) is None
+
+
+def test_preprocess_crops_margins():
+    """文字のある範囲に余白分だけ残して切り取り、0/255に二値化する"""
+    pixels = np.full((300, 400), 255, dtype=np.uint8)
+    pixels[80:120, 100:150] = 0
+    options = PreprocessOptions(deskew=False, margin_padding=10)
+
+    image = preprocess(Image.fromarray(pixels), options)
+
+    assert image.size == (50 + 20, 40 + 20)
+    assert set(np.unique(np.asarray(image))) == {0, 255}
+
+
+def test_preprocess_shrinks_large_text():
+    """行の高さが目標より大きければ目標の高さまで縮小する"""
+    image = _text_lines(line_height=64, gap=64, height=600)
+    options = PreprocessOptions(deskew=False, crop_margins=False, target_text_height=32)
+
+    result = preprocess(image, options)
+
+    assert result.size == (300, 300)